@@ -0,0 +1,73 @@
+"""
+Browser Startup Benchmark
+
+Compares `Browser()` construction time with a cold chromedriver resolution
+(empty cache, may hit the network) against warm constructions that reuse
+the on-disk cache.
+
+Usage:
+    uv run -m app.benchmarks.browser_startup --runs 5
+"""
+
+import argparse
+import statistics
+import time
+
+from app.scraper import driver_resolver
+from app.scraper.base import Browser
+
+
+def _timed_browser() -> tuple[float, float]:
+    """Returns (driver resolution seconds, total construction seconds)."""
+    start = time.perf_counter()
+    driver_resolver.resolve_chromedriver()
+    resolved = time.perf_counter()
+    browser = Browser()
+    browser.driver  # o Chrome é iniciado no primeiro acesso
+    total = time.perf_counter()
+    browser.quit()
+    return resolved - start, total - start
+
+
+def run_benchmark(runs: int = 5) -> dict:
+    driver_resolver.clear_cache()
+    cold_resolve, cold_total = _timed_browser()
+
+    warm_resolve = []
+    warm_total = []
+    for _ in range(runs):
+        # Simula um processo novo: sem cache em memória, só o cache em disco.
+        driver_resolver.resolve_chromedriver.cache_clear()
+        resolve, total = _timed_browser()
+        warm_resolve.append(resolve)
+        warm_total.append(total)
+
+    return {
+        "cold": {"resolve": cold_resolve, "total": cold_total},
+        "warm": {
+            "resolve": statistics.median(warm_resolve),
+            "total": statistics.median(warm_total),
+            "runs": runs,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Browser() startup time")
+    parser.add_argument("--runs", "-r", type=int, default=5, help="Warm runs (default: 5)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.runs)
+    cold, warm = result["cold"], result["warm"]
+
+    print("=" * 60)
+    print("BROWSER STARTUP BENCHMARK")
+    print("=" * 60)
+    print(f"{'':<24}{'driver resolve':>16}{'Browser()':>16}")
+    print(f"{'cold (empty cache)':<24}{cold['resolve']:>15.3f}s{cold['total']:>15.3f}s")
+    print(f"{f'warm (median of {warm['runs']})':<24}{warm['resolve']:>15.3f}s{warm['total']:>15.3f}s")
+    print(f"\nSaved per Browser(): {cold['total'] - warm['total']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
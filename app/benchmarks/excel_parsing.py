@@ -0,0 +1,169 @@
+"""
+Next Appointments Excel Parsing Benchmark
+
+Compares the two ways of turning the next-appointments report into the
+appointment dicts used by the sync:
+
+- legacy: DataFrame.iterrows() with datetime.strptime and pd.isna checks per
+  cell (the former parse_next_appointments_excel loop);
+- vectorized: next_appointments_frame (pd.to_datetime with explicit formats,
+  .str.split for DATA/HORA and PACIENTE, boolean mask for primeira_consulta)
+  followed by one pass building the dicts from column lists.
+
+The synthetic report mimics the export: a mix of HH:MM and HH:MM:SS hours,
+blank phones, section rows without a date and patients without a code. Both
+parsers get the same in-memory DataFrame, so the numbers exclude file I/O
+(the calamine read is the same for both). The outputs are compared before
+timing.
+
+Usage:
+    uv run -m app.benchmarks.excel_parsing --rows 50000
+    uv run -m app.benchmarks.excel_parsing --rows 50000 --repeat 5
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from app.scraper.next_appointments import REPORT_COLUMNS, frame_records, next_appointments_frame
+
+TIPOS = ["Consulta", "Primeira Consulta", "Retorno", "Exame", "PRIMEIRA VEZ - Avaliação"]
+STATUS = ["Agendado", "Confirmado", "Cancelado", "Faltou"]
+
+
+def synthetic_report(rows: int, seed: int = 42) -> pd.DataFrame:
+    """DataFrame com o formato do relatório lido pelo calamine."""
+    rnd = random.Random(seed)
+    start = date(2026, 1, 5)
+    records = []
+    for n in range(rows):
+        if n % 200 == 0:
+            # Linhas de agrupamento do relatório (sem data): descartadas.
+            records.append({"DATA/HORA": f"Profissional {n // 200}", "PACIENTE": None})
+            continue
+        day = start + timedelta(days=rnd.randrange(120))
+        hour = f"{rnd.randrange(7, 19):02d}:{rnd.choice(['00', '15', '30', '45'])}"
+        if n % 3 == 0:
+            hour += ":00"
+        paciente = f"{rnd.randrange(1, 99999)} - Paciente {n}" if n % 50 else f"Paciente {n}"
+        records.append(
+            {
+                "DATA/HORA": f"{day:%d/%m/%Y} - {hour}",
+                "PACIENTE": paciente,
+                "TIPO": rnd.choice(TIPOS) if n % 40 else None,
+                "STATUS": rnd.choice(STATUS),
+                "RESPONSÁVEL": f"Dr. {rnd.randrange(30)}",
+                "TELEFONE": f"(11) 9{rnd.randrange(10**8):08d}" if n % 7 else None,
+                "Unnamed: 9": None,
+            }
+        )
+    return pd.DataFrame(records, columns=REPORT_COLUMNS + ["Unnamed: 9"])
+
+
+def legacy_parse(df: pd.DataFrame) -> list[dict]:
+    """Loop anterior (iterrows + strptime), mantido para comparação."""
+    df_limpo = df[df["DATA/HORA"].astype(str).str.contains(r"\d{2}/\d{2}/\d{4}", na=False)].copy()
+    df_limpo = df_limpo.dropna(axis=1, how="all")
+    df_limpo = df_limpo[REPORT_COLUMNS]
+    df_limpo[["DATA", "HORA"]] = df_limpo["DATA/HORA"].str.split(" - ", expand=True)
+    df_limpo["DATA"] = df_limpo["DATA"].str.strip()
+    df_limpo["HORA"] = df_limpo["HORA"].str.strip()
+    df_limpo = df_limpo.drop(columns=["DATA/HORA"])
+    df_limpo[["CODIGO", "NOME_PACIENTE"]] = df_limpo["PACIENTE"].str.split(" - ", expand=True)
+    df_limpo["CODIGO"] = df_limpo["CODIGO"].str.strip()
+    df_limpo["NOME_PACIENTE"] = df_limpo["NOME_PACIENTE"].str.strip()
+    df_limpo = df_limpo.drop(columns=["PACIENTE"])
+
+    def text(value):
+        return str(value).strip() if not pd.isna(value) else ""
+
+    appointments = []
+    for _, row in df_limpo.iterrows():
+        try:
+            data_str = row["DATA"]
+            if pd.isna(data_str) or not isinstance(data_str, str):
+                continue
+            data_obj = datetime.strptime(data_str, "%d/%m/%Y").date()
+
+            hora_str = row["HORA"]
+            hora_obj = None
+            if not pd.isna(hora_str) and isinstance(hora_str, str):
+                for fmt in ["%H:%M:%S", "%H:%M"]:
+                    try:
+                        hora_obj = datetime.strptime(hora_str.strip(), fmt).time()
+                        break
+                    except ValueError:
+                        continue
+
+            appointments.append(
+                {
+                    "data_consulta": data_obj,
+                    "hora_consulta": hora_obj,
+                    "codigo": text(row["CODIGO"]),
+                    "telefone": text(row["TELEFONE"]),
+                    "nome_paciente": text(row["NOME_PACIENTE"]),
+                    "profissional": text(row["RESPONSÁVEL"]),
+                    "procedimento": text(row["TIPO"]),
+                    "status": text(row["STATUS"]),
+                    "primeira_consulta": "primeira" in str(row["TIPO"]).lower()
+                    if not pd.isna(row["TIPO"])
+                    else False,
+                    "especialidade": "",
+                    "observacoes": "",
+                }
+            )
+        except Exception as e:
+            print(f"Erro ao processar linha {_}: {e}")
+            continue
+    return appointments
+
+
+def vectorized_parse(df: pd.DataFrame) -> list[dict]:
+    return frame_records(next_appointments_frame(df))
+
+
+def run_benchmark(rows: int = 50000, repeat: int = 3) -> dict:
+    df = synthetic_report(rows)
+    legacy, vectorized = legacy_parse(df), vectorized_parse(df)
+    if legacy != vectorized:
+        mismatch = next(
+            (i for i, (a, b) in enumerate(zip(legacy, vectorized)) if a != b), min(len(legacy), len(vectorized))
+        )
+        raise AssertionError(
+            f"Parsers divergem ({len(legacy)} vs {len(vectorized)} linhas, primeira diferença na {mismatch})"
+        )
+
+    results = {"appointments": len(legacy)}
+    for name, parse in (("legacy", legacy_parse), ("vectorized", vectorized_parse)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse(df)
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark next-appointments Excel parsing")
+    parser.add_argument("--rows", "-r", type=int, default=50000, help="Report rows (default: 50000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parser, best kept (default: 3)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.rows, args.repeat)
+
+    print("=" * 60)
+    print("NEXT APPOINTMENTS EXCEL PARSING BENCHMARK")
+    print("=" * 60)
+    print(f"{args.rows} report rows, {result['appointments']} appointments (outputs identical)")
+    for name in ("legacy", "vectorized"):
+        print(f"{name:<12}{result[name]:>9.3f}s")
+    if result["vectorized"]:
+        print(f"\nSpeedup: {result['legacy'] / result['vectorized']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+History Extraction Benchmark
+
+Compares WebDriver round trips and wall time for reading one patient
+history page: the cell-by-cell find_elements/.text walk against the single
+execute_script extractor (HISTORY_EXTRACT_SCRIPT).
+
+Runs offline against a saved history page. Capture one first with --save,
+which logs in and stores the page source of the given patient's history.
+
+Usage:
+    uv run -m app.benchmarks.history_extraction --save 5547 --html data/history_page.html
+    uv run -m app.benchmarks.history_extraction --html data/history_page.html --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+
+from selenium.webdriver.common.by import By
+
+from app.scraper.patient_history_scraper import (
+    HISTORY_IGNORE_WORDS,
+    HISTORY_TABLES_XPATH,
+    PatientHistoryScraper,
+    parse_history_tables,
+)
+
+
+def _today() -> datetime:
+    return datetime.strptime(datetime.now().strftime("%d/%m/%Y"), "%d/%m/%Y")
+
+
+def legacy_extract(scraper: PatientHistoryScraper) -> list[dict]:
+    """Leitura célula a célula, como o scraper fazia antes do extrator único."""
+    today = _today()
+    appointments = []
+    for table in scraper.find_elements(By.XPATH, HISTORY_TABLES_XPATH):
+        prof_elem = table.find_elements(By.XPATH, ".//td[contains(@class,'active')]//strong")
+        profissional = (
+            prof_elem[0].text.replace("Profissional / Agenda:", "").strip()
+            if prof_elem
+            else "Desconhecido"
+        )
+        linhas = table.find_elements(
+            By.XPATH, ".//tbody/tr[td and not(th) and not(td[@colspan])]"
+        )
+        for linha in linhas:
+            colunas = linha.find_elements(By.TAG_NAME, "td")
+            if len(colunas) < 9:
+                continue
+            dta_atend = colunas[0].text.strip()
+            if any(word in dta_atend for word in HISTORY_IGNORE_WORDS):
+                continue
+            dta_atend_date = datetime.strptime(dta_atend, "%d/%m/%Y")
+            if linha.get_attribute("class") == "bg-danger" and dta_atend_date < today:
+                continue
+            appointments.append(
+                {
+                    "profissional": profissional,
+                    "data_atendimento": dta_atend,
+                    "hora": colunas[1].text.strip(),
+                    "tipo": colunas[5].text.strip(),
+                    "retorno_ate": colunas[7].text.strip(),
+                }
+            )
+    return appointments
+
+
+def single_script_extract(scraper: PatientHistoryScraper) -> list[dict]:
+    return parse_history_tables(scraper.extract_history_page(), _today())
+
+
+def _count_round_trips(scraper: PatientHistoryScraper) -> list[int]:
+    """Conta cada comando enviado ao chromedriver (WebElement usa driver.execute)."""
+    counter = [0]
+    execute = scraper.driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter[0] += 1
+        return execute(*args, **kwargs)
+
+    scraper.driver.execute = counting_execute
+    return counter
+
+
+def save_history_page(codigo: str, path: str):
+    """Salva o HTML da primeira página do histórico enquanto o modal está aberto."""
+    scraper = PatientHistoryScraper()
+    scraper.settings.http_fetch_enabled = False  # a página precisa vir do Chrome
+    extract = scraper.extract_history_page
+    saved = [False]
+
+    def extract_and_save():
+        if not saved[0]:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(scraper.driver.page_source)
+            saved[0] = True
+            print(f"Página do histórico salva em {path}")
+        return extract()
+
+    scraper.extract_history_page = extract_and_save
+    try:
+        scraper.get_patient_history(codigo, search_type="codigo")
+    finally:
+        scraper.quit()
+
+
+def run_benchmark(html_path: str, runs: int = 5) -> dict:
+    scraper = PatientHistoryScraper()
+    try:
+        scraper.get(f"file://{os.path.abspath(html_path)}")
+        counter = _count_round_trips(scraper)
+
+        results = {}
+        for name, extract in (("legacy", legacy_extract), ("single_script", single_script_extract)):
+            timings = []
+            for _ in range(runs):
+                counter[0] = 0
+                start = time.perf_counter()
+                appointments = extract(scraper)
+                timings.append(time.perf_counter() - start)
+            results[name] = {
+                "seconds": statistics.median(timings),
+                "round_trips": counter[0],
+                "appointments": appointments,
+            }
+        return results
+    finally:
+        scraper.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history page extraction")
+    parser.add_argument("--html", required=True, help="Saved history page (HTML)")
+    parser.add_argument("--runs", "-r", type=int, default=5, help="Runs per approach (default: 5)")
+    parser.add_argument("--save", metavar="CODIGO", help="Capture the history page of this patient first")
+    args = parser.parse_args()
+
+    if args.save:
+        save_history_page(args.save, args.html)
+
+    result = run_benchmark(args.html, args.runs)
+    legacy, single = result["legacy"], result["single_script"]
+
+    print("=" * 60)
+    print("HISTORY EXTRACTION BENCHMARK")
+    print("=" * 60)
+    print(f"{'':<16}{'round trips':>14}{'time':>12}{'appointments':>16}")
+    for name, r in (("legacy", legacy), ("single_script", single)):
+        print(f"{name:<16}{r['round_trips']:>14}{r['seconds']:>11.3f}s{len(r['appointments']):>16}")
+    print(f"\nSame output: {legacy['appointments'] == single['appointments']}")
+    if single["seconds"] > 0:
+        print(f"Speedup: {legacy['seconds'] / single['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
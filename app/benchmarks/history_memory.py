@@ -0,0 +1,185 @@
+"""
+History Seed Memory Benchmark
+
+Runs seed_history over a large synthetic system (SQLite by default) with a
+fake scraper and reports the peak RSS of the process for two loading modes:
+
+- all-at-once: the whole system in a single page, with the identity map
+  growing until the end of the run (the former query.all() behaviour);
+- paged: patients loaded HISTORY_PAGE_SIZE at a time, with the session
+  emptied between pages.
+
+Each mode runs in its own process, so the peak RSS of one does not hide the
+other. The fake scraper returns the stored history plus one new appointment
+per patient, so the write path (key query + upsert) is exercised too.
+
+Usage:
+    uv run -m app.benchmarks.history_memory --patients 50000
+    uv run -m app.benchmarks.history_memory --patients 50000 --page-size 200
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date, time as dt_time, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import app.benchmarks.history_upsert  # noqa: F401  (BigInteger -> INTEGER no SQLite)
+from app.models.agendamento import Agendamento
+from app.models.dados_cliente import DadosCliente
+from app.models.enums import SistemaOrigem
+from app.models.historico_raspagem import HistoricoRaspagem
+from app.models.profissionais import Profissional
+
+START = date(2025, 6, 1)
+
+
+class FakeHistoryScraper:
+    """Devolve `rows` atendimentos já gravados + 1 novo, sem Chrome."""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    def set_sistema(self, sistema):
+        pass
+
+    def quit(self):
+        pass
+
+    def get_patient_history(self, identifier, search_type="codigo", stop_at=None):
+        appointments = [
+            {
+                "data_atendimento": (START - timedelta(days=7 * n)).strftime("%d/%m/%Y"),
+                "hora": f"{8 + n % 10:02d}:00",
+                "tipo": "Consulta",
+                "profissional": "Dr. Benchmark",
+            }
+            for n in range(-1, self.rows)
+        ]
+        return {
+            "status": "success",
+            "appointments": appointments,
+            "patient_info": {"codigo": identifier, "nome": None, "data_nascimento": "01/01/1980"},
+            "pages": 1,
+        }
+
+
+def prepare(url: str, patients: int, rows: int):
+    engine = create_engine(url)
+    for model in (Profissional, DadosCliente, Agendamento, HistoricoRaspagem):
+        model.__table__.drop(engine, checkfirst=True)
+        model.__table__.create(engine)
+
+    with engine.begin() as conn:
+        for start in range(1, patients + 1, 5000):
+            ids = range(start, min(start + 5000, patients + 1))
+            conn.execute(
+                insert(DadosCliente),
+                [
+                    {
+                        "id": pid,
+                        "codigo": pid,
+                        "sistema_origem": SistemaOrigem.OURO,
+                        "nomewpp": f"Paciente {pid}",
+                        "telefone": "5511999999999",
+                        "cpf": f"{pid:011d}",
+                    }
+                    for pid in ids
+                ],
+            )
+            conn.execute(
+                insert(Agendamento),
+                [
+                    {
+                        "paciente_id": pid,
+                        "codigo": pid,
+                        "sistema_origem": "OURO",
+                        "nome_paciente": f"Paciente {pid}",
+                        "profissional": "Dr. Benchmark",
+                        "data_consulta": START - timedelta(days=7 * n),
+                        "hora_consulta": dt_time(8 + n % 10, 0),
+                        "status": "Realizado",
+                    }
+                    for pid in ids
+                    for n in range(rows)
+                ],
+            )
+    engine.dispose()
+
+
+def _run_mode(url: str, page_size: int, rows: int, results):
+    from app.core.dependencies import get_settings
+    from app.core.memory import current_rss_mb, peak_rss_mb
+    from app.services import history_seed
+
+    settings = get_settings()
+    settings.history_page_size = page_size
+    settings.history_pipeline_depth = 0
+    settings.history_rescrape_hours = 0
+    settings.checkpoint_ttl = 0
+
+    engine = create_engine(url)
+    history_seed.get_session = sessionmaker(bind=engine)
+    service = history_seed.AppointmentHistoryService()
+    service.scraper = FakeHistoryScraper(rows)
+
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = service.seed_history(sistema_filter="ouro", skip_if_has_recent_history=False)
+    results.put(
+        {
+            "seconds": time.perf_counter() - start,
+            "baseline_mb": baseline,
+            "peak_mb": peak_rss_mb(),
+            "status": result["status"],
+            "stats": result.get("stats", {}),
+        }
+    )
+
+
+def run_benchmark(url: str, patients: int = 50000, rows: int = 5, page_size: int = 500) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name, size in (("all-at-once", patients), ("paged", page_size)):
+        # Cada modo parte da mesma base (o anterior já gravou os novos atendimentos).
+        prepare(url, patients, rows)
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_mode, args=(url, size, rows, queue))
+        process.start()
+        results[name] = queue.get()
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark seed_history peak memory")
+    parser.add_argument("--patients", "-p", type=int, default=50000, help="Patients (default: 50000)")
+    parser.add_argument("--rows", type=int, default=5, help="Stored rows per patient (default: 5)")
+    parser.add_argument("--page-size", type=int, default=500, help="HISTORY_PAGE_SIZE (default: 500)")
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'history_memory.db')}"
+    result = run_benchmark(url, args.patients, args.rows, args.page_size)
+
+    print("=" * 60)
+    print("HISTORY SEED MEMORY BENCHMARK")
+    print("=" * 60)
+    print(f"{args.patients} patients, {args.rows} stored rows each, page size {args.page_size}")
+    print(f"{'':<14}{'peak RSS':>12}{'growth':>12}{'time':>10}{'added':>10}")
+    for name in ("all-at-once", "paged"):
+        r = result[name]
+        print(
+            f"{name:<14}{r['peak_mb']:>10.0f}MB{r['peak_mb'] - r['baseline_mb']:>10.0f}MB"
+            f"{r['seconds']:>9.1f}s{r['stats'].get('appointments_added', 0):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+History Upsert Benchmark
+
+Compares the database round trips and time of the two history write paths
+for a re-seed of synthetic patients whose history is already stored:
+
+- legacy: one filter_by(...).first() per scraped appointment, session.add
+  for new ones and a commit per patient (the former seed_history loop);
+- bulk: upsert_history_rows per batch of HISTORY_WRITE_BATCH patients (one
+  key query, multi-row INSERT ... ON CONFLICT DO UPDATE, batched updates).
+
+Runs on a throwaway SQLite file by default. With --url pointing to Postgres
+the agendamentos table is DROPPED and recreated, so only use a scratch
+database (and pass --recreate to confirm).
+
+Usage:
+    uv run -m app.benchmarks.history_upsert --patients 2000 --rows 50
+    uv run -m app.benchmarks.history_upsert --url postgresql://bench@localhost/bench --recreate
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, time as dt_time, timedelta
+
+from sqlalchemy import BigInteger, create_engine, event, func, insert, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.models.agendamento import Agendamento
+from app.services.history_seed import HISTORY_WRITE_BATCH, upsert_history_rows
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # No SQLite só INTEGER PRIMARY KEY gera id automaticamente.
+    return "INTEGER"
+
+
+def _history(patient_id: int, rows: int, new: int) -> list[dict]:
+    """`rows` atendimentos já gravados + `new` mais recentes, do mais novo ao mais antigo."""
+    start = date(2025, 6, 1)
+    history = []
+    for n in range(-new, rows):
+        history.append(
+            {
+                "paciente_id": patient_id,
+                "profissional_id": None,
+                "codigo": patient_id,
+                "sistema_origem": "ouro",
+                "cpf": "",
+                "telefone": "",
+                "nome_paciente": f"Paciente {patient_id}",
+                "data_nascimento": date(1900, 1, 1),
+                "profissional": "Dr. Benchmark",
+                "especialidade": "",
+                "data_consulta": start - timedelta(days=7 * n),
+                "hora_consulta": dt_time(8 + n % 10, 0),
+                "procedimento": "Consulta",
+                "status": "Realizado",
+                "observacoes": "Scraped type: Consulta",
+                "retorno_ate": start - timedelta(days=7 * n - 30),
+            }
+        )
+    return history
+
+
+def _prepare(engine, patients: int, rows: int, new: int) -> list[list[dict]]:
+    Agendamento.__table__.drop(engine, checkfirst=True)
+    Agendamento.__table__.create(engine)
+    histories = [_history(pid, rows, new) for pid in range(1, patients + 1)]
+    with engine.begin() as conn:
+        stored = [row for history in histories for row in history[new:]]
+        for start in range(0, len(stored), 5000):
+            conn.execute(insert(Agendamento), stored[start : start + 5000])
+    return histories
+
+
+def legacy_write(session, histories: list[list[dict]]):
+    for history in histories:
+        for row in history:
+            exists = (
+                session.query(Agendamento)
+                .filter_by(
+                    paciente_id=row["paciente_id"],
+                    data_consulta=row["data_consulta"],
+                    hora_consulta=row["hora_consulta"],
+                )
+                .first()
+            )
+            if exists:
+                exists.retorno_ate = row["retorno_ate"]
+                continue
+            session.add(Agendamento(**row))
+        session.commit()
+
+
+def bulk_write(session, histories: list[list[dict]]):
+    for start in range(0, len(histories), HISTORY_WRITE_BATCH):
+        batch = histories[start : start + HISTORY_WRITE_BATCH]
+        upsert_history_rows(session, [row for history in batch for row in history])
+
+
+def run_benchmark(url: str, patients: int = 2000, rows: int = 50, new: int = 2) -> dict:
+    engine = create_engine(url)
+    statements = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(*args):
+        statements[0] += 1
+
+    results = {}
+    for name, write in (("legacy", legacy_write), ("bulk", bulk_write)):
+        histories = _prepare(engine, patients, rows, new)
+        session = sessionmaker(bind=engine)()
+        statements[0] = 0
+        start = time.perf_counter()
+        try:
+            write(session, histories)
+        finally:
+            session.close()
+        results[name] = {
+            "seconds": time.perf_counter() - start,
+            "statements": statements[0],
+        }
+        with engine.connect() as conn:
+            results[name]["total_rows"] = conn.scalar(
+                select(func.count()).select_from(Agendamento.__table__)
+            )
+
+    engine.dispose()
+    results["stored_rows"] = patients * rows
+    results["new_rows"] = patients * new
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history seed write paths")
+    parser.add_argument("--url", help="Database URL (default: temporary SQLite file)")
+    parser.add_argument("--recreate", action="store_true", help="Allow dropping agendamentos on --url")
+    parser.add_argument("--patients", "-p", type=int, default=2000, help="Patients (default: 2000)")
+    parser.add_argument("--rows", type=int, default=50, help="Stored rows per patient (default: 50)")
+    parser.add_argument("--new", type=int, default=2, help="New rows per patient (default: 2)")
+    args = parser.parse_args()
+
+    if args.url and not args.url.startswith("sqlite") and not args.recreate:
+        parser.error("--recreate is required: the agendamentos table will be dropped")
+
+    url = args.url
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'history_upsert.db')}"
+    result = run_benchmark(url, args.patients, args.rows, args.new)
+
+    print("=" * 60)
+    print("HISTORY UPSERT BENCHMARK")
+    print("=" * 60)
+    print(
+        f"{args.patients} patients, {result['stored_rows']} stored rows, "
+        f"{result['new_rows']} new rows"
+    )
+    print(f"{'':<10}{'statements':>14}{'time':>12}{'rows':>12}")
+    for name in ("legacy", "bulk"):
+        r = result[name]
+        print(f"{name:<10}{r['statements']:>14}{r['seconds']:>11.2f}s{r['total_rows']:>12}")
+    legacy, bulk = result["legacy"], result["bulk"]
+    if bulk["statements"]:
+        print(f"\nRound trips: {legacy['statements'] / bulk['statements']:.0f}x fewer")
+    if bulk["seconds"] > 0:
+        print(f"Speedup: {legacy['seconds'] / bulk['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
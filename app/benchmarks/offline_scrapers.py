@@ -0,0 +1,161 @@
+"""
+Offline Scrapers Benchmark
+
+Runs the real scraper classes against the local SoftClyn mock
+(app.mocks.softclyn_server) so patients/hour and schedule latency can be
+measured reproducibly, without touching the clinic system. The mock is
+started in a background thread with the given fixtures and latency.
+
+Record the fixtures first with RECORD_DIR set while running the flows that
+should be replayed (login, agenda, patient search, history, exports).
+
+Usage:
+    uv run -m app.benchmarks.offline_scrapers --fixtures data/fixtures --codigos 5547 812 --latency 0.2
+    uv run -m app.benchmarks.offline_scrapers --fixtures data/fixtures --schedule data/schedule.json
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import uvicorn
+
+from app.core.dependencies import get_settings
+from app.mocks.softclyn_server import create_app
+from app.scraper.appointment_scheduler import AppointmentScheduler
+from app.scraper.patient_history_scraper import PatientHistoryScraper
+
+
+def start_mock_server(fixtures: str, port: int, latency: float, jitter: float) -> uvicorn.Server:
+    """Sobe o mock numa thread e aponta o Browser para ele."""
+    app = create_app(fixtures, latency, jitter)
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    settings = get_settings()
+    settings.softclyn_url = f"http://127.0.0.1:{port}"
+    # Nada de sessão do servidor real no Redis, HTTP direto ou nova gravação.
+    settings.softclyn_session_ttl = 0
+    settings.http_fetch_enabled = False
+    settings.record_dir = None
+    return server
+
+
+def bench_history(codigos: list[str]) -> dict:
+    timings = []
+    appointments = 0
+    scraper = PatientHistoryScraper()
+    try:
+        for codigo in codigos:
+            start = time.perf_counter()
+            result = scraper.get_patient_history(codigo, search_type="codigo")
+            timings.append(time.perf_counter() - start)
+            appointments += len(result.get("appointments", []))
+    finally:
+        scraper.quit()
+    return {
+        "patients": len(codigos),
+        "appointments": appointments,
+        "median": statistics.median(timings),
+        "patients_per_hour": 3600 * len(timings) / max(sum(timings), 0.001),
+    }
+
+
+def bench_schedule(request: dict, runs: int) -> dict:
+    timings = []
+    statuses = []
+    for _ in range(runs):
+        with AppointmentScheduler() as scheduler:
+            start = time.perf_counter()
+            result = scheduler.schedule_appointment(
+                request["medico"],
+                request["data_desejada"],
+                request["paciente_info"],
+                request.get("horario_desejado"),
+                request.get("tipo_atendimento", "Primeira vez"),
+            )
+            timings.append(time.perf_counter() - start)
+            statuses.append(result.get("status"))
+    return {
+        "runs": runs,
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "statuses": statuses,
+    }
+
+
+def run_benchmark(
+    fixtures: str,
+    codigos: list[str] | None = None,
+    schedule: dict | None = None,
+    runs: int = 3,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    port: int = 8765,
+) -> dict:
+    server = start_mock_server(fixtures, port, latency, jitter)
+    results = {}
+    try:
+        if codigos:
+            results["history"] = bench_history(codigos)
+        if schedule:
+            results["schedule"] = bench_schedule(schedule, runs)
+    finally:
+        server.should_exit = True
+    results["misses"] = list(server.config.app.state.misses)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scrapers against the SoftClyn mock")
+    parser.add_argument("--fixtures", "-f", required=True, help="Folder recorded with RECORD_DIR")
+    parser.add_argument("--codigos", nargs="*", default=[], help="Patient codes for the history run")
+    parser.add_argument(
+        "--schedule",
+        metavar="JSON",
+        help="File with medico, data_desejada, paciente_info (and optional horario_desejado)",
+    )
+    parser.add_argument("--runs", "-r", type=int, default=3, help="Schedule runs (default: 3)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock latency per response (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency (s)")
+    parser.add_argument("--port", "-p", type=int, default=8765)
+    args = parser.parse_args()
+
+    schedule = None
+    if args.schedule:
+        with open(args.schedule, encoding="utf-8") as f:
+            schedule = json.load(f)
+
+    result = run_benchmark(
+        args.fixtures, args.codigos, schedule, args.runs, args.latency, args.jitter, args.port
+    )
+
+    print("=" * 60)
+    print(f"OFFLINE SCRAPERS BENCHMARK (latency {args.latency}s + {args.jitter}s jitter)")
+    print("=" * 60)
+    if "history" in result:
+        h = result["history"]
+        print(
+            f"History: {h['patients']} patients, {h['appointments']} appointments, "
+            f"median {h['median']:.2f}s, {h['patients_per_hour']:.0f} patients/hour"
+        )
+    if "schedule" in result:
+        s = result["schedule"]
+        print(
+            f"Schedule: {s['runs']} runs, median {s['median']:.2f}s, max {s['max']:.2f}s, "
+            f"statuses {s['statuses']}"
+        )
+    if result["misses"]:
+        print(f"Requests without fixture: {len(result['misses'])}")
+        for miss in sorted(set(result["misses"])):
+            print(f"  {miss}")
+
+
+if __name__ == "__main__":
+    main()
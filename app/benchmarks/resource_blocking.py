@@ -0,0 +1,95 @@
+"""
+Resource Blocking Benchmark
+
+Loads the SoftClyn home screen and the appointment screen with and without
+the CDP resource blocking, reporting requests, bytes and navigation time.
+The difference between both modes is what the blocking saves per load.
+
+Usage:
+    uv run -m app.benchmarks.resource_blocking --runs 3 --sistema ouro
+"""
+
+import argparse
+import statistics
+import time
+
+from app.core.dependencies import get_settings
+from app.scraper.base import Browser
+
+
+def _measure(browser: Browser, runs: int) -> dict:
+    home_url = browser._home_url
+    timings = {"home": [], "agendamento": []}
+    reports = {"home": [], "agendamento": []}
+
+    for _ in range(runs):
+        browser.resource_report()
+        start = time.perf_counter()
+        browser.get(home_url, timeout=browser.settings.page_load_timeout)
+        browser.wait_for_ajax_idle()
+        timings["home"].append(time.perf_counter() - start)
+        reports["home"].append(browser.resource_report())
+
+        start = time.perf_counter()
+        browser._click_on_appointment_menu()
+        timings["agendamento"].append(time.perf_counter() - start)
+        reports["agendamento"].append(browser.resource_report())
+
+    return {
+        screen: {
+            "seconds": statistics.median(timings[screen]),
+            "requests": statistics.median(r["requests"] for r in reports[screen]),
+            "bytes": statistics.median(r["bytes"] for r in reports[screen]),
+            "blocked": statistics.median(r["blocked"] for r in reports[screen]),
+        }
+        for screen in timings
+    }
+
+
+def run_benchmark(runs: int = 3, sistema: str = "ouro") -> dict:
+    settings = get_settings()
+    settings.resource_report = True
+    blocked_resources = settings.blocked_resources
+
+    results = {}
+    for mode, resources in (("unblocked", ""), ("blocked", blocked_resources)):
+        settings.blocked_resources = resources
+        with Browser() as browser:
+            browser.set_sistema(sistema)
+            browser._login()
+            browser._close_modal()
+            results[mode] = _measure(browser, runs)
+
+    settings.blocked_resources = blocked_resources
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CDP resource blocking")
+    parser.add_argument("--runs", "-r", type=int, default=3, help="Loads per screen (default: 3)")
+    parser.add_argument("--sistema", "-s", default="ouro", choices=["ouro", "of"])
+    args = parser.parse_args()
+
+    result = run_benchmark(args.runs, args.sistema)
+
+    print("=" * 72)
+    print("RESOURCE BLOCKING BENCHMARK")
+    print("=" * 72)
+    print(f"{'':<26}{'time':>10}{'requests':>12}{'KB':>12}{'blocked':>12}")
+    for screen in ("home", "agendamento"):
+        for mode in ("unblocked", "blocked"):
+            r = result[mode][screen]
+            print(
+                f"{f'{screen} ({mode})':<26}{r['seconds']:>9.3f}s{r['requests']:>12.0f}"
+                f"{r['bytes'] / 1024:>12.1f}{r['blocked']:>12.0f}"
+            )
+        before, after = result["unblocked"][screen], result["blocked"][screen]
+        print(
+            f"{f'{screen} saved':<26}{before['seconds'] - after['seconds']:>9.3f}s"
+            f"{before['requests'] - after['requests']:>12.0f}"
+            f"{(before['bytes'] - after['bytes']) / 1024:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
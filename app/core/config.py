@@ -1,3 +1,5 @@
+import os
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,5 +13,34 @@ class Settings(BaseSettings):
     redis_url: str
     database_url: str
     page_load_timeout: int = 60
+    browser_pool_size: int = 1
+    browser_pool_max_uses: int = 20
+    browser_pool_max_age: int = 1800
+    browser_pool_lease_timeout: int = 30
+    softclyn_session_ttl: int = 1200
+    blocked_resources: str = "image,font,media,stylesheet,third_party"
+    resource_report: bool = False
+    http_fetch_enabled: bool = False
+    trace_dir: str | None = None
+    history_tabs: int = 1
+    record_dir: str | None = None
+    professional_index_ttl: int = 600
+    checkpoint_ttl: int = 21600
+    history_pipeline_depth: int = 0
+    history_priority: str = "signals"
+    history_rescrape_hours: int = 12
+    history_page_size: int = 500
+    history_max_rss_mb: int = 0
+    download_root: str | None = None
+    download_dir_ttl_hours: int = 6
+    export_capture: str = "download"
+    softclyn_http_next_appointments_path: str = "view/relatorios/agendamentos/relAgendamentos.php"
+    softclyn_http_active_patients_path: str = "view/relatorios/pacientes/relPacientesInativos.php"
+    softclyn_http_history_path: str = "view/agendamento/trilhaAuditoriaAgenda.php"
+    chrome_binary: str | None = None
+    chromedriver_path: str | None = None
+    chromedriver_cache_dir: str = os.path.join(
+        os.path.expanduser("~"), ".cache", "scraping"
+    )
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
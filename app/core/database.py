@@ -18,7 +18,8 @@ def get_engine():
     return engine
 
 
-def get_session():
+def get_session(**options):
+    """Nova sessão; `options` vão para o sessionmaker (ex.: expire_on_commit=False)."""
     engine = get_engine()
-    SessionLocal = sessionmaker(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, **options)
     return SessionLocal()
@@ -0,0 +1,204 @@
+"""
+Spans leves para medir onde o tempo de cada scrape é gasto.
+
+Uma tarefa abre um span raiz (`span(..., root=True)`); tudo que o Browser
+faz dentro dela (get, esperas, execute_script, login, navegação) vira span
+filho. Ao fechar a raiz, a trace é somada aos histogramas do processo e,
+com TRACE_DIR definido, gravada como Chrome trace-event JSON (abrir em
+chrome://tracing ou https://ui.perfetto.dev).
+"""
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from .dependencies import get_settings
+
+# Limites (s) dos buckets dos histogramas por etapa.
+HISTOGRAM_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+# Amostras guardadas por etapa para os percentis.
+MAX_SAMPLES = 10_000
+
+_local = threading.local()
+_histograms_lock = threading.Lock()
+_samples: dict[str, deque] = {}
+_buckets: dict[str, list[int]] = {}
+
+
+class Span:
+    def __init__(self, name: str, trace: list | None, depth: int, args: dict):
+        self.name = name
+        self.trace = trace
+        self.depth = depth
+        self.args = args
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def finish(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if self.trace is None:
+            return
+        stack = _stack()
+        if self in stack:
+            # Descarta também filhos que ficaram abertos (start_span sem finish).
+            del stack[stack.index(self):]
+        self.trace.append(self)
+        if self.depth == 0:
+            _finish_trace(self)
+
+
+def _stack() -> list[Span]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def start_span(name: str, root: bool = False, **args) -> Span:
+    """
+    Abre um span. Fora de uma trace ativa ele só é registrado se `root=True`
+    (o que inicia uma trace nova); caso contrário vira um no-op barato.
+    """
+    stack = _stack()
+    if stack:
+        parent = stack[-1]
+        new_span = Span(name, parent.trace, parent.depth + 1, args)
+    elif root:
+        new_span = Span(name, [], 0, args)
+    else:
+        return Span(name, None, 0, args)
+    stack.append(new_span)
+    return new_span
+
+
+@contextmanager
+def span(name: str, root: bool = False, **args):
+    current = start_span(name, root=root, **args)
+    try:
+        yield current
+    finally:
+        current.finish()
+
+
+def traced(name: str | None = None, root: bool = False):
+    """Decorator que envolve a função num span (nome padrão: Classe.metodo)."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=root):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _finish_trace(root: Span):
+    with _histograms_lock:
+        for item in root.trace:
+            samples = _samples.setdefault(item.name, deque(maxlen=MAX_SAMPLES))
+            samples.append(item.duration)
+            buckets = _buckets.setdefault(item.name, [0] * (len(HISTOGRAM_BUCKETS) + 1))
+            buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, item.duration)] += 1
+
+    children = {}
+    for item in root.trace:
+        if item.depth == 1:
+            children[item.name] = children.get(item.name, 0) + item.duration
+    top = sorted(children.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    print(
+        f"[trace] {root.name}: {root.duration:.2f}s | "
+        + ", ".join(f"{name} {total:.2f}s" for name, total in top)
+    )
+
+    trace_dir = get_settings().trace_dir
+    if trace_dir:
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            path = os.path.join(trace_dir, f"{root.name}_{stamp}_{os.getpid()}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(to_chrome_trace(root.trace), f)
+        except OSError as e:
+            print(f"Não foi possível gravar a trace: {e}")
+
+
+def to_chrome_trace(spans: list[Span]) -> dict:
+    """Converte spans em eventos "X" (complete) do formato Chrome trace-event."""
+    if not spans:
+        return {"traceEvents": []}
+    origin = min(item.start for item in spans)
+    pid = os.getpid()
+    tid = threading.get_ident()
+    return {
+        "traceEvents": [
+            {
+                "name": item.name,
+                "ph": "X",
+                "ts": round((item.start - origin) * 1_000_000),
+                "dur": round(item.duration * 1_000_000),
+                "pid": pid,
+                "tid": tid,
+                "args": {k: str(v) for k, v in item.args.items()},
+            }
+            for item in sorted(spans, key=lambda s: s.start)
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def histogram_report() -> dict:
+    """Estatísticas e buckets por etapa de todas as traces do processo."""
+    with _histograms_lock:
+        report = {}
+        for name, samples in _samples.items():
+            values = sorted(samples)
+            labels = [f"<={b}s" for b in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]}s"]
+            report[name] = {
+                "count": len(values),
+                "total": round(sum(values), 3),
+                "mean": round(sum(values) / len(values), 4),
+                "p50": round(_percentile(values, 50), 4),
+                "p90": round(_percentile(values, 90), 4),
+                "p99": round(_percentile(values, 99), 4),
+                "max": round(values[-1], 4),
+                "buckets": dict(zip(labels, _buckets[name])),
+            }
+        return report
+
+
+def export_histograms(path: str | None = None) -> str | None:
+    """Grava histogram_report() em JSON (padrão: TRACE_DIR/histograms_<pid>.json)."""
+    if path is None:
+        trace_dir = get_settings().trace_dir
+        if not trace_dir:
+            return None
+        path = os.path.join(trace_dir, f"histograms_{os.getpid()}.json")
+    report = histogram_report()
+    if not report:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def reset_histograms():
+    with _histograms_lock:
+        _samples.clear()
+        _buckets.clear()
@@ -1,20 +1,47 @@
+import time
+
 from prefect import flow, task
 
 from app.models.enums import SistemaOrigem
 from app.services.history_seed import AppointmentHistoryService
+from app.services.prioritizer import get_prioritizer
+from app.services.scrape_stats import estimated_costs, load_scrape_stats
+
+
+def _split_by_cost(
+    patient_ids: list[int], costs: dict[int, float], workers: int
+) -> list[list[int]]:
+    """
+    Distribui os pacientes, na ordem de prioridade, sempre para o worker com
+    menos custo acumulado: as cargas ficam parecidas e cada worker começa
+    pelos mais prioritários.
+    """
+    chunks = [[] for _ in range(workers)]
+    loads = [0.0] * workers
+    for pid in patient_ids:
+        target = loads.index(min(loads))
+        chunks[target].append(pid)
+        loads[target] += costs[pid]
+    return chunks
 
 
-def _get_patient_count(sistema_str: str) -> int:
-    """Returns the number of patients for a given system."""
+def _get_prioritized_ids(sistema_str: str) -> tuple[list[int], dict[int, float]]:
+    """
+    Patient ids (with codigo) of a system, most valuable first (HISTORY_PRIORITY),
+    and the estimated scrape seconds of each one.
+    """
     from app.core.database import get_session
     from app.models.dados_cliente import DadosCliente
 
     sistema_enum = SistemaOrigem(sistema_str.upper())
     session = get_session()
     try:
-        return session.query(DadosCliente).filter(
-            DadosCliente.sistema_origem == sistema_enum
-        ).count()
+        rows = session.query(DadosCliente.id).filter(
+            DadosCliente.sistema_origem == sistema_enum,
+            DadosCliente.codigo.isnot(None),
+        )
+        ids = get_prioritizer().order(session, [row.id for row in rows])
+        return ids, estimated_costs(load_scrape_stats(session, ids), ids)
     finally:
         session.close()
 
@@ -31,20 +58,33 @@ def run_history_for_sistema(
     limit: int | None = None,
     skip_if_has_recent_history: bool = False,
     days_threshold: int = 7,
+    tabs: int = 1,
+    patient_ids: list[int] | None = None,
+    deadline: float | None = None,
 ):
     """
     Synchronous task so Prefect runs it in a thread pool (ConcurrentTaskRunner),
     allowing true parallelism with blocking Selenium code.
     Each invocation creates its own Chrome instance.
+    The checkpoint is keyed by sistema and chunk (offset/limit or patient_ids),
+    so a Prefect retry of the same chunk skips the patients the failed attempt
+    already wrote. seed_history reports failures as status "error"; they are
+    raised here so Prefect marks the task failed and retries it.
     """
     service = AppointmentHistoryService()
-    return service.seed_history(
+    result = service.seed_history(
         sistema_filter=sistema_filter,
         offset=offset,
         limit=limit,
         skip_if_has_recent_history=skip_if_has_recent_history,
         days_threshold=days_threshold,
+        tabs=tabs,
+        patient_ids=patient_ids,
+        deadline=deadline,
     )
+    if result.get("status") == "error":
+        raise RuntimeError(result.get("message"))
+    return result
 
 
 @flow(
@@ -55,6 +95,8 @@ async def history_sync_flow(
     skip_if_has_recent_history: bool = True,
     days_threshold: int = 30,
     workers_per_system: int = 2,
+    tabs_per_worker: int = 1,
+    time_budget_minutes: int | None = None,
 ):
     """
     Flow para sincronizar histórico de agendamentos incremental.
@@ -65,52 +107,55 @@ async def history_sync_flow(
         workers_per_system: Número de workers (Chromes) por sistema. Default 1.
             workers_per_system=1 → OURO e OF rodam em paralelo (2 Chromes total).
             workers_per_system=2 → 4 Chromes total, cada sistema dividido em 2 chunks.
+        tabs_per_worker: Abas por Chrome buscando históricos em paralelo (1 = uma por vez).
+        time_budget_minutes: Tempo máximo da execução. Os pacientes são distribuídos
+            em ordem de prioridade (HISTORY_PRIORITY) e cada worker para de iniciar
+            pacientes ao fim do prazo; os que sobrarem ficam para a próxima execução.
     """
     sistemas = ["ouro", "of"]
     futures = []
+    deadline = time.time() + time_budget_minutes * 60 if time_budget_minutes else None
 
     for sistema in sistemas:
-        if workers_per_system <= 1:
+        patient_ids, costs = _get_prioritized_ids(sistema)
+        workers = max(1, workers_per_system)
+        print(
+            f"[{sistema}] {len(patient_ids)} pacientes → {workers} workers, "
+            f"~{sum(costs.values()) / workers / 60:.0f} min estimados por worker"
+        )
+        for i, chunk in enumerate(_split_by_cost(patient_ids, costs, workers)):
+            if not chunk:
+                continue
+            label = f"{sistema}[{i + 1}/{workers}]"
             f = run_history_for_sistema.submit(
                 sistema,
                 skip_if_has_recent_history=skip_if_has_recent_history,
                 days_threshold=days_threshold,
+                tabs=tabs_per_worker,
+                patient_ids=chunk,
+                deadline=deadline,
             )
-            futures.append((sistema, f))
-        else:
-            total = _get_patient_count(sistema)
-            chunk = max(1, -(-total // workers_per_system))  # ceil division
-            print(
-                f"[{sistema}] {total} pacientes → {workers_per_system} workers, ~{chunk} por worker"
-            )
-            for i in range(workers_per_system):
-                offset = i * chunk
-                if offset >= total:
-                    break
-                label = f"{sistema}[{offset}:{offset + chunk}]"
-                f = run_history_for_sistema.submit(
-                    sistema,
-                    offset=offset,
-                    limit=chunk,
-                    skip_if_has_recent_history=skip_if_has_recent_history,
-                    days_threshold=days_threshold,
-                )
-                futures.append((label, f))
+            futures.append((label, f))
 
     # Collect results (blocks until all tasks finish)
     total_added = 0
     total_processed = 0
     total_skipped = 0
     total_errors = 0
+    total_deferred = 0
 
     for label, f in futures:
-        result = f.result()
-        if result.get("status") == "success":
+        # Um chunk que falhou mesmo após o retry não derruba o resumo dos demais.
+        result = f.result(raise_on_failure=False)
+        if isinstance(result, BaseException):
+            print(f"  [{label}] ERRO: {result}")
+        elif result.get("status") == "success":
             stats = result.get("stats", {})
             added = stats.get("appointments_added", 0)
             processed = stats.get("total_patients_processed", 0)
             skipped = stats.get("patients_skipped_has_recent", 0)
             errors = stats.get("errors", 0)
+            total_deferred += stats.get("patients_deferred", 0)
             total_added += added
             total_processed += processed
             total_skipped += skipped
@@ -128,6 +173,8 @@ async def history_sync_flow(
         print(f"  Pacientes pulados (histórico recente): {total_skipped}")
     if total_errors:
         print(f"  Erros: {total_errors}")
+    if total_deferred:
+        print(f"  Pacientes adiados (fim do time budget): {total_deferred}")
 
     return {
         "status": "success",
@@ -136,6 +183,7 @@ async def history_sync_flow(
             "total_patients_processed": total_processed,
             "patients_skipped_has_recent": total_skipped,
             "errors": total_errors,
+            "patients_deferred": total_deferred,
         },
     }
 
@@ -23,6 +23,12 @@ async def next_appointments_sync_flow():
     if result.get("status") == "success":
         stats = result.get("stats", {})
         print(f"Sincronização concluída: {stats.get('added')} novos, {stats.get('updated')} atualizados, {stats.get('cancelled', 0)} cancelados.")
+        print(f"Exportações em paralelo: {stats.get('scrape_seconds')}s")
+        for sistema, system_stats in stats.get("systems", {}).items():
+            if system_stats.get("status") == "success":
+                print(f"  {sistema}: {system_stats.get('added')} novos, {system_stats.get('updated')} atualizados, {system_stats.get('cancelled')} cancelados")
+            else:
+                print(f"  {sistema}: erro - {system_stats.get('message')}")
     else:
         print(f"Erro ao buscar agendamentos: {result.get('message')}")
         
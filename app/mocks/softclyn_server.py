@@ -0,0 +1,156 @@
+"""
+Servidor SoftClyn local que reproduz as respostas gravadas com RECORD_DIR.
+
+Cada requisição é casada com a fixture de mesmo método e caminho cujos
+parâmetros (query + formulário) sejam iguais; sem igual exato, vence a de
+mais parâmetros em comum (ex.: histórico de outro paciente, mesma página).
+Fixtures repetidas com os mesmos parâmetros são devolvidas na ordem gravada,
+o que mantém a paginação e telas que mudam depois de uma ação.
+
+Usage:
+    RECORD_DIR=data/fixtures uv run -m app.run_sync --limit 5   # grava com o SoftClyn real
+    uv run -m app.mocks.softclyn_server --fixtures data/fixtures --port 8765 --latency 0.2
+    SOFTCLYN_URL=http://127.0.0.1:8765 uv run -m app.run_sync --limit 5   # roda contra o mock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+TEXT_TYPES = ("text/", "javascript", "json", "xml")
+
+
+def _params(query: str, body: str) -> tuple:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    if body and "=" in body:
+        pairs += parse_qsl(body, keep_blank_values=True)
+    elif body:
+        pairs.append(("", body))
+    return tuple(sorted(pairs))
+
+
+class FixtureStore:
+    """Fixtures de um RECORD_DIR indexadas por (método, caminho)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.origin = json.load(f)["origin"]
+
+        self.entries: dict[tuple[str, str], list[dict]] = {}
+        with open(os.path.join(directory, "index.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["params"] = _params(entry["query"], entry["body"])
+                self.entries.setdefault((entry["method"], entry["path"]), []).append(entry)
+        self._cursors: dict[tuple, int] = {}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def reset(self):
+        self._cursors.clear()
+
+    def match(self, method: str, path: str, query: str, body: str) -> dict | None:
+        candidates = self.entries.get((method, path))
+        if not candidates:
+            return None
+        params = _params(query, body)
+        exact = [e for e in candidates if e["params"] == params]
+        if not exact:
+            wanted = set(params)
+            return max(
+                candidates,
+                key=lambda e: len(wanted & set(e["params"])) - len(wanted ^ set(e["params"])),
+            )
+
+        key = (method, path, params)
+        index = self._cursors.get(key, 0)
+        self._cursors[key] = index + 1
+        return exact[min(index, len(exact) - 1)]
+
+    def body(self, entry: dict) -> bytes:
+        with open(os.path.join(self.directory, "bodies", entry["file"]), "rb") as f:
+            content = f.read()
+        content_type = entry["headers"].get("content-type", "")
+        if any(t in content_type for t in TEXT_TYPES):
+            # Links absolutos para o servidor real viram relativos ao mock.
+            content = content.replace(self.origin.encode(), b"")
+        return content
+
+
+def create_app(fixtures_dir: str, latency: float = 0.0, jitter: float = 0.0) -> FastAPI:
+    """
+    App que serve as fixtures de `fixtures_dir`, atrasando cada resposta em
+    `latency` segundos (+ até `jitter` aleatório) para simular o servidor real.
+    """
+    store = FixtureStore(fixtures_dir)
+    app = FastAPI(title="SoftClyn mock")
+    app.state.store = store
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.misses = []
+
+    @app.post("/__mock__/reset")
+    async def reset():
+        store.reset()
+        app.state.misses.clear()
+        return {"fixtures": len(store)}
+
+    @app.get("/__mock__/misses")
+    async def misses():
+        return app.state.misses
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def replay(path: str, request: Request):
+        body = (await request.body()).decode("utf-8", errors="replace")
+        entry = store.match(request.method, f"/{path}", request.url.query, body)
+        delay = app.state.latency + random.uniform(0, app.state.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if entry is None:
+            app.state.misses.append(f"{request.method} /{path}")
+            print(f"[mock] sem fixture para {request.method} /{path}")
+            return Response(status_code=404)
+
+        headers = {
+            k: v.replace(store.origin, "")
+            for k, v in entry["headers"].items()
+            if k != "content-type"
+        }
+        return Response(
+            content=store.body(entry),
+            status_code=entry["status"],
+            headers=headers,
+            media_type=entry["headers"].get("content-type"),
+        )
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SoftClyn mock (fixtures gravadas)")
+    parser.add_argument("--fixtures", "-f", required=True, help="Pasta gravada com RECORD_DIR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", "-p", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso fixo por resposta (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Atraso aleatório extra (s)")
+    args = parser.parse_args()
+
+    app = create_app(args.fixtures, args.latency, args.jitter)
+    print(
+        f"SoftClyn mock com {len(app.state.store)} fixtures em http://{args.host}:{args.port}"
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
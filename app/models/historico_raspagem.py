@@ -0,0 +1,29 @@
+from sqlalchemy import (
+    Column,
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    SmallInteger,
+    String,
+    Text,
+)
+from app.core.database import Base
+
+
+class HistoricoRaspagem(Base):
+    """Última raspagem do histórico de cada paciente (custo e desfecho)."""
+
+    __tablename__ = "historico_raspagens"
+
+    paciente_id = Column(BigInteger, primary_key=True)  # dados_cliente.id
+    codigo = Column(SmallInteger, nullable=True)
+    sistema_origem = Column(String, nullable=True)
+    last_scraped_at = Column(DateTime(timezone=True), nullable=False)
+    last_success_at = Column(DateTime(timezone=True), nullable=True)
+    outcome = Column(String(20), nullable=False)  # 'success', 'not_found', 'error'
+    message = Column(Text, nullable=True)
+    pages = Column(Integer, nullable=True)
+    rows = Column(Integer, nullable=True)
+    duration_s = Column(Float, nullable=True)
+    scrape_count = Column(Integer, nullable=False, default=0)
@@ -1,18 +1,24 @@
 """
 Parallel History Sync Runner
 
-Automatically divides patients into chunks and runs multiple workers in parallel.
+Puts patients in a queue of small batches and runs multiple workers in
+parallel that pull from it, so a slow patient or a crashed Chrome does not
+hold up the whole run. With --queue redis, workers on other hosts can join
+the same run with --join.
 
 Usage:
     uv run -m app.run_parallel --workers 4 --sistema ouro
     uv run -m app.run_parallel --workers 8 --sistema of
     uv run -m app.run_parallel --workers 4  # Both systems
+    uv run -m app.run_parallel --workers 2 --tabs 4  # 4 tabs per Chrome
+    uv run -m app.run_parallel --workers 4 --queue redis  # Multi-host queue
+    uv run -m app.run_parallel --workers 4 --queue redis --join  # Another host
 """
 
 import sys
 import os
 import argparse
-import math
+import time
 from multiprocessing import Process, Queue
 from datetime import datetime
 
@@ -23,14 +29,18 @@ from app.core.database import get_session
 from app.models.dados_cliente import DadosCliente
 from app.models.enums import SistemaOrigem
 from app.services.history_seed import AppointmentHistoryService
+from app.services.prioritizer import get_prioritizer
+from app.services.scrape_stats import estimated_costs, load_scrape_stats
+from app.services.work_queue import LocalWorkQueue, RedisWorkQueue, make_batches, worker_name
 
 
-def get_patient_count(sistema: str | None = None) -> dict[str, int]:
-    """Count patients per system from the database."""
+def get_patient_ids(sistema: str | None = None) -> dict[str, list[int]]:
+    """Patient ids (with codigo) per system, most valuable first (HISTORY_PRIORITY)."""
     session = get_session()
+    prioritizer = get_prioritizer()
     try:
-        counts = {}
-        
+        ids = {}
+
         systems = []
         if sistema:
             if sistema.lower() == 'ouro':
@@ -39,158 +49,191 @@ def get_patient_count(sistema: str | None = None) -> dict[str, int]:
                 systems = [SistemaOrigem.OF]
         else:
             systems = [SistemaOrigem.OURO, SistemaOrigem.OF]
-        
+
         for sistema_enum in systems:
-            count = session.query(DadosCliente).filter(
+            rows = session.query(DadosCliente.id).filter(
                 DadosCliente.sistema_origem == sistema_enum,
                 DadosCliente.codigo.isnot(None)
-            ).count()
-            counts[sistema_enum.value] = count
-        
-        return counts
+            ).all()
+            ids[sistema_enum.value] = prioritizer.order(session, [row.id for row in rows])
+
+        return ids
+    finally:
+        session.close()
+
+
+def get_patient_costs(patient_ids: dict[str, list[int]]) -> dict[int, float]:
+    """Estimated scrape seconds per patient, from historico_raspagens."""
+    all_ids = [pid for ids in patient_ids.values() for pid in ids]
+    session = get_session()
+    try:
+        return estimated_costs(load_scrape_stats(session, all_ids), all_ids)
     finally:
         session.close()
 
 
-def worker_process(worker_id: int, sistema: str, offset: int, limit: int, result_queue: Queue):
+def worker_process(worker_id: int, name: str, work_queue, result_queue: Queue, tabs: int = 1):
     """
-    Worker process that handles a chunk of patients.
+    Worker process that pulls patient batches from the work queue until it is empty.
     Each worker has its own Selenium instance and database connection.
     """
-    print(f"[Worker {worker_id}] Starting - Sistema: {sistema.upper()}, Offset: {offset}, Limit: {limit}")
-    
+    print(f"[Worker {worker_id}] Starting - {name}")
+
     try:
         service = AppointmentHistoryService()
-        result = service.seed_history(
-            offset=offset,
-            limit=limit,
-            sistema_filter=sistema
-        )
-        
+        result = service.seed_history_from_queue(work_queue, name, tabs=tabs)
+
         result_queue.put({
             "worker_id": worker_id,
-            "sistema": sistema,
-            "offset": offset,
-            "limit": limit,
             "result": result
         })
-        
+
         print(f"[Worker {worker_id}] Completed - Stats: {result.get('stats', {})}")
-        
+
     except Exception as e:
         print(f"[Worker {worker_id}] ERROR: {e}")
         result_queue.put({
             "worker_id": worker_id,
-            "sistema": sistema,
-            "offset": offset,
-            "limit": limit,
             "error": str(e)
         })
 
 
-def run_parallel_sync(workers: int, sistema: str | None = None):
+def run_parallel_sync(
+    workers: int,
+    sistema: str | None = None,
+    tabs: int = 1,
+    batch_size: int = 10,
+    queue_backend: str = "local",
+    queue_name: str = "history",
+    join: bool = False,
+):
     """
     Main function to run parallel sync.
-    Divides patients into chunks and spawns worker processes.
+    Fills a work queue with small patient batches and spawns worker processes
+    that pull from it. Batches of a worker that dies are requeued and a
+    replacement worker is started while there is work left.
     """
     print("=" * 60)
     print("PARALLEL HISTORY SYNC")
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Workers: {workers}")
     print(f"Sistema: {sistema or 'all'}")
+    print(f"Tabs per worker: {tabs}")
+    print(f"Queue: {queue_backend} (batch size {batch_size})")
     print("=" * 60)
-    
-    # Get patient counts
-    counts = get_patient_count(sistema)
-    print(f"\nPatient counts: {counts}")
-    
-    if not counts:
-        print("No patients found to process.")
-        return
-    
-    # Create work chunks
-    work_chunks = []
-    
-    for sys_name, total in counts.items():
-        if total == 0:
-            continue
-            
-        # Divide patients among workers for this system
-        chunk_size = math.ceil(total / workers)
-        
-        print(f"\n{sys_name.upper()}: {total} patients, {chunk_size} per worker")
-        
-        for i in range(workers):
-            offset = i * chunk_size
-            if offset >= total:
-                break  # No more patients to process
-            
-            # Last chunk might be smaller
-            limit = min(chunk_size, total - offset)
-            
-            work_chunks.append({
-                "sistema": sys_name,
-                "offset": offset,
-                "limit": limit
-            })
-            print(f"  Chunk {i+1}: offset={offset}, limit={limit}")
-    
-    if not work_chunks:
-        print("No work chunks created.")
-        return
-    
+
+    if queue_backend == "redis":
+        work_queue = RedisWorkQueue(queue_name)
+    else:
+        work_queue = LocalWorkQueue()
+
+    if join:
+        print(f"\nJoining existing queue '{queue_name}': {work_queue.pending()} batches left")
+    else:
+        patient_ids = get_patient_ids(sistema)
+        print(f"\nPatient counts: { {k: len(v) for k, v in patient_ids.items()} }")
+        costs = get_patient_costs(patient_ids)
+        print(f"Estimated scrape time: {sum(costs.values()) / 3600:.1f}h (single Chrome)")
+
+        batches = []
+        for sys_name, ids in patient_ids.items():
+            batches.extend(make_batches(sys_name.lower(), ids, batch_size, costs))
+        if queue_backend == "redis":
+            work_queue.reset()
+        work_queue.put(batches)
+        print(f"Queued {len(batches)} batches")
+
+        if not batches:
+            print("No patients found to process.")
+            return
+
     # Create result queue
     result_queue = Queue()
-    
-    # Spawn worker processes
-    processes = []
-    print(f"\nSpawning {len(work_chunks)} worker processes...")
-    
-    for idx, chunk in enumerate(work_chunks):
+    results = []
+
+    def spawn(worker_id: int) -> Process:
+        name = worker_name(worker_id)
         p = Process(
             target=worker_process,
-            args=(idx + 1, chunk["sistema"], chunk["offset"], chunk["limit"], result_queue)
+            args=(worker_id, name, work_queue, result_queue, tabs)
         )
-        processes.append(p)
         p.start()
-        print(f"  Started worker {idx + 1} (PID: {p.pid})")
-    
-    # Wait for all processes to complete
+        processes[name] = p
+        print(f"  Started worker {worker_id} (PID: {p.pid})")
+        return p
+
+    # Spawn worker processes
+    processes = {}
+    print(f"\nSpawning {workers} worker processes...")
+    for idx in range(workers):
+        spawn(idx + 1)
+    next_worker_id = workers + 1
+    respawns_left = workers * 2
+
+    # Wait for workers, requeueing the batches of any worker that dies
     print("\nWaiting for workers to complete...")
-    for p in processes:
-        p.join()
-    
+    while processes:
+        while not result_queue.empty():
+            results.append(result_queue.get())
+
+        for name, p in list(processes.items()):
+            if p.is_alive():
+                continue
+            p.join()
+            del processes[name]
+            # Um worker que parou por erro sai com código 0 mas deixa o lote
+            # sem ack; depois de todos os acks isto não devolve nada.
+            requeued = work_queue.requeue_worker(name)
+            if p.exitcode == 0 and not requeued:
+                continue
+
+            print(f"Worker {name} stopped (exit code {p.exitcode}), {requeued} batches requeued")
+            if work_queue.pending() and respawns_left > 0:
+                respawns_left -= 1
+                spawn(next_worker_id)
+                next_worker_id += 1
+
+        time.sleep(1)
+
+    while not result_queue.empty():
+        results.append(result_queue.get())
+
     # Collect results
     print("\n" + "=" * 60)
     print("RESULTS SUMMARY")
     print("=" * 60)
-    
+
     total_stats = {
         "total_patients_processed": 0,
         "appointments_added": 0,
         "appointments_skipped_existing": 0,
+        "patients_skipped_has_recent": 0,
+        "batches": 0,
         "errors": 0
     }
-    
-    while not result_queue.empty():
-        result = result_queue.get()
+
+    for result in results:
         worker_id = result.get("worker_id")
-        
+
         if "error" in result:
             print(f"Worker {worker_id}: ERROR - {result['error']}")
             total_stats["errors"] += 1
         else:
             stats = result.get("result", {}).get("stats", {})
             print(f"Worker {worker_id}: {stats}")
-            
+
             for key in total_stats:
                 total_stats[key] += stats.get(key, 0)
-    
+
     print("\n" + "-" * 40)
     print("TOTAL:")
     for key, value in total_stats.items():
         print(f"  {key}: {value}")
-    
+
+    left = work_queue.pending()
+    if left:
+        print(f"\nWARNING: {left} batches were not processed")
+
     print(f"\nFinished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
 
@@ -204,6 +247,9 @@ Examples:
   uv run -m app.run_parallel --workers 4 --sistema ouro
   uv run -m app.run_parallel --workers 8 --sistema of
   uv run -m app.run_parallel --workers 4  # Both systems
+  uv run -m app.run_parallel --workers 2 --tabs 4  # 4 tabs per Chrome
+  uv run -m app.run_parallel --workers 4 --queue redis  # Multi-host queue
+  uv run -m app.run_parallel --workers 4 --queue redis --join  # Another host
         """
     )
     parser.add_argument(
@@ -219,6 +265,34 @@ Examples:
         choices=["ouro", "of"],
         help="Filter by system (ouro or of). If not specified, processes both."
     )
+    parser.add_argument(
+        "--tabs", "-t",
+        type=int,
+        default=1,
+        help="Chrome tabs per worker fetching histories concurrently (default: 1)"
+    )
+    parser.add_argument(
+        "--batch-size", "-b",
+        type=int,
+        default=10,
+        help="Patients per queue batch (default: 10)"
+    )
+    parser.add_argument(
+        "--queue", "-q",
+        choices=["local", "redis"],
+        default="local",
+        help="Work queue backend: local (multiprocessing) or redis (multi-host)"
+    )
+    parser.add_argument(
+        "--queue-name",
+        default="history",
+        help="Redis queue name shared by all hosts of the run (default: history)"
+    )
+    parser.add_argument(
+        "--join",
+        action="store_true",
+        help="Only start workers on an already filled Redis queue"
+    )
     
     args = parser.parse_args()
     
@@ -232,7 +306,19 @@ Examples:
         if response.lower() != 'y':
             sys.exit(0)
     
-    run_parallel_sync(workers=args.workers, sistema=args.sistema)
+    if args.join and args.queue != "redis":
+        print("Error: --join requires --queue redis")
+        sys.exit(1)
+
+    run_parallel_sync(
+        workers=args.workers,
+        sistema=args.sistema,
+        tabs=args.tabs,
+        batch_size=args.batch_size,
+        queue_backend=args.queue,
+        queue_name=args.queue_name,
+        join=args.join,
+    )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,8 @@
-import time
 from datetime import datetime
 
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 
 from app.scraper.base import Browser
 
@@ -12,8 +12,10 @@ settings = get_settings()
 
 
 class AppointmentCanceller(Browser):
-    def __init__(self):
-        super().__init__()
+    ALLOWED_RESOURCES = ("stylesheet",)
+
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
 
     @staticmethod
     def _normalize_text(value: str | None) -> str:
@@ -169,7 +171,13 @@ class AppointmentCanceller(Browser):
                 try:
                     self.execute_script("arguments[0].click();", desmarcado_button)
                     print("Botão 'Desmarcado' clicado via JavaScript.")
-                    time.sleep(2)
+                    self.wait_until(
+                        "cancel_confirm_modal",
+                        EC.invisibility_of_element_located(
+                            (By.CSS_SELECTOR, "button[data-bb-handler='main']")
+                        ),
+                        replaces=2,
+                    )
                 except Exception: 
                     print("Falha ao clicar no botão 'Desmarcado' via JavaScript. Tentando método padrão.")
                     desmarcado_button = self.wait_for_element(By.CSS_SELECTOR, "button[data-bb-handler='danger']")
@@ -183,8 +191,8 @@ class AppointmentCanceller(Browser):
                     else:
                         print("ERRO: Botão 'Desmarcado' não encontrado após falha do JS.")
                         raise TimeoutException("Botão 'Desmarcado' não encontrado após tentativa de clique JS.")
-                                        
-                time.sleep(2)
+
+                self.wait_for_ajax_idle(replaces=2, name="cancel_save")
     
     
                 print("Cancelamento concluído com sucesso!")
@@ -1,4 +1,3 @@
-import time
 from datetime import datetime
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
@@ -11,8 +10,10 @@ from app.scraper.base import Browser
 
 
 class AppointmentScheduler(Browser):
-    def __init__(self):
-        super().__init__()
+    ALLOWED_RESOURCES = ("stylesheet",)
+
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
 
     def _select_convenio_digitando(self, convenio_nome: str):
         """
@@ -36,11 +37,14 @@ class AppointmentScheduler(Browser):
         if search_field:
             search_field.clear()
             search_field.send_keys(convenio_nome.strip())
-            time.sleep(1)
 
         option_xpath = f"//li[contains(@class, 'select2-results__option') and contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'), '{convenio_nome.upper()}')]"
-        option = self.wait_for_element(
-            By.XPATH, option_xpath, expectation=EC.element_to_be_clickable
+        option = self.wait_for_dom_marker(
+            By.XPATH,
+            option_xpath,
+            replaces=1,
+            expectation=EC.element_to_be_clickable,
+            name="select2_convenio",
         )
         if option:
             try:
@@ -88,11 +92,14 @@ class AppointmentScheduler(Browser):
         if search_field:
             search_field.clear()
             search_field.send_keys(tipo_atendimento.strip())  # pyright: ignore[reportOptionalMemberAccess]
-            time.sleep(1)
 
         option_xpath = f"//li[contains(@class, 'select2-results__option') and contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'), '{(tipo_atendimento or '').upper()}')]"
-        option = self.wait_for_element(
-            By.XPATH, option_xpath, expectation=EC.element_to_be_clickable
+        option = self.wait_for_dom_marker(
+            By.XPATH,
+            option_xpath,
+            replaces=1,
+            expectation=EC.element_to_be_clickable,
+            name="select2_tipo_atendimento",
         )
 
         if option:
@@ -199,8 +206,10 @@ class AppointmentScheduler(Browser):
                 }
 
             try:
+                # A linha já carregou: a célula vazia (horário livre) é
+                # verificada na hora, sem esperar um timeout.
                 elementos_filhos_xpath = f"//tr[@id='{horario_id}']/td[2]/*"
-                elementos_filhos = self.wait_for_element(
+                elementos_filhos = self.find_elements(
                     By.XPATH, elementos_filhos_xpath
                 )
 
@@ -273,7 +282,7 @@ class AppointmentScheduler(Browser):
                 
                 print(f"Paciente com CPF {cpf_paciente} selecionado com sucesso.")
 
-                time.sleep(2)
+                self.wait_for_ajax_idle(replaces=2, name="seleciona_paciente")
 
                 data_nascimento_input = self.wait_for_element(
                     By.ID, "dataNascimentoAgenda"
@@ -292,7 +301,7 @@ class AppointmentScheduler(Browser):
                     f"Data de nascimento preenchida: {paciente_info['data_nascimento']}"
                 )
 
-                time.sleep(2)
+                self.wait_for_ajax_idle(replaces=2, name="data_nascimento")
 
             else:
                 print(
@@ -301,16 +310,16 @@ class AppointmentScheduler(Browser):
 
                 self.save_screenshot("debug_paciente_nao_encontrado.png")
 
-                time.sleep(2)
-
                 criar_paciente_xpath = (
                     "//td[contains(@onclick, 'adicionaPacienteNovoAgenda')]" 
                 )
-                criar_paciente_button = self.wait_for_element(
+                criar_paciente_button = self.wait_for_dom_marker(
                     By.XPATH,
                     criar_paciente_xpath,
-                    expectation=EC.element_to_be_clickable,
                     timeout=20,
+                    replaces=2,
+                    expectation=EC.element_to_be_clickable,
+                    name="botao_novo_paciente",
                 )
 
                 if not criar_paciente_button:
@@ -380,7 +389,7 @@ class AppointmentScheduler(Browser):
 
                 print(f"Nome final definido como: {nome_val}")
 
-                time.sleep(5)
+                self.wait_for_ajax_idle(replaces=5, name="form_novo_paciente")
 
                 botao_salvar = self.wait_for_element(By.ID, "btSalvarAgenda")
                 self.execute_script("arguments[0].click();", botao_salvar)
@@ -388,7 +397,7 @@ class AppointmentScheduler(Browser):
 
                 self.wait_for_staleness_element(botao_salvar, timeout=15)
 
-                time.sleep(5)
+                self.wait_for_ajax_idle(replaces=5, name="salvar_novo_paciente")
                 return {
                     "status": "success",
                     "message": "Agendamento de novo paciente realizado.",
@@ -433,7 +442,12 @@ class AppointmentScheduler(Browser):
             if botao_salvar:
                 try:
                     self.execute_script("arguments[0].scrollIntoView(true);", botao_salvar)
-                    time.sleep(1)
+                    self.wait_until(
+                        "salvar_clicavel",
+                        EC.element_to_be_clickable(botao_salvar),
+                        timeout=5,
+                        replaces=1,
+                    )
                     botao_salvar.click()
                     print("Botão 'Salvar' clicado nativamente.")
                 except Exception as e:
@@ -453,9 +467,13 @@ class AppointmentScheduler(Browser):
                         (By.CSS_SELECTOR, ".invalid-feedback"),
                         (By.CSS_SELECTOR, ".toast-message"),
                     ]
+                    # Espera a resposta do Salvar uma vez e então consulta os
+                    # alertas na hora, em vez de 2s de timeout por seletor.
+                    self.wait_for_ajax_idle(timeout=4, name="validacao_salvar")
                     for by, selector in alert_selectors:
                         try:
-                            elemento = self.wait_for_element(by, selector, timeout=2)
+                            elementos = self.find_elements(by, selector)
+                            elemento = elementos[0] if elementos else None
                             if elemento and elemento.is_displayed():
                                 texto = elemento.text.strip()
                                 if texto:
@@ -509,8 +527,7 @@ class AppointmentScheduler(Browser):
                 self.save_screenshot("erro_botao_salvar_paciente_existente.png")
                 return {"status": "error", "message": "O modal de agendamento não fechou."}
 
-
-            time.sleep(5)
+            self.wait_for_ajax_idle(replaces=5, name="salvar_agendamento")
 
             print("Agendamento concluído com sucesso!")
             return {"status": "success", "message": "Agendamento realizado."}
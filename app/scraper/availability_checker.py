@@ -11,8 +11,10 @@ class AvailabilityChecker(Browser):
         Classe responsável por verificar a disponibilidade de consultas no sistema softclyn.
         Herda de Browser para reutilizar a inicialização do self e o login.
     """
-    def __init__(self):
-        super().__init__()
+    ALLOWED_RESOURCES = ("stylesheet",)
+
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
     
     def _verify_availability(self, data_desejada: str | None = None, horario_desejado: str | None = None, horario_inicial: str | None = None, horario_final: str | None = None):
         if data_desejada and horario_desejado:
@@ -45,7 +47,7 @@ class AvailabilityChecker(Browser):
             print(f"Data selecionada: {data_desejada}")
 
             try:
-                no_expediente_div = self.wait_for_element(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
+                no_expediente_div = self.find_elements(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
                 if no_expediente_div:
                     print(f"A data {data_desejada} é um fim de semana ou feriado.")
                     return {"status": "unavailable", "message": f"A data {data_desejada} não tem expediente."}
@@ -104,7 +106,7 @@ class AvailabilityChecker(Browser):
 
             print(f"Data selecionada: {data_desejada}. Verificando horários entre {horario_inicial} e {horario_final}.")
 
-            no_expediente = self.wait_for_element(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
+            no_expediente = self.find_elements(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
             if no_expediente:
                 return {"status": "unavailable", "message": f"A data {data_desejada} não tem expediente."}
 
@@ -150,8 +152,7 @@ class AvailabilityChecker(Browser):
                     continue
 
                 try:
-                    self.wait_for_element(By.XPATH, "//tr[@class='ui-droppable']")
-                    self.wait_for_element(By.XPATH, "//div[contains(@class, 'alert-info') and contains(text(), 'expediente')]")
+                    self._is_timetable()
                 except TimeoutException:
                     print(f"A grade de horários para {check_date_str_display} não carregou (Timeout). Pulando.")
                     current_date += timedelta(days=1)
@@ -161,7 +162,7 @@ class AvailabilityChecker(Browser):
 
                 is_working_day = True
 
-                no_expediente = self.wait_for_element(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
+                no_expediente = self.find_elements(By.XPATH, "//div[@class='alert alert-info' and contains(text(), 'Não há expediente neste dia!')]")
                 if no_expediente:
                     is_working_day = False
 
@@ -1,30 +1,176 @@
+import base64
+import io
+import json
 import os
 import time
 
 from selenium import webdriver
-from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 
 from ..core.dependencies import get_settings
+from ..core.tracing import span, traced
+from .downloads import (
+    EXCEL_SIGNATURES,
+    DownloadTracker,
+    ExportCaptureError,
+    make_download_dir,
+    remove_download_dir,
+    sweep_download_dirs,
+)
+from .driver_resolver import resolve_chromedriver
+from .recorder import SoftclynRecorder
+from .session_store import invalidate_session, load_session, save_session
+
+
+MEDICOS_SOFTCLYN_OF = ["ANDRÉ A. S. BAGANHA", "JOAO R.C.MATOS"]
+
+# Página carregada e nenhuma requisição jQuery em andamento.
+AJAX_IDLE_SCRIPT = (
+    "return document.readyState === 'complete' && "
+    "(typeof jQuery === 'undefined' || jQuery.active === 0);"
+)
+
+# Padrões de URL (Network.setBlockedURLs) por categoria de recurso. As
+# categorias ativas vêm de BLOCKED_RESOURCES; cada scraper pode liberar
+# algumas via ALLOWED_RESOURCES.
+RESOURCE_URL_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.ico*", "*.webp*", "*.bmp*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*"],
+    "stylesheet": ["*.css*"],
+    "third_party": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*fonts.googleapis.com*",
+        "*fonts.gstatic.com*",
+        "*facebook.net*",
+        "*hotjar.com*",
+        "*gravatar.com*",
+    ],
+}
+
+# POST de exportação pelo próprio Chrome: mesmos cookies da sessão, corpo
+# devolvido em base64 sem virar download.
+FETCH_EXPORT_SCRIPT = """
+const [url, params, done] = arguments;
+fetch(url, {
+    method: "POST",
+    credentials: "include",
+    headers: {"X-Requested-With": "XMLHttpRequest"},
+    body: new URLSearchParams(params),
+})
+    .then((response) => {
+        if (!response.ok) throw new Error("HTTP " + response.status);
+        return response.blob();
+    })
+    .then((blob) => {
+        const reader = new FileReader();
+        reader.onload = () => done({data: reader.result.split(",")[1] || ""});
+        reader.onerror = () => done({error: String(reader.error)});
+        reader.readAsDataURL(blob);
+    })
+    .catch((error) => done({error: String(error)}));
+"""
+
+
+def ajax_idle_condition(settle: float = 0.3):
+    """
+    Condição de espera: documento carregado e jQuery.active == 0 por `settle`
+    segundos seguidos, para não aceitar o intervalo antes da requisição começar.
+    """
+    idle_since = [None]
+
+    def ajax_idle(driver):
+        try:
+            idle = driver.execute_script(AJAX_IDLE_SCRIPT)
+        except Exception:
+            idle = False
+        if not idle:
+            idle_since[0] = None
+            return False
+        if idle_since[0] is None:
+            idle_since[0] = time.perf_counter()
+        return time.perf_counter() - idle_since[0] >= settle
+
+    return ajax_idle
+
+
+def sistema_for_medico(medico: str | None, default: str = "ouro") -> str:
+    """Retorna 'of' para os médicos atendidos no SoftClyn OF, senão o sistema padrão."""
+    if medico:
+        medico_limpo = medico.replace("Dr.", "").replace("Dra.", "").strip()
+        for dr in MEDICOS_SOFTCLYN_OF:
+            if medico_limpo.upper() in dr.upper():
+                return "of"
+    return default.lower()
 
 
 class Browser:
-    def __init__(self, prefs=None):
-        options = webdriver.ChromeOptions()
+    # Categorias de RESOURCE_URL_PATTERNS que este scraper precisa carregar
+    # mesmo com o bloqueio ativo. Scrapers que operam modais, botões e menus
+    # liberam "stylesheet": sem CSS, visibilidade e clicabilidade não batem.
+    ALLOWED_RESOURCES: tuple[str, ...] = ()
+
+    def __init__(self, prefs=None, driver=None):
+        self.settings = get_settings()
+        self.is_softclyn_of = False
+        self.current_system = "ouro"
+        # Sistema em que o Chrome já está autenticado e a URL da tela inicial
+        # pós-login; permitem pular o formulário quando a sessão é reaproveitada.
+        self._logged_in_as = None
+        self._home_url = None
+        # Uma entrada por espera: nome, tempo real e o sleep fixo que ela substituiu.
+        self.wait_log = []
+        self._http_client = None
+        # Pasta de downloads exclusiva deste Browser (criada na primeira exportação).
+        self.download_dir = None
+        # RECORD_DIR: grava as respostas do SoftClyn para o servidor mock.
+        self._recorder = None
+        if self.settings.record_dir:
+            self._recorder = SoftclynRecorder(
+                self.settings.record_dir,
+                self.settings.softclyn_url,
+                secrets=(self.settings.softclyn_pass,),
+            )
+
+        self._driver = None
+        if driver is not None:
+            # Chrome emprestado (ex.: pool do worker): quem criou é quem encerra.
+            self._driver = driver
+            self.owns_driver = False
+            self._apply_resource_blocking()
+            return
+
+        # O Chrome só é aberto no primeiro acesso a self.driver, assim fluxos
+        # atendidos pelo SoftclynHttpClient não pagam o custo do navegador.
+        self.owns_driver = True
 
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        DOWNLOAD_DIR = os.path.join(BASE_DIR, "data")
+    @property
+    def driver(self):
+        if self._driver is None and self.owns_driver:
+            self._driver = self._start_driver()
+        return self._driver
 
-        # Garante que a pasta exista
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    @driver.setter
+    def driver(self, value):
+        self._driver = value
 
+    def _start_driver(self):
+        options = webdriver.ChromeOptions()
+
+        # Sem pasta de download padrão: cada exportação define a sua em
+        # prepare_downloads, para que Chromes paralelos não se sobrescrevam.
         prefs = {
-            "download.default_directory": DOWNLOAD_DIR,
             "download.prompt_for_download": False,
             "download.directory_upgrade": True,
             "safebrowsing.enabled": True,
@@ -40,6 +186,9 @@ class Browser:
         options.add_argument("--remote-debugging-port=0")
         options.add_argument("--disable-web-security")
         options.add_argument("--disable-renderer-backgrounding")
+        # Abas em segundo plano (histórico multi-aba) sem timers estrangulados.
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-backgrounding-occluded-windows")
         options.add_argument("--disable-features=IsolateOrigins,site-per-process")
         options.add_argument("--no-first-run")
         options.add_argument("--no-default-browser-check")
@@ -49,14 +198,32 @@ class Browser:
         options.add_argument("--disable-infobars")
         options.add_experimental_option("useAutomationExtension", False)
         options.set_capability("pageLoadStrategy", "normal")
+        if self.settings.resource_report or self._recorder:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            options.add_experimental_option(
+                "perfLoggingPrefs", {"enableNetwork": True, "enablePage": False}
+            )
 
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.set_page_load_timeout(180)
-        self.driver.implicitly_wait(10)
-        self.settings = get_settings()
-        self.is_softclyn_of = False
-        self.current_system = "ouro"
+        service = Service(resolve_chromedriver())
+        driver = webdriver.Chrome(service=service, options=options)
+        driver.set_page_load_timeout(180)
+        # Sem espera implícita: buscas negativas falham na hora e toda espera
+        # passa pelas condições explícitas de wait_until.
+        driver.implicitly_wait(0)
+        self._driver = driver
+        self._apply_resource_blocking()
+        return driver
+
+    @classmethod
+    def from_browser(cls, browser: "Browser"):
+        """
+        Cria o scraper sobre o Chrome de outro Browser, herdando a sessão já logada.
+        """
+        scraper = cls(driver=browser.driver)
+        scraper.current_system = browser.current_system
+        scraper._logged_in_as = browser._logged_in_as
+        scraper._home_url = browser._home_url
+        return scraper
 
     def __enter__(self):
         return self
@@ -68,9 +235,89 @@ class Browser:
         """Define qual sistema será acessado no próximo login."""
         self.current_system = sistema
 
+    @traced("browser.get")
     def get(self, url, timeout=60):
         self.driver.set_page_load_timeout(timeout)
+        if not self.settings.resource_report:
+            # Grava o que a página atual carregou antes que a navegação descarte os corpos.
+            self._record_responses()
+            self.driver.get(url)
+            self._record_responses()
+            return
+        self.resource_report()  # descarta o que veio antes desta navegação
         self.driver.get(url)
+        print(f"Recursos em {url}: {self.resource_report()}")
+
+    def blocked_url_patterns(self) -> list[str]:
+        """Padrões bloqueados: categorias de BLOCKED_RESOURCES menos ALLOWED_RESOURCES."""
+        patterns = []
+        for category in self.settings.blocked_resources.split(","):
+            category = category.strip()
+            if category and category not in self.ALLOWED_RESOURCES:
+                patterns.extend(RESOURCE_URL_PATTERNS.get(category, []))
+        return patterns
+
+    def _apply_resource_blocking(self):
+        """
+        Aplica a lista de bloqueio deste scraper no Chrome. Também roda sobre
+        Chromes emprestados, então a lista é sempre sobrescrita (mesmo vazia).
+        """
+        patterns = self.blocked_url_patterns()
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        except Exception as e:
+            print(f"Não foi possível configurar o bloqueio de recursos: {e}")
+
+    def resource_report(self) -> dict | None:
+        """
+        Requisições e bytes carregados/bloqueados desde a última chamada, lidos
+        do log de performance do Chrome. Só disponível com RESOURCE_REPORT=true.
+        """
+        if not self.settings.resource_report:
+            return None
+        messages = self._performance_messages()
+        if messages is None:
+            return None
+
+        report = {"requests": 0, "bytes": 0, "blocked": 0, "blocked_by_type": {}}
+        for message in messages:
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                report["requests"] += 1
+            elif method == "Network.loadingFinished":
+                report["bytes"] += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                report["blocked"] += 1
+                resource_type = params.get("type", "Other")
+                report["blocked_by_type"][resource_type] = (
+                    report["blocked_by_type"].get(resource_type, 0) + 1
+                )
+        return report
+
+    def _performance_messages(self) -> list[dict] | None:
+        """
+        Esvazia o log de performance do Chrome. Com RECORD_DIR as mensagens
+        passam antes pelo gravador de fixtures.
+        """
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception:
+            return None
+        messages = []
+        for entry in entries:
+            try:
+                messages.append(json.loads(entry["message"])["message"])
+            except (KeyError, ValueError):
+                continue
+        if self._recorder:
+            self._recorder.capture(self.driver, messages)
+        return messages
+
+    def _record_responses(self):
+        if self._recorder and self._driver:
+            self._performance_messages()
 
     def find_element(self, by, value):
         return self.driver.find_element(by, value)
@@ -85,6 +332,7 @@ class Browser:
         except TimeoutException:
             return False
 
+    @traced("browser.wait_for_element")
     def wait_for_element(
         self, by, value, expectation=EC.presence_of_element_located, timeout=10
     ):
@@ -96,6 +344,163 @@ class Browser:
         except TimeoutException:
             return None
 
+    def require_element(
+        self, by, value, expectation=EC.presence_of_element_located, timeout=10
+    ):
+        """
+        find_element para elementos que precisam existir: espera até `timeout`
+        (o implicitly_wait do driver é 0) e levanta NoSuchElementException se
+        o elemento não aparecer.
+        """
+        element = self.wait_until(f"dom:{value}", expectation((by, value)), timeout)
+        if not element:
+            raise NoSuchElementException(f"{value} não apareceu em {timeout}s")
+        return element
+
+    def wait_until(self, name: str, condition, timeout=10, replaces=0.0, poll=0.1):
+        """
+        Espera uma condição de prontidão e registra quanto tempo ela levou.
+
+        `replaces` é o sleep fixo que a espera substituiu, para medir a economia.
+        Retorna o valor da condição ou None em caso de timeout.
+        """
+        start = time.perf_counter()
+        with span(f"wait:{name}"):
+            try:
+                result = WebDriverWait(self.driver, timeout, poll_frequency=poll).until(
+                    condition
+                )
+            except TimeoutException:
+                result = None
+        elapsed = time.perf_counter() - start
+        self._record_responses()
+        self.wait_log.append(
+            {
+                "name": name,
+                "elapsed": elapsed,
+                "replaces": replaces,
+                "ok": result is not None and result is not False,
+            }
+        )
+        return result
+
+    def wait_for_dom_marker(
+        self,
+        by,
+        value,
+        timeout=10,
+        replaces=0.0,
+        expectation=EC.presence_of_element_located,
+        name: str | None = None,
+    ):
+        """Espera um elemento que marca que a tela/fragmento terminou de carregar."""
+        return self.wait_until(
+            name or f"dom:{value}", expectation((by, value)), timeout, replaces
+        )
+
+    def wait_for_ajax_idle(self, timeout=10, replaces=0.0, settle=0.3, name="ajax_idle"):
+        """Espera o fim das requisições AJAX da tela (ver ajax_idle_condition)."""
+        return self.wait_until(name, ajax_idle_condition(settle), timeout, replaces)
+
+    def wait_for_text_change(
+        self, by, value, old_text: str | None, timeout=10, replaces=0.0, name=None
+    ):
+        """Espera o texto de um elemento ficar diferente de `old_text`."""
+
+        def text_changed(driver):
+            try:
+                elements = driver.find_elements(by, value)
+                if not elements:
+                    return False
+                text = elements[0].text
+            except StaleElementReferenceException:
+                return False
+            return text if text != old_text else False
+
+        return self.wait_until(name or f"text:{value}", text_changed, timeout, replaces)
+
+    def prepare_downloads(self, job: str) -> str:
+        """
+        Cria (uma vez por Browser) a pasta de downloads deste job e aponta o
+        Chrome para ela via CDP. Roda a cada exportação porque um Chrome
+        emprestado pode ter sido configurado por outro Browser antes.
+        """
+        if self.download_dir is None:
+            sweep_download_dirs(self.settings.download_dir_ttl_hours, self.settings.download_root)
+            self.download_dir = make_download_dir(job, self.settings.download_root)
+        self.driver.execute_cdp_cmd(
+            "Page.setDownloadBehavior",
+            {"behavior": "allow", "downloadPath": self.download_dir},
+        )
+        return self.download_dir
+
+    def fetch_export(self, path: str, params: dict) -> io.BytesIO:
+        """
+        Faz o POST de exportação dentro do Chrome logado e devolve o Excel em
+        memória, sem download nem arquivo em disco. Levanta ExportCaptureError
+        se a resposta não for um Excel (ex.: sessão expirada).
+        """
+        url = f"{self.settings.softclyn_url}/{self.settings.softclyn_empresa}_{self.current_system}/{path}"
+        with span(f"export:{path}"):
+            self.driver.set_script_timeout(self.settings.page_load_timeout)
+            result = self.driver.execute_async_script(FETCH_EXPORT_SCRIPT, url, params) or {}
+        if result.get("error"):
+            raise ExportCaptureError(f"{path}: {result['error']}")
+        content = base64.b64decode(result.get("data") or "")
+        if not content.startswith(EXCEL_SIGNATURES):
+            raise ExportCaptureError(f"{path} não retornou um Excel")
+        return io.BytesIO(content)
+
+    def expect_download(self, job: str, pattern: str = "*.xls") -> DownloadTracker:
+        """
+        Prepara a pasta do job e começa a observá-la. Chame antes de clicar em
+        exportar e passe o tracker para wait_for_download.
+        """
+        return DownloadTracker(self.prepare_downloads(job), pattern)
+
+    def wait_for_download(
+        self, tracker: DownloadTracker, timeout=30, replaces=0.0
+    ) -> tuple[str, int]:
+        """
+        Espera o download observado por `tracker` terminar e retorna caminho e
+        tamanho. Levanta DownloadTimeoutError no prazo; o tracker é fechado.
+        """
+        name = f"download:{tracker.pattern}"
+        start = time.perf_counter()
+        path = None
+        try:
+            with span(f"wait:{name}"), tracker:
+                path, size = tracker.wait(timeout)
+        finally:
+            self.wait_log.append(
+                {
+                    "name": name,
+                    "elapsed": time.perf_counter() - start,
+                    "replaces": replaces,
+                    "ok": path is not None,
+                }
+            )
+            self._record_responses()
+        if self._recorder:
+            self._recorder.attach_download(path)
+        return path, size
+
+    def reset_wait_log(self):
+        self.wait_log = []
+
+    def wait_report(self) -> dict:
+        """Totais das esperas registradas: tempo esperado x sleeps fixos substituídos."""
+        waited = sum(w["elapsed"] for w in self.wait_log)
+        replaced = sum(w["replaces"] for w in self.wait_log)
+        return {
+            "waits": len(self.wait_log),
+            "timeouts": sum(1 for w in self.wait_log if not w["ok"]),
+            "waited": round(waited, 3),
+            "replaced": round(replaced, 3),
+            "saved": round(replaced - waited, 3),
+        }
+
+    @traced("browser.execute_script")
     def execute_script(self, script, *args):
         return self.driver.execute_script(script, *args)
 
@@ -103,23 +508,76 @@ class Browser:
         self.driver.refresh()
 
     def save_screenshot(self, filename):
+        if self._driver is None:
+            return
         try:
             self.driver.save_screenshot(filename)
         except Exception as e:
             print(f"Could not save screenshot (driver may be disconnected): {e}")
 
     def quit(self):
-        if self.driver:
+        if self._http_client:
+            self._http_client.close()
+            self._http_client = None
+        self._record_responses()
+        remove_download_dir(self.download_dir)
+        self.download_dir = None
+        if self._driver and not self.owns_driver:
+            # Não encerra um Chrome emprestado, apenas solta a referência.
+            self._driver = None
+            return
+        if self._driver:
             try:
-                self.driver.quit()
+                self._driver.quit()
             except Exception as e:
                 print(f"Could not close browser cleanly: {e}")
             finally:
-                self.driver = None
+                self._driver = None
+
+    def is_session_alive(self) -> bool:
+        """Verifica se o Chrome responde e ainda está dentro do sistema logado."""
+        if not self._driver or not self._logged_in_as:
+            return False
+        try:
+            current_url = self.driver.current_url or ""
+        except Exception:
+            return False
+        sistema_path = f"{self.settings.softclyn_empresa}_{self._logged_in_as}/"
+        return (
+            sistema_path in current_url
+            and self.settings.softclyn_login_page not in current_url
+        )
 
     def close(self):
         self.quit()
 
+    def _http_fetch(self, operation: str, *args):
+        """
+        Executa a operação pelo SoftclynHttpClient quando HTTP_FETCH_ENABLED.
+        Retorna None quando o modo HTTP está desligado ou falhou, para o
+        chamador seguir pelo Selenium.
+        """
+        if not self.settings.http_fetch_enabled or self._recorder:
+            # Gravando fixtures, tudo precisa passar pelo Chrome.
+            return None
+        from .http_client import SoftclynHttpClient, SoftclynHttpError
+
+        sistema = self.current_system.lower()
+        if self._http_client is None or self._http_client.sistema != sistema:
+            if self._http_client:
+                self._http_client.close()
+            cookies = None
+            if self._driver and self._logged_in_as == sistema:
+                cookies = self._driver.get_cookies()
+            self._http_client = SoftclynHttpClient(sistema, cookies=cookies)
+
+        try:
+            return getattr(self._http_client, operation)(*args)
+        except SoftclynHttpError as e:
+            print(f"Modo HTTP indisponível para {operation} ({e}), usando o Chrome.")
+            return None
+
+    @traced("browser.menu_agendamento")
     def _click_on_appointment_menu(self):
         menu = self.wait_for_element(By.ID, "menuAtendimentoLi")
         if menu:
@@ -137,10 +595,11 @@ class Browser:
             except Exception:
                 self.execute_script("arguments[0].click();", agendamento)
 
-        print("Entrou na tela de agendamento.")
+        self.wait_for_ajax_idle(replaces=2, name="menu_agendamento")
 
-        time.sleep(2)
+        print("Entrou na tela de agendamento.")
 
+    @traced("browser.search_doctor")
     def _search_doctor(self, medico: str):
         try:
             select_doctor_clickable = self.wait_for_element(
@@ -155,12 +614,15 @@ class Browser:
             print("Campo de busca do Select2 encontrado.")
 
             medico_limpo = medico.replace("Dr.", "").replace("Dra.", "").strip()
+            medico_option_xpath = f"//li[contains(@class, 'select2-results__option') and contains(text(), '{medico_limpo}')]"
 
             print(f"Digitando '{medico_limpo}'...")
             if search_field:
                 search_field.send_keys(medico_limpo)
 
-            time.sleep(2)
+            self.wait_for_dom_marker(
+                By.XPATH, medico_option_xpath, replaces=2, name="select2_medico"
+            )
 
             print(f"Nome '{medico_limpo}' digitado no campo de busca.")
 
@@ -175,8 +637,6 @@ class Browser:
                 pass
 
             try:
-                medico_option_xpath = f"//li[contains(@class, 'select2-results__option') and contains(text(), '{medico_limpo}')]"
-
                 medico_option = self.wait_for_element(By.XPATH, medico_option_xpath)
                 if medico_option:
                     medico_option.click()
@@ -184,8 +644,13 @@ class Browser:
             except TimeoutException:
                 print("Opção não encontrada ou já selecionada pelo ENTER.")
             except StaleElementReferenceException:
-                time.sleep(1)
-                medico_option = self.wait_for_element(By.XPATH, medico_option_xpath)
+                medico_option = self.wait_for_dom_marker(
+                    By.XPATH,
+                    medico_option_xpath,
+                    replaces=1,
+                    expectation=EC.element_to_be_clickable,
+                    name="select2_medico_stale",
+                )
                 if medico_option:
                     medico_option.click()
 
@@ -195,6 +660,90 @@ class Browser:
             print(f"Ocorreu outro erro: {e}")
             raise
 
+    def _resolve_sistema(self, medico: str | None = None) -> str:
+        """Define em qual sistema (ouro/of) o login deve ser feito."""
+        sistema = sistema_for_medico(medico, default=self.current_system)
+        if medico and sistema == "of":
+            self.is_softclyn_of = True
+        return sistema
+
+    def _login_url(self, sistema: str) -> str:
+        URL = self.settings.softclyn_url
+        LOGIN = self.settings.softclyn_login_page
+        return f"{URL}/{self.settings.softclyn_empresa}_{sistema}/{LOGIN}"
+
+    def _resume_session(self, sistema: str) -> bool:
+        """
+        Reaproveita a sessão já autenticada voltando para a tela inicial do sistema.
+        Retorna False se a sessão expirou e o login completo é necessário.
+        """
+        if self._logged_in_as != sistema or not self._home_url:
+            return False
+        if not self.is_session_alive():
+            return False
+
+        print(f"Sessão {sistema.upper()} já autenticada, voltando para a tela inicial.")
+        try:
+            self.get(self._home_url, timeout=self.settings.page_load_timeout)
+        except Exception as e:
+            print(f"Falha ao reaproveitar sessão: {e}")
+            return False
+
+        if not self.is_session_alive():
+            print("Sessão expirada, refazendo login.")
+            self._logged_in_as = None
+            return False
+        return True
+
+    def _restore_session(self, sistema: str) -> bool:
+        """
+        Injeta os cookies de um login anterior salvo no Redis e abre a tela
+        inicial direto. Retorna False se não houver sessão salva ou se o
+        servidor não a aceitar mais (nesse caso ela é descartada).
+        """
+        session = load_session(sistema)
+        if not session:
+            return False
+
+        print(f"Reaproveitando sessão {sistema.upper()} salva no Redis.")
+        try:
+            # Via CDP os cookies entram antes de qualquer navegação ao domínio,
+            # evitando carregar a página de login só para poder setá-los.
+            for cookie in session["cookies"]:
+                params = {
+                    "name": cookie["name"],
+                    "value": cookie["value"],
+                    "domain": cookie.get("domain"),
+                    "path": cookie.get("path", "/"),
+                    "secure": cookie.get("secure", False),
+                    "httpOnly": cookie.get("httpOnly", False),
+                }
+                if cookie.get("expiry"):
+                    params["expires"] = cookie["expiry"]
+                if cookie.get("sameSite"):
+                    params["sameSite"] = cookie["sameSite"]
+                self.driver.execute_cdp_cmd("Network.setCookie", params)
+
+            self._logged_in_as = sistema
+            self._home_url = session["home_url"]
+            self.get(self._home_url, timeout=self.settings.page_load_timeout)
+        except Exception as e:
+            print(f"Falha ao injetar sessão salva: {e}")
+            self._logged_in_as = None
+            self._home_url = None
+            return False
+
+        if not self.is_session_alive() or self.find_elements(By.ID, "btLogin"):
+            print("Sessão salva expirou no servidor, refazendo login.")
+            invalidate_session(sistema)
+            self._logged_in_as = None
+            self._home_url = None
+            return False
+
+        self.wait_for_ajax_idle(name="login_ajax")
+        return True
+
+    @traced("browser.login")
     def _login(
         self,
         medico: str | None = None,
@@ -203,47 +752,20 @@ class Browser:
         Realiza o login no sistema Softclyn.
         """
         try:
-            URL = self.settings.softclyn_url
-            LOGIN = self.settings.softclyn_login_page
+            sistema = self._resolve_sistema(medico)
 
-            sistema_sufixo = f"_{self.current_system.lower()}"
+            if self._resume_session(sistema) or self._restore_session(sistema):
+                return
 
-            # URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_ouro/{LOGIN}"
-
-            if medico:
-                medicos_softclyn_of = ["ANDRÉ A. S. BAGANHA", "JOAO R.C.MATOS"]
-                medico_limpo = medico.replace("Dr.", "").replace("Dra.", "").strip()
-
-                sistema_sufixo = (
-                    f"{self.settings.softclyn_empresa}_{self.current_system.lower()}"
-                )
-
-                for dr in medicos_softclyn_of:
-                    if medico_limpo.upper() in dr.upper():
-                        #  URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_of/{LOGIN}"
-                        sistema_sufixo = "_of"
-                        self.is_softclyn_of = True
-                        break
-
-                if "_of" in sistema_sufixo:
-                    URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_of/{LOGIN}"
-                else:
-                    URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_{self.current_system.lower()}/{LOGIN}"
-            else:
-                URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_{self.current_system.lower()}/{LOGIN}"
-            # if is_softclyn_of:
-            #     URL_BASE = f"{URL}/{self.settings.softclyn_empresa}_of/{LOGIN}"
-            #     self.is_softclyn_of = True
+            URL_BASE = self._login_url(sistema)
 
             print(f"Navigating to: {URL_BASE}")
             self.get(URL_BASE, timeout=self.settings.page_load_timeout)
 
-            time.sleep(3)
-
             print("Waiting for login form...")
-            self.wait_for_element(By.TAG_NAME, "body")
-
-            user = self.wait_for_element(By.ID, "usuario", timeout=10)
+            user = self.wait_for_dom_marker(
+                By.ID, "usuario", replaces=3, name="login_form"
+            )
             if not user:
                 raise Exception("User field not found")
             print("User field found")
@@ -251,9 +773,10 @@ class Browser:
             self.execute_script(
                 "arguments[0].value = arguments[1];", user, self.settings.softclyn_user
             )
-            time.sleep(1)
 
-            password = self.wait_for_element(By.ID, "senha", timeout=10)
+            password = self.wait_for_dom_marker(
+                By.ID, "senha", replaces=1, name="login_senha"
+            )
             if not password:
                 raise Exception("Password field not found")
             print("Password field found")
@@ -263,14 +786,31 @@ class Browser:
                 password,
                 self.settings.softclyn_pass,
             )
-            time.sleep(1)
 
-            login_button = self.wait_for_element(By.ID, "btLogin", timeout=10)
+            login_button = self.wait_for_dom_marker(
+                By.ID, "btLogin", replaces=1, name="login_botao"
+            )
             if not login_button:
                 raise Exception("Login button not found")
             print("Login button found, clicking...")
             self.execute_script("arguments[0].click();", login_button)
-            time.sleep(2)
+
+            login_page = self.settings.softclyn_login_page
+            self.wait_until(
+                "login_redirect",
+                EC.any_of(
+                    lambda d: login_page not in (d.current_url or ""),
+                    EC.invisibility_of_element_located((By.ID, "btLogin")),
+                ),
+                timeout=15,
+                replaces=2,
+            )
+            self.wait_for_ajax_idle(name="login_ajax")
+
+            self._logged_in_as = sistema
+            self._home_url = self.driver.current_url
+            if self.is_session_alive():
+                save_session(sistema, self.driver.get_cookies(), self._home_url)
 
             print("Login completed successfully")
 
@@ -297,6 +837,7 @@ class Browser:
         except Exception as e:
             print(f"Erro ao fechar modal: {e}")
 
+    @traced("browser.set_date")
     def _set_date(self, element, iso_date: str):
         self.execute_script("""
             var el = arguments[0];
@@ -305,18 +846,27 @@ class Browser:
             el.dispatchEvent(new Event('change', {bubbles: true}));
             el.dispatchEvent(new Event('blur', {bubbles: true}));
         """, element, iso_date)
-        time.sleep(0.5)
+        self.wait_for_ajax_idle(replaces=0.5, name="set_date")
 
     def _is_timetable(self):
-        timetable_row = self.wait_for_element(
-            By.XPATH, "//tr[@class='ui-droppable']"
-        )
-        no_schedule_alert = self.wait_for_element(
-            By.XPATH,
-            "//div[contains(@class, 'alert-info') and contains(text(), 'expediente')]",
+        # Uma única espera pela grade OU pelo aviso de expediente: a ausência de
+        # um deles não custa mais um timeout inteiro.
+        loaded = self.wait_until(
+            "timetable",
+            EC.any_of(
+                EC.presence_of_element_located(
+                    (By.XPATH, "//tr[@class='ui-droppable']")
+                ),
+                EC.presence_of_element_located(
+                    (
+                        By.XPATH,
+                        "//div[contains(@class, 'alert-info') and contains(text(), 'expediente')]",
+                    )
+                ),
+            ),
         )
 
-        if timetable_row or no_schedule_alert:
+        if loaded:
             print("Grade de horários ou mensagem de expediente (re)carregada após JS.")
             return
 
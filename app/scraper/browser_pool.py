@@ -0,0 +1,215 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from app.scraper.base import Browser
+
+from ..core.dependencies import get_settings
+
+SISTEMAS = ("ouro", "of")
+
+
+class PooledBrowser:
+    """Browser logado mantido pelo pool, com contadores para reciclagem."""
+
+    def __init__(self, sistema: str):
+        self.sistema = sistema
+        self.browser = Browser()
+        self.browser.set_sistema(sistema)
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+    def login(self):
+        self.browser._login()
+        self.browser._close_modal()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class BrowserPool:
+    """
+    Pool de Chromes já logados por sistema (OURO/OF) para um processo do worker.
+
+    Cada lease entrega um Browser exclusivo; na devolução ele passa por um
+    health check e é reciclado após `max_uses` usos ou `max_age` segundos.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_uses: int = 20,
+        max_age: int = 1800,
+        lease_timeout: int = 30,
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.lease_timeout = lease_timeout
+        self._idle = {sistema: queue.Queue() for sistema in SISTEMAS}
+        self._created = {sistema: 0 for sistema in SISTEMAS}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm(self, sistemas=SISTEMAS):
+        """Abre e loga `size` Chromes por sistema antes da primeira tarefa."""
+        for sistema in sistemas:
+            while self._reserve(sistema):
+                entry = self._create(sistema)
+                if not entry:
+                    break
+                self._idle[sistema].put(entry)
+        print(f"Pool de browsers aquecido: {self.stats()}")
+
+    def _reserve(self, sistema: str) -> bool:
+        with self._lock:
+            if self._created[sistema] >= self.size:
+                return False
+            self._created[sistema] += 1
+            return True
+
+    def _create(self, sistema: str) -> PooledBrowser | None:
+        entry = None
+        try:
+            entry = PooledBrowser(sistema)
+            entry.login()
+            return entry
+        except Exception as e:
+            print(f"Erro ao criar browser do pool ({sistema}): {e}")
+            if entry:
+                entry.browser.quit()
+            with self._lock:
+                self._created[sistema] -= 1
+            return None
+
+    def _discard(self, entry: PooledBrowser, reason: str):
+        print(
+            f"Reciclando browser do pool ({entry.sistema}, {entry.uses} usos, "
+            f"{entry.age:.0f}s): {reason}"
+        )
+        entry.browser.quit()
+        with self._lock:
+            self._created[entry.sistema] -= 1
+
+    def _acquire(self, sistema: str) -> PooledBrowser | None:
+        idle = self._idle[sistema]
+        while True:
+            try:
+                entry = idle.get_nowait()
+            except queue.Empty:
+                break
+            if entry.browser.is_session_alive():
+                return entry
+            self._discard(entry, "sessão inválida ao emprestar")
+
+        if self._reserve(sistema):
+            entry = self._create(sistema)
+            if entry:
+                return entry
+
+        try:
+            return idle.get(timeout=self.lease_timeout)
+        except queue.Empty:
+            return None
+
+    def _release(self, entry: PooledBrowser):
+        entry.uses += 1
+        if self._closed:
+            self._discard(entry, "pool encerrado")
+        elif entry.uses >= self.max_uses:
+            self._discard(entry, "limite de usos")
+        elif entry.age >= self.max_age:
+            self._discard(entry, "idade máxima")
+        elif not entry.browser.is_session_alive():
+            self._discard(entry, "health check falhou")
+        else:
+            self._idle[entry.sistema].put(entry)
+
+    @contextmanager
+    def lease(self, sistema: str):
+        """
+        Empresta um Browser logado no sistema informado.
+        Se o pool estiver esgotado por mais de `lease_timeout`, abre um Chrome avulso.
+        """
+        sistema = sistema.lower()
+        entry = self._acquire(sistema)
+        if entry is None:
+            print(f"Pool {sistema} esgotado, abrindo browser avulso.")
+            browser = Browser()
+            browser.set_sistema(sistema)
+            try:
+                yield browser
+            finally:
+                browser.quit()
+            return
+
+        try:
+            yield entry.browser
+        finally:
+            self._release(entry)
+
+    def stats(self) -> dict:
+        return {
+            sistema: {"created": self._created[sistema], "idle": self._idle[sistema].qsize()}
+            for sistema in SISTEMAS
+        }
+
+    def shutdown(self):
+        self._closed = True
+        for sistema, idle in self._idle.items():
+            while True:
+                try:
+                    entry = idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._discard(entry, "pool encerrado")
+
+
+_pool: BrowserPool | None = None
+
+
+def init_pool(warm: bool = True) -> BrowserPool | None:
+    """Cria o pool do processo atual (chamado no worker_process_init)."""
+    global _pool
+    settings = get_settings()
+    if settings.browser_pool_size <= 0:
+        print("Pool de browsers desabilitado (BROWSER_POOL_SIZE=0).")
+        return None
+
+    _pool = BrowserPool(
+        size=settings.browser_pool_size,
+        max_uses=settings.browser_pool_max_uses,
+        max_age=settings.browser_pool_max_age,
+        lease_timeout=settings.browser_pool_lease_timeout,
+    )
+    if warm:
+        _pool.warm()
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool:
+        _pool.shutdown()
+        _pool = None
+
+
+@contextmanager
+def lease_browser(sistema: str):
+    """
+    Empresta um Browser do pool do processo; sem pool, abre um Chrome novo
+    que é encerrado ao final (comportamento antigo).
+    """
+    if _pool is not None:
+        with _pool.lease(sistema) as browser:
+            yield browser
+        return
+
+    browser = Browser()
+    browser.set_sistema(sistema)
+    try:
+        yield browser
+    finally:
+        browser.quit()
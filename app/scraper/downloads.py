@@ -0,0 +1,180 @@
+"""
+Pastas de download por job.
+
+Cada Browser que exporta um relatório recebe uma pasta temporária própria
+(configurada no Chrome via CDP `Page.setDownloadBehavior`), então duas
+exportações no mesmo host não disputam o mesmo arquivo. A pasta é apagada
+no quit do Browser; as que sobrarem de processos mortos são removidas
+quando passam de DOWNLOAD_DIR_TTL_HOURS.
+
+O fim do download é detectado por `DownloadTracker`: no Linux via inotify
+(o Chrome grava `.crdownload` e renomeia para o nome final, então o evento
+de rename/fechamento já indica o arquivo completo); nos demais sistemas,
+por polling curto da pasta.
+
+Com EXPORT_CAPTURE=memory as exportações nem passam pelo disco: o próprio
+Chrome faz o POST (fetch com os cookies da sessão) e devolve os bytes, que
+vão para o calamine num BytesIO (Browser.fetch_export).
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+PREFIX = "export-"
+
+# Assinaturas de .xls (OLE2) e .xlsx (zip) para não tentar ler uma página de erro.
+EXCEL_SIGNATURES = (b"\xd0\xcf\x11\xe0", b"PK\x03\x04")
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+POLL_INTERVAL = 0.05
+
+
+class DownloadTimeoutError(TimeoutError):
+    pass
+
+
+class ExportCaptureError(Exception):
+    """A exportação em memória falhou; o chamador deve baixar o arquivo."""
+
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+class DownloadTracker:
+    """
+    Espera um download completo que case com `pattern` em `directory`.
+    Crie antes de disparar a exportação, para não perder o evento.
+    """
+
+    def __init__(self, directory: str, pattern: str = "*.xls"):
+        self.directory = directory
+        self.pattern = pattern
+        self._fd = None
+        libc = _libc()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(
+                fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+            ) >= 0:
+                self._fd = fd
+            elif fd >= 0:
+                os.close(fd)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def _completed(self, name: str) -> tuple[str, int] | None:
+        if name.endswith(".crdownload") or not fnmatch.fnmatch(name, self.pattern):
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        return (path, size) if size > 0 else None
+
+    def _scan(self) -> tuple[str, int] | None:
+        names = os.listdir(self.directory)
+        if any(name.endswith(".crdownload") for name in names):
+            return None
+        for name in sorted(names):
+            found = self._completed(name)
+            if found:
+                return found
+        return None
+
+    def _read_events(self) -> list[str]:
+        data = os.read(self._fd, 65536)
+        names, offset = [], 0
+        while offset < len(data):
+            _wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.append(os.fsdecode(data[offset : offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def wait(self, timeout: float = 30) -> tuple[str, int]:
+        """Caminho e tamanho (bytes) do arquivo; DownloadTimeoutError no prazo."""
+        deadline = time.monotonic() + timeout
+        # O arquivo pode ter chegado antes do wait (ex.: exportação rápida).
+        found = self._scan()
+        while not found:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DownloadTimeoutError(
+                    f"Nenhum download {self.pattern} completo em {self.directory} após {timeout:g}s"
+                )
+            if self._fd is None:
+                time.sleep(min(POLL_INTERVAL, remaining))
+                found = self._scan()
+                continue
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready:
+                for name in self._read_events():
+                    found = found or self._completed(name)
+        return found
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def download_root(root: str | None = None) -> str:
+    root = root or os.path.join(tempfile.gettempdir(), "softclyn-downloads")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def make_download_dir(job: str, root: str | None = None) -> str:
+    """Cria uma pasta única para os downloads de `job`."""
+    return tempfile.mkdtemp(prefix=f"{PREFIX}{job}-", dir=download_root(root))
+
+
+def remove_download_dir(path: str | None):
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep_download_dirs(max_age_hours: int, root: str | None = None) -> int:
+    """Remove pastas de download mais velhas que `max_age_hours` (0 = nunca)."""
+    if max_age_hours <= 0:
+        return 0
+    root = download_root(root)
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if name.startswith(PREFIX) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager
+from functools import lru_cache
+
+from ..core.dependencies import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+CHROME_BINARIES = [
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "chrome",
+]
+
+
+def _major(version: str | None) -> str | None:
+    if not version:
+        return None
+    return version.split(".")[0]
+
+
+def _binary_version(binary: str) -> str | None:
+    """Executa `<binary> --version` e extrai o número da versão (ex.: 131.0.6778.85)."""
+    try:
+        output = subprocess.run(
+            [binary, "--version"], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d+\.\d+\.\d+\.\d+)", output or "")
+    return match.group(1) if match else None
+
+
+def installed_chrome_version() -> str | None:
+    """Versão do Chrome instalado no host, sem acesso à rede."""
+    settings = get_settings()
+    candidates = [settings.chrome_binary] if settings.chrome_binary else CHROME_BINARIES
+    for candidate in candidates:
+        binary = shutil.which(candidate) or candidate
+        if os.path.exists(binary):
+            version = _binary_version(binary)
+            if version:
+                return version
+    return None
+
+
+def _cache_file() -> str:
+    return os.path.join(get_settings().chromedriver_cache_dir, "chromedriver.json")
+
+
+def _read_cache() -> dict:
+    try:
+        with open(_cache_file(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(data: dict):
+    path = _cache_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def clear_cache():
+    """Remove o cache em disco e em memória (usado pelo benchmark de startup)."""
+    resolve_chromedriver.cache_clear()
+    try:
+        os.remove(_cache_file())
+    except OSError:
+        pass
+
+
+@contextmanager
+def _host_lock():
+    """Serializa a resolução entre processos do mesmo host (workers paralelos)."""
+    if fcntl is None:
+        yield
+        return
+    cache_dir = get_settings().chromedriver_cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "chromedriver.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_compatible(driver_path: str | None, chrome_major: str | None) -> bool:
+    if not driver_path or not os.path.exists(driver_path):
+        return False
+    if chrome_major is None:
+        # Sem Chrome detectável não há como validar; confia no driver existente.
+        return True
+    return _major(_binary_version(driver_path)) == chrome_major
+
+
+def _cached_driver(chrome_major: str | None) -> str | None:
+    cache = _read_cache()
+    driver_path = cache.get("driver_path")
+    if cache.get("chrome_major") != chrome_major:
+        return None
+    if driver_path and os.path.exists(driver_path):
+        return driver_path
+    return None
+
+
+def _bundled_driver(chrome_major: str | None) -> str | None:
+    settings = get_settings()
+    candidates = [settings.chromedriver_path, shutil.which("chromedriver")]
+    for candidate in candidates:
+        if _is_compatible(candidate, chrome_major):
+            return candidate
+    return None
+
+
+@lru_cache
+def resolve_chromedriver() -> str:
+    """
+    Resolve o caminho do chromedriver uma única vez por host.
+
+    Ordem: cache em disco validado contra o Chrome instalado, driver
+    empacotado (CHROMEDRIVER_PATH ou PATH) e, por último, download via
+    webdriver-manager, cujo resultado é gravado no cache.
+    """
+    chrome_version = installed_chrome_version()
+    chrome_major = _major(chrome_version)
+
+    driver_path = _cached_driver(chrome_major)
+    if driver_path:
+        return driver_path
+
+    with _host_lock():
+        # Outro processo pode ter resolvido enquanto esperávamos o lock.
+        driver_path = _cached_driver(chrome_major)
+        if driver_path:
+            return driver_path
+
+        driver_path = _bundled_driver(chrome_major)
+        source = "bundled"
+
+        if not driver_path:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            print("Chromedriver não encontrado localmente, baixando via webdriver-manager...")
+            driver_path = ChromeDriverManager().install()
+            source = "webdriver-manager"
+
+        _write_cache(
+            {
+                "driver_path": driver_path,
+                "driver_version": _binary_version(driver_path),
+                "chrome_version": chrome_version,
+                "chrome_major": chrome_major,
+                "source": source,
+            }
+        )
+        print(f"Chromedriver resolvido ({source}): {driver_path}")
+        return driver_path
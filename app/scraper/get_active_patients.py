@@ -1,18 +1,69 @@
 from selenium.webdriver import ActionChains, Keys
 from selenium.webdriver.support.select import Select
 from .base import Browser
+from .downloads import DownloadTimeoutError
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
-import glob
 from datetime import datetime
 import pandas as pd
 
+# Mesmos campos que o formulário do relatório envia quando operado pelo Selenium.
+ACTIVE_PATIENTS_PARAMS = {"tipoRelatorio": "ativo", "exportarExcel": "1"}
+
+
+def parse_active_patients_excel(source) -> dict:
+    """
+    Converte o Excel de pacientes ativos (caminho ou arquivo em memória) no
+    dict retornado por get_all_active_patients.
+    """
+    df = pd.read_excel(source, engine="calamine")
+
+    df.columns = [str(c).strip() for c in df.columns]
+    df_limpo = df.dropna(axis=1, how="all")
+    df_limpo = df_limpo[
+        ["CÓDIGO", "PACIENTE", "TELEFONE"]
+    ]
+    df_limpo["TELEFONE"] = df_limpo["TELEFONE"].str.split("/", expand=True)[0] # Traz somente o primeiro telefone 
+    # TODO: modelagem de banco para considerar mais que um número de telefone
+
+    patients = []
+    for _, row in df_limpo.iterrows():
+        try:
+            patient = {
+                "codigo": str(row["CÓDIGO"]).strip()
+                if not pd.isna(row["CÓDIGO"])
+                else "",
+                "cad_telefone": str(row["TELEFONE"]).strip()
+                if not pd.isna(row["TELEFONE"])
+                else "",
+                "nomewpp": str(row["PACIENTE"]).strip()
+                if not pd.isna(row["PACIENTE"])
+                else "",
+                "data_nascimento": "",
+                "atendimento_ia": "",
+                "setor": "",
+                "cpf": ""
+            }
+            patients.append(patient)
+
+        except Exception as e:
+            print(f"Erro ao processar linha {_}: {e}")
+            continue
+
+    return {
+        "status": "success",
+        "patients": patients,
+        "total_count": len(patients),
+    }
+
 
 class GetActivePatients(Browser):
-    def __init__(self):
-        super().__init__()
+    ALLOWED_RESOURCES = ("stylesheet",)
+
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
+        self.excel_path = None
 
     def capture_data(self, data_type: str, header_value: str):
         """
@@ -27,7 +78,7 @@ class GetActivePatients(Browser):
         """
         try:
             # Wait for table to update
-            time.sleep(1.5)
+            self.wait_for_ajax_idle(timeout=5, replaces=1.5, name="tabela_filtro")
             tabela = self.wait_for_element(By.CSS_SELECTOR, "table.tableFiltro", timeout=5)
             if not tabela:
                 print(f"  Tabela de resultados não encontrada.")
@@ -97,7 +148,7 @@ class GetActivePatients(Browser):
             except:
                 self.execute_script("arguments[0].click();", submenu_pacientes)
 
-            time.sleep(2)
+            self.wait_for_ajax_idle(replaces=2, name="tela_pacientes")
 
             # self.save_screenshot("patient_registration_screen.png")
 
@@ -107,7 +158,6 @@ class GetActivePatients(Browser):
             if input_pesquisa:
                 try:
                     input_pesquisa.click()
-                    time.sleep(0.5)
                     input_pesquisa.send_keys(Keys.ENTER)
                 except:
                     self.execute_script("arguments[0].click();", input_pesquisa)
@@ -116,11 +166,10 @@ class GetActivePatients(Browser):
                         input_pesquisa
                     )
 
-            time.sleep(2)
-            
-            
             # Verify if modal opened
-            if self.wait_for_element(By.ID, "pesquisa2", timeout=10):
+            if self.wait_for_dom_marker(
+                By.ID, "pesquisa2", replaces=2.5, expectation=EC.visibility_of_element_located
+            ):
                 print("Modal de pesquisa aberto com sucesso.")
                 self.save_screenshot("patient_search_screen.png")
                 return True
@@ -156,22 +205,16 @@ class GetActivePatients(Browser):
             except:
                 self.execute_script("arguments[0].value = '';", input_pesquisa2)
 
-            time.sleep(1)
-
             try:
                 input_pesquisa2.send_keys(patient_code)
             except:
                 self.execute_script("arguments[0].value = arguments[1];", input_pesquisa2, patient_code)
-            
-            time.sleep(1)
 
             try:
                 input_pesquisa2.send_keys(Keys.ENTER)
             except:
                 self.execute_script("arguments[0].dispatchEvent(new KeyboardEvent('keydown', {key: 'Enter', code: 'Enter', keyCode: 13, which: 13, bubbles: true}));", input_pesquisa2)
             
-            time.sleep(1)
-            
             # Tenta capturar telefone, se vazio tenta celular
             phone_raw = self.capture_phone()
             if not phone_raw:  # Captura strings vazias e None
@@ -220,8 +263,6 @@ class GetActivePatients(Browser):
                 input_pesquisa2.send_keys(patient_code)
             except:
                 self.execute_script("arguments[0].value = arguments[1];", input_pesquisa2, patient_code)
-            
-            time.sleep(1)
 
             try:
                 input_pesquisa2.send_keys(Keys.ENTER)
@@ -245,9 +286,9 @@ class GetActivePatients(Browser):
             By.ID, "menuRelatoriosLi", expectation=EC.element_to_be_clickable
         )
 
-        submenu_agendamento = self.find_element(By.ID, "menuRelatorioPacientesLi")
+        submenu_agendamento = self.require_element(By.ID, "menuRelatorioPacientesLi")
 
-        item_final = self.find_element(
+        item_final = self.require_element(
             By.CSS_SELECTOR, "#menuRelatorioPacientes #Pacientes a[href*='relPacientesInativos.php']"
         )
 
@@ -262,7 +303,9 @@ class GetActivePatients(Browser):
                 "abrePagina('centro','../view/relatorios/pacientes/relPacientesInativos.php');"
             )
 
-        time.sleep(2)
+        self.wait_for_dom_marker(
+            By.ID, "tipoRelatorio", replaces=2, expectation=EC.element_to_be_clickable
+        )
 
     def click_on_active_patients(self):
         search_patient = self.wait_for_element(
@@ -277,13 +320,12 @@ class GetActivePatients(Browser):
                 select.select_by_visible_text("Pacientes Ativos")
             except:
                 select.select_by_value("ativo")
-            time.sleep(2)
-
-        time.sleep(2)
+            self.wait_for_ajax_idle(replaces=4, name="pacientes_ativos")
 
         print("Selecionou os pacientes ativos.")
 
     def export_excel(self):
+        download = self.expect_download(f"active_patients_{self.current_system}", "*.xls")
         try:
             botao = self.wait_for_element(
                 By.XPATH,
@@ -295,19 +337,17 @@ class GetActivePatients(Browser):
             except:
                 self.execute_script("arguments[0].click();", botao)
 
-            # Aguarda o arquivo aparecer (até 30s)
-            folder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-            for i in range(30):
-                if glob.glob(os.path.join(folder_path, "*.xls")):
-                    print(f"Arquivo baixado após {i+1}s.")
-                    break
-                time.sleep(1)
-            else:
-                print("AVISO: Nenhum .xls apareceu em 30s, continuando mesmo assim...")
+            # Aguarda o arquivo ficar completo (até 30s)
+            try:
+                self.excel_path, size = self.wait_for_download(download, timeout=30)
+                print(f"Arquivo baixado após {self.wait_log[-1]['elapsed']:.3f}s ({size} bytes).")
+            except DownloadTimeoutError as e:
+                print(f"AVISO: {e}")
 
             print("Exportou os dados do Excel.")
 
         except Exception as e:
+            download.close()
             print(f"Erro ao exportar dados do Excel: {e}")
             return {
                 "status": "error",
@@ -316,56 +356,16 @@ class GetActivePatients(Browser):
 
     def get_excel_data(self):
         try:
-            folder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-            xls_files = glob.glob(os.path.join(folder_path, "*.xls"))
-            if not xls_files:
+            full_path = self.excel_path
+            if not full_path or not os.path.exists(full_path):
                 return {
                     "status": "error",
                     "message": "No .xls file found in the folder.",
                 }
-            # Use the first .xls file found
-            full_path = xls_files[0]
             print(f"Using Excel file: {os.path.basename(full_path)}")
-            df = pd.read_excel(full_path, engine="calamine")
-
-            df.columns = [str(c).strip() for c in df.columns]
-            df_limpo = df.dropna(axis=1, how="all")
-            df_limpo = df_limpo[
-                ["CÓDIGO", "PACIENTE", "TELEFONE"]
-            ]
-            df_limpo["TELEFONE"] = df_limpo["TELEFONE"].str.split("/", expand=True)[0] # Traz somente o primeiro telefone 
-            # TODO: modelagem de banco para considerar mais que um número de telefone
-
-            patients = []
-            for _, row in df_limpo.iterrows():
-                try:
-                    patient = {
-                        "codigo": str(row["CÓDIGO"]).strip()
-                        if not pd.isna(row["CÓDIGO"])
-                        else "",
-                        "cad_telefone": str(row["TELEFONE"]).strip()
-                        if not pd.isna(row["TELEFONE"])
-                        else "",
-                        "nomewpp": str(row["PACIENTE"]).strip()
-                        if not pd.isna(row["PACIENTE"])
-                        else "",
-                        "data_nascimento": "",
-                        "atendimento_ia": "",
-                        "setor": "",
-                        "cpf": ""
-                    }
-                    patients.append(patient)
-
-                except Exception as e:
-                    print(f"Erro ao processar linha {_}: {e}")
-                    continue
-
-            return {
-                "status": "success",
-                "patients": patients,
-                "total_count": len(patients),
-                "file_path": full_path,
-            }
+            result = parse_active_patients_excel(full_path)
+            result["file_path"] = full_path
+            return result
 
         except Exception as e:
             print(f"Erro ao obter dados do Excel: {e}")
@@ -374,7 +374,27 @@ class GetActivePatients(Browser):
                 "message": "Falha ao obter dados do Excel.",
             }
 
+    def capture_excel_data(self):
+        """
+        Com EXPORT_CAPTURE=memory, exporta pelo fetch do Chrome e converte o
+        relatório em memória. None quando o modo está desligado ou falhou,
+        para o chamador seguir pelo download.
+        """
+        if self.settings.export_capture != "memory":
+            return None
+        try:
+            excel = self.fetch_export(
+                self.settings.softclyn_http_active_patients_path, ACTIVE_PATIENTS_PARAMS
+            )
+        except Exception as e:
+            print(f"Exportação em memória falhou ({e}), baixando o arquivo...")
+            return None
+        print(f"Relatório capturado em memória ({excel.getbuffer().nbytes} bytes)")
+        return parse_active_patients_excel(excel)
+
     def remove_excel_file(self, file_path):
+        if not file_path:
+            return
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -388,6 +408,10 @@ class GetActivePatients(Browser):
         """
         Scrapes all the active patients from the website. 
         """
+        result = self._http_fetch("get_all_active_patients")
+        if result:
+            return result
+
         try:
             self._login()
             print("Login realizado com sucesso.")
@@ -395,13 +419,15 @@ class GetActivePatients(Browser):
             print("Modal fechado com sucesso.")
             # self.prepare_patient_registration_search()
             # print("Busca de registro de pacientes preparada com sucesso.")
-            self.click_on_patients_menu()
-            print("Menu de pacientes clicado com sucesso.")
-            self.click_on_active_patients()
-            print("Pacientes ativos selecionados com sucesso.")
-            self.export_excel()
-            print("Excel exportado com sucesso.")
-            result = self.get_excel_data()
+            result = self.capture_excel_data()
+            if result is None:
+                self.click_on_patients_menu()
+                print("Menu de pacientes clicado com sucesso.")
+                self.click_on_active_patients()
+                print("Pacientes ativos selecionados com sucesso.")
+                self.export_excel()
+                print("Excel exportado com sucesso.")
+                result = self.get_excel_data()
             print("Dados do Excel obtidos com sucesso.")
 
             if result.get("status") != "success":
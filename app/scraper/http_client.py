@@ -0,0 +1,268 @@
+import io
+import re
+from datetime import date, datetime
+from html.parser import HTMLParser
+
+import httpx
+
+from ..core.dependencies import get_settings
+from .base import Browser
+from .downloads import EXCEL_SIGNATURES
+from .get_active_patients import ACTIVE_PATIENTS_PARAMS, parse_active_patients_excel
+from .next_appointments import next_appointments_params, parse_next_appointments_excel
+from .patient_history_scraper import page_older_than, parse_history_tables
+from .session_store import invalidate_session, load_session
+
+MAX_HISTORY_PAGES = 100
+
+
+class SoftclynHttpError(Exception):
+    """O endpoint não respondeu como esperado; o chamador deve usar o Selenium."""
+
+
+class _HistoryHTMLParser(HTMLParser):
+    """
+    Extrai as tabelas do histórico (table-bordered com a célula "Profissional /
+    Agenda") com o texto de cada célula e a classe de cada linha do tbody.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._table = None
+        self._row = None
+        self._cell = None
+        self._in_tbody = False
+        self._in_strong = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        css_class = attrs.get("class") or ""
+        if tag == "table" and "table-bordered" in css_class:
+            self._table = {"profissional": None, "has_profissional": False, "rows": []}
+        elif self._table is None:
+            return
+        elif tag == "tbody":
+            self._in_tbody = True
+        elif tag == "tr":
+            self._row = {"class": css_class, "cells": [], "skip": False}
+        elif tag == "th" and self._row is not None:
+            self._row["skip"] = True
+        elif tag == "td" and self._row is not None:
+            if attrs.get("colspan"):
+                self._row["skip"] = True
+            self._cell = {"active": "active" in css_class.split(), "text": [], "strong": []}
+        elif tag == "strong" and self._cell is not None:
+            self._in_strong = True
+
+    def handle_endtag(self, tag):
+        if self._table is None:
+            return
+        if tag == "strong":
+            self._in_strong = False
+        elif tag == "td" and self._cell is not None:
+            text = " ".join("".join(self._cell["text"]).split())
+            if self._cell["active"]:
+                if "Profissional" in text:
+                    self._table["has_profissional"] = True
+                strong = " ".join("".join(self._cell["strong"]).split())
+                if strong and self._table["profissional"] is None:
+                    self._table["profissional"] = strong
+            self._row["cells"].append(text)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._in_tbody and not self._row["skip"] and self._row["cells"]:
+                self._table["rows"].append(self._row)
+            self._row = None
+        elif tag == "tbody":
+            self._in_tbody = False
+        elif tag == "table":
+            if self._table["has_profissional"]:
+                self.tables.append(self._table)
+            self._table = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"].append(data)
+            if self._in_strong:
+                self._cell["strong"].append(data)
+
+
+def parse_history_html(html: str, today: datetime | None = None) -> list[dict]:
+    """Converte o HTML de uma página do histórico para o formato de parse_history_tables."""
+    today = today or datetime.strptime(datetime.now().strftime("%d/%m/%Y"), "%d/%m/%Y")
+    parser = _HistoryHTMLParser()
+    parser.feed(html)
+    parser.close()
+
+    tables = [
+        {
+            "profissional": table["profissional"],
+            "rows": [
+                {
+                    "class": row["class"],
+                    "colunas": len(row["cells"]),
+                    "data": row["cells"][0],
+                    "hora": row["cells"][1] if len(row["cells"]) > 1 else "",
+                    "tipo": row["cells"][5] if len(row["cells"]) > 5 else "",
+                    "retorno_ate": row["cells"][7] if len(row["cells"]) > 7 else "",
+                }
+                for row in table["rows"]
+            ],
+        }
+        for table in parser.tables
+    ]
+    return parse_history_tables(tables, today)
+
+
+def _history_total_pages(html: str) -> int:
+    match = re.search(r"Última\s*\((\d+)\)", html)
+    return int(match.group(1)) if match else 1
+
+
+class SoftclynHttpClient:
+    """
+    Cliente HTTP (keep-alive) para as telas somente leitura do SoftClyn:
+    exportação de agendamentos, de pacientes ativos e paginação do histórico.
+
+    Autentica com os cookies da sessão salva no Redis (ou de um Browser já
+    logado) e retorna os mesmos dicts dos scrapers. Qualquer resposta fora do
+    esperado gera SoftclynHttpError para o chamador voltar ao Selenium.
+    """
+
+    def __init__(self, sistema: str = "ouro", cookies: list[dict] | None = None):
+        self.settings = get_settings()
+        self.sistema = sistema.lower()
+        self.client = httpx.Client(
+            base_url=f"{self.settings.softclyn_url}/{self.settings.softclyn_empresa}_{self.sistema}/",
+            follow_redirects=True,
+            timeout=self.settings.page_load_timeout,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60),
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self._authenticated = False
+        if cookies:
+            self._set_cookies(cookies)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    def _set_cookies(self, cookies: list[dict]):
+        self.client.cookies.clear()
+        for cookie in cookies:
+            self.client.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+            )
+        self._authenticated = True
+
+    def _authenticate(self, force: bool = False):
+        if self._authenticated and not force:
+            return
+        session = None if force else load_session(self.sistema)
+        if session:
+            self._set_cookies(session["cookies"])
+            return
+
+        # Sem sessão reaproveitável: um único login pelo Chrome gera os cookies
+        # (e os salva no Redis para os próximos clientes).
+        print(f"Sem sessão {self.sistema.upper()} salva, fazendo login pelo Chrome...")
+        with Browser() as browser:
+            browser.set_sistema(self.sistema)
+            browser._login()
+            self._set_cookies(browser.driver.get_cookies())
+
+    def _is_login_response(self, response: httpx.Response) -> bool:
+        if self.settings.softclyn_login_page in str(response.url):
+            return True
+        content_type = response.headers.get("content-type", "")
+        return "html" in content_type and 'id="btLogin"' in response.text
+
+    def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        self._authenticate()
+        for _ in range(2):
+            try:
+                response = self.client.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                raise SoftclynHttpError(f"Falha de rede em {path}: {e}") from e
+
+            if not self._is_login_response(response):
+                if response.status_code >= 400:
+                    raise SoftclynHttpError(f"{path} respondeu {response.status_code}")
+                return response
+
+            print(f"Sessão HTTP {self.sistema.upper()} expirada, refazendo login.")
+            invalidate_session(self.sistema)
+            self._authenticate(force=True)
+
+        raise SoftclynHttpError(f"Sessão recusada em {path}")
+
+    def _export_excel(self, path: str, params: dict) -> io.BytesIO:
+        response = self._request("POST", path, data=params)
+        if not response.content.startswith(EXCEL_SIGNATURES):
+            raise SoftclynHttpError(f"{path} não retornou um Excel")
+        return io.BytesIO(response.content)
+
+    def get_next_appointments(self) -> dict:
+        """Equivalente HTTP de NextAppointmentsScraper.get_next_appointments."""
+        excel = self._export_excel(
+            self.settings.softclyn_http_next_appointments_path, next_appointments_params()
+        )
+        result = parse_next_appointments_excel(excel)
+        return {
+            "status": "success",
+            "message": "Next appointments scraped successfully.",
+            "appointments": result.get("appointments", []),
+            "total_count": result.get("total_count", 0),
+        }
+
+    def get_all_active_patients(self) -> dict:
+        """Equivalente HTTP de GetActivePatients.get_all_active_patients."""
+        excel = self._export_excel(
+            self.settings.softclyn_http_active_patients_path, ACTIVE_PATIENTS_PARAMS
+        )
+        result = parse_active_patients_excel(excel)
+        return {
+            "status": "success",
+            "message": "All active patients scraped successfully.",
+            "patients": result.get("patients", []),
+            "total_count": result.get("total_count", 0),
+        }
+
+    def get_patient_history(self, codigo: str, stop_at: date | None = None) -> dict:
+        """
+        Equivalente HTTP de PatientHistoryScraper.get_patient_history para busca
+        por código, inclusive o watermark `stop_at`. patient_info vem só com o
+        código: a grade de pesquisa, de onde saem nome e nascimento, não é
+        consultada.
+        """
+        path = self.settings.softclyn_http_history_path
+        appointments = []
+        total_pages = 1
+        page = 0
+        while page < min(total_pages, MAX_HISTORY_PAGES):
+            html = self._request("POST", path, data={"codPaciente": codigo, "pagina": page}).text
+            if page == 0:
+                if "table-bordered" not in html:
+                    raise SoftclynHttpError(f"{path} não retornou o histórico")
+                total_pages = _history_total_pages(html)
+            page_appointments = parse_history_html(html)
+            appointments.extend(page_appointments)
+            page += 1
+            if page_older_than(page_appointments, stop_at):
+                break
+
+        return {
+            "status": "success",
+            "appointments": appointments,
+            "patient_info": {"codigo": codigo, "nome": None, "data_nascimento": None},
+            "pages": page,
+        }
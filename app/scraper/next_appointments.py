@@ -1,17 +1,129 @@
 from .base import Browser
+from .downloads import DownloadTimeoutError
 
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 import pandas as pd
-import time
 import os
 from datetime import datetime, timedelta
 
 
+def _read_excel(source, **kwargs) -> pd.DataFrame:
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_excel(source, engine="calamine", **kwargs)
+
+
+# Mesmos campos que o formulário do relatório envia quando operado pelo Selenium.
+NEXT_APPOINTMENTS_PARAMS = {"medico": "todos", "exportaExcel": "1"}
+
+# Colunas do relatório usadas (as demais são descartadas).
+REPORT_COLUMNS = ["DATA/HORA", "PACIENTE", "TIPO", "STATUS", "RESPONSÁVEL", "TELEFONE"]
+
+
+def read_next_appointments_report(source) -> pd.DataFrame:
+    """Lê o Excel do relatório de agendamentos (caminho ou arquivo em memória)."""
+    df = _read_excel(source, skiprows=1)
+
+    df.columns = [str(c).strip() for c in df.columns]
+    print(f"Colunas encontradas: {list(df.columns)}")
+
+    if "DATA/HORA" not in df.columns:
+        print(f"Coluna 'DATA/HORA' não encontrada. Tentando sem skiprows...")
+        df = _read_excel(source)
+        df.columns = [str(c).strip() for c in df.columns]
+        print(f"Colunas sem skiprows: {list(df.columns)}")
+    return df
+
+
+def _split_pair(column: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Divide 'a - b' em duas séries (a segunda é NaN quando não há separador)."""
+    parts = column.str.split(" - ", n=1, expand=True).reindex(columns=[0, 1])
+    return parts[0], parts[1]
+
+
+def _text(column: pd.Series) -> pd.Series:
+    return column.fillna("").astype(str).str.strip()
+
+
+def next_appointments_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte o relatório lido em um DataFrame com uma linha por agendamento
+    e as colunas de get_next_appointments, só com operações vetorizadas:
+    datas e horas por pd.to_datetime com formato explícito, DATA/HORA e
+    PACIENTE divididos com .str.split e primeira_consulta por máscara.
+    Linhas sem data válida são descartadas; hora inválida vira None.
+    """
+    df = df[df["DATA/HORA"].astype(str).str.contains(r"\d{2}/\d{2}/\d{4}", na=False)]
+    df = df[REPORT_COLUMNS]
+
+    data_str, hora_str = _split_pair(df["DATA/HORA"])
+    data_str, hora_str = data_str.str.strip(), hora_str.str.strip()
+    codigo, nome = _split_pair(df["PACIENTE"])
+
+    datas = pd.to_datetime(data_str, format="%d/%m/%Y", errors="coerce")
+    horas = pd.to_datetime(hora_str, format="%H:%M:%S", errors="coerce").fillna(
+        pd.to_datetime(hora_str, format="%H:%M", errors="coerce")
+    )
+    tipo = _text(df["TIPO"])
+
+    frame = pd.DataFrame(
+        {
+            "data_consulta": datas.dt.date,
+            "hora_consulta": horas.dt.time.astype(object).where(horas.notna(), None),
+            "codigo": _text(codigo),
+            "telefone": _text(df["TELEFONE"]),
+            "nome_paciente": _text(nome),
+            "profissional": _text(df["RESPONSÁVEL"]),
+            "procedimento": tipo,
+            "status": _text(df["STATUS"]),
+            "primeira_consulta": tipo.str.lower().str.contains("primeira", regex=False),
+            "especialidade": "",
+            "observacoes": "",
+        },
+        index=df.index,
+    )
+    return frame[datas.notna()].reset_index(drop=True)
+
+
+def frame_records(frame: pd.DataFrame) -> list[dict]:
+    """
+    Linhas do DataFrame como dicts, montados de uma vez a partir das colunas
+    já convertidas em listas (to_dict("records") converte célula a célula).
+    """
+    columns = list(frame.columns)
+    values = [frame[column].tolist() for column in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def parse_next_appointments_excel(source) -> dict:
+    """
+    Converte o Excel do relatório de agendamentos (caminho ou arquivo em
+    memória) no dict retornado por get_next_appointments.
+    """
+    appointments = frame_records(next_appointments_frame(read_next_appointments_report(source)))
+    return {
+        "status": "success",
+        "appointments": appointments,
+        "total_count": len(appointments),
+    }
+
+
+def next_appointments_params(days: int = 30) -> dict:
+    """Campos do POST de exportação: de hoje até `days` dias à frente."""
+    hoje = datetime.now()
+    return {
+        **NEXT_APPOINTMENTS_PARAMS,
+        "dataInicial": hoje.strftime("%Y-%m-%d"),
+        "dataFinal": (hoje + timedelta(days=days)).strftime("%Y-%m-%d"),
+    }
+
+
 class NextAppointmentsScraper(Browser):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
+        self.excel_path = None
 
 
     def click_on_reports_menu(self):
@@ -19,9 +131,9 @@ class NextAppointmentsScraper(Browser):
             By.ID, "menuRelatoriosLi", expectation=EC.element_to_be_clickable
         )
 
-        submenu_agendamento = self.find_element(By.ID, "menuRelatorioAgendaLi")
+        submenu_agendamento = self.require_element(By.ID, "menuRelatorioAgendaLi")
 
-        item_final = self.find_element(
+        item_final = self.require_element(
             By.CSS_SELECTOR, "#menuRelatorioAgenda #Agendamento a"
         )
 
@@ -36,7 +148,7 @@ class NextAppointmentsScraper(Browser):
                 "abrePagina('centro','../view/relatorios/agendamentos/relAgendamentos.php');"
             )
 
-        time.sleep(2)
+        self.wait_for_dom_marker(By.ID, "dataInicial", replaces=2)
 
         self.save_screenshot("pagina_relatorio_agendamentos.png")
 
@@ -140,8 +252,7 @@ class NextAppointmentsScraper(Browser):
                     "ALERTA: O valor final no campo não corresponde ao esperado após injeção de JS!"
                 )
 
-
-        time.sleep(2)
+        self.wait_for_ajax_idle(replaces=2, name="periodo_relatorio")
 
     def select_all_doctors(self):
         try:
@@ -180,10 +291,10 @@ class NextAppointmentsScraper(Browser):
                 "message": "Falha ao selecionar todos os médicos.",
             }
 
-
-        time.sleep(2)
+        self.wait_for_ajax_idle(replaces=2, name="todos_medicos")
 
     def export_excel(self):
+        download = self.expect_download(f"next_appointments_{self.current_system}", "*.xls")
         try:
             botao_exportar = self.wait_for_element(
                 By.ID, "exportaExcel", expectation=EC.element_to_be_clickable
@@ -194,129 +305,32 @@ class NextAppointmentsScraper(Browser):
                 self.execute_script("arguments[0].click();", botao_exportar)
 
         except Exception as e:
+            download.close()
             print(f"Erro ao exportar relatório: {e}")
             return {
                 "status": "error",
                 "message": "Falha ao exportar relatório.",
             }
 
-        # Aguarda o arquivo ser criado (até 30s)
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        full_path = os.path.join(base_dir, "data", "26relatorio.xls")
-        for i in range(30):
-            if os.path.exists(full_path) and os.path.getsize(full_path) > 0:
-                print(f"Arquivo baixado após {i+1}s: {full_path}")
-                break
-            time.sleep(1)
-        else:
-            print("AVISO: Arquivo não apareceu em 30s, continuando mesmo assim...")
+        # Aguarda o arquivo ficar completo (até 30s)
+        try:
+            self.excel_path, size = self.wait_for_download(download)
+            print(
+                f"Arquivo baixado após {self.wait_log[-1]['elapsed']:.3f}s: "
+                f"{self.excel_path} ({size} bytes)"
+            )
+        except DownloadTimeoutError as e:
+            print(f"AVISO: {e}")
 
     def get_excel_data(self):
         try:
-            # Use relative path based on this file's location
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            folder_path = os.path.join(base_dir, "data")
-            file_name = "26relatorio.xls"
-            full_path = os.path.join(folder_path, file_name)
-
-            if not os.path.exists(full_path):
-                print(f"Arquivo não encontrado: {full_path}")
+            full_path = self.excel_path
+            if not full_path or not os.path.exists(full_path):
+                print(f"Arquivo não encontrado em {self.download_dir}")
                 return {"status": "error", "message": "Arquivo Excel não encontrado."}
 
             print(f"Lendo arquivo: {full_path} ({os.path.getsize(full_path)} bytes)")
-            df = pd.read_excel(full_path, engine="calamine", skiprows=1)
-
-            df.columns = [str(c).strip() for c in df.columns]
-            print(f"Colunas encontradas: {list(df.columns)}")
-
-            if "DATA/HORA" not in df.columns:
-                print(f"Coluna 'DATA/HORA' não encontrada. Tentando sem skiprows...")
-                df = pd.read_excel(full_path, engine="calamine")
-                df.columns = [str(c).strip() for c in df.columns]
-                print(f"Colunas sem skiprows: {list(df.columns)}")
-
-            df_limpo = df[
-                df["DATA/HORA"].astype(str).str.contains(r"\d{2}/\d{2}/\d{4}", na=False)
-            ].copy()
-            df_limpo = df_limpo.dropna(axis=1, how="all")
-
-            df_limpo = df_limpo[
-                ["DATA/HORA", "PACIENTE", "TIPO", "STATUS", "RESPONSÁVEL", "TELEFONE"]
-            ]
-            df_limpo[["DATA", "HORA"]] = df_limpo["DATA/HORA"].str.split(
-                " - ", expand=True
-            )
-            df_limpo["DATA"] = df_limpo["DATA"].str.strip()
-            df_limpo["HORA"] = df_limpo["HORA"].str.strip()
-            df_limpo = df_limpo.drop(columns=["DATA/HORA"])
-
-
-            df_limpo[["CODIGO", "NOME_PACIENTE"]] = df_limpo["PACIENTE"].str.split(
-                " - ", expand=True
-            )
-            df_limpo["CODIGO"] = df_limpo["CODIGO"].str.strip()
-            df_limpo["NOME_PACIENTE"] = df_limpo["NOME_PACIENTE"].str.strip()
-            df_limpo = df_limpo.drop(columns=["PACIENTE"])
-
-
-            appointments = []
-            for _, row in df_limpo.iterrows():
-                try:
-                    data_str = row["DATA"]
-                    if pd.isna(data_str) or not isinstance(data_str, str):
-                        continue
-
-                    data_obj = datetime.strptime(data_str, "%d/%m/%Y").date()
-
-                    hora_str = row["HORA"]
-                    hora_obj = None
-                    if not pd.isna(hora_str) and isinstance(hora_str, str):
-                        hora_str_clean = hora_str.strip()
-                        for fmt in ["%H:%M:%S", "%H:%M"]:
-                            try:
-                                hora_obj = datetime.strptime(hora_str_clean, fmt).time()
-                                break
-                            except ValueError:
-                                continue
-
-                    appointment = {
-                        "data_consulta": data_obj,
-                        "hora_consulta": hora_obj,
-                        "codigo": str(row["CODIGO"]).strip()
-                        if not pd.isna(row["CODIGO"])
-                        else "",
-                        "telefone": str(row["TELEFONE"]).strip()
-                        if not pd.isna(row["TELEFONE"])
-                        else "",
-                        "nome_paciente": str(row["NOME_PACIENTE"]).strip()
-                        if not pd.isna(row["NOME_PACIENTE"])
-                        else "",
-                        "profissional": str(row["RESPONSÁVEL"]).strip()
-                        if not pd.isna(row["RESPONSÁVEL"])
-                        else "",
-                        "procedimento": str(row["TIPO"]).strip()
-                        if not pd.isna(row["TIPO"])
-                        else "",
-                        "status": str(row["STATUS"]).strip()
-                        if not pd.isna(row["STATUS"])
-                        else "",
-                        "primeira_consulta": "primeira" in str(row["TIPO"]).lower()
-                        if not pd.isna(row["TIPO"])
-                        else False,
-                        "especialidade": "",
-                        "observacoes": "",
-                    }
-                    appointments.append(appointment)
-
-                except Exception as e:
-                    print(f"Erro ao processar linha {_}: {e}")
-                    continue
-
-            return {
-                "status": "success",
-                "appointments": appointments,
-                "total_count": len(appointments),
-            }
+            return parse_next_appointments_excel(full_path)
 
         except Exception as e:
             print(f"Erro ao obter dados do Excel: {e}")
@@ -325,18 +339,35 @@ class NextAppointmentsScraper(Browser):
                 "message": "Falha ao obter dados do Excel.",
             }
 
+    def capture_excel_data(self):
+        """
+        Com EXPORT_CAPTURE=memory, exporta pelo fetch do Chrome e converte o
+        relatório em memória. None quando o modo está desligado ou falhou,
+        para o chamador seguir pelo download.
+        """
+        if self.settings.export_capture != "memory":
+            return None
+        try:
+            excel = self.fetch_export(
+                self.settings.softclyn_http_next_appointments_path, next_appointments_params()
+            )
+        except Exception as e:
+            print(f"Exportação em memória falhou ({e}), baixando o arquivo...")
+            return None
+        print(f"Relatório capturado em memória ({excel.getbuffer().nbytes} bytes)")
+        return parse_next_appointments_excel(excel)
+
     def remove_excel_file(self):
         try:
-            # Use relative path based on this file's location
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            folder_path = os.path.join(base_dir, "data")
-            file_name = "26relatorio.xls"
-            full_path = os.path.join(folder_path, file_name)
+            full_path = self.excel_path
+            if not full_path:
+                return
             if os.path.exists(full_path):
                 os.remove(full_path)
-                print(f"Arquivo {file_name} removido com sucesso.")
+                print(f"Arquivo {os.path.basename(full_path)} removido com sucesso.")
             else:
-                print(f"Arquivo {file_name} não encontrado.")
+                print(f"Arquivo {full_path} não encontrado.")
+            self.excel_path = None
         except Exception as e:
             print(f"Erro ao remover arquivo: {e}")
     
@@ -345,14 +376,20 @@ class NextAppointmentsScraper(Browser):
         """
         Scrapes the next appointments from the website.
         """
+        result = self._http_fetch("get_next_appointments")
+        if result:
+            return result
+
         try:
             self._login()
             self._close_modal()
-            self.click_on_reports_menu()
-            self.set_date_range()
-            self.select_all_doctors()
-            self.export_excel()
-            result = self.get_excel_data()
+            result = self.capture_excel_data()
+            if result is None:
+                self.click_on_reports_menu()
+                self.set_date_range()
+                self.select_all_doctors()
+                self.export_excel()
+                result = self.get_excel_data()
 
             if result.get("status") != "success":
                 return result
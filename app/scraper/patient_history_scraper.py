@@ -1,5 +1,6 @@
 import time
-from datetime import datetime
+from collections import deque
+from datetime import date, datetime
 
 from selenium.common import StaleElementReferenceException
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
@@ -8,12 +9,128 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
 
-from app.scraper.base import Browser
+from app.core.tracing import span, traced
+from app.scraper.base import Browser, ajax_idle_condition
+
+# Linhas do histórico que não representam um atendimento.
+HISTORY_IGNORE_WORDS = ["EXCLUÍDO POR", "DESMARCOU", "FALTOU"]
+
+HISTORY_BUTTON_XPATH = "//button[@title='Visualizar Histórico do Paciente.']"
+OPEN_MODAL_XPATH = "//div[contains(@class,'modal') and contains(@style,'display: block')]"
+MAX_HISTORY_PAGES = 100
+
+HISTORY_TABLES_XPATH = (
+    "//table[contains(@class,'table-bordered')]"
+    "[.//td[contains(@class,'active') and contains(., 'Profissional')]]"
+)
+
+# Lê todas as tabelas da página do histórico em uma única chamada ao
+# WebDriver: cabeçalho do profissional, classe da linha e as colunas usadas.
+HISTORY_EXTRACT_SCRIPT = """
+const all = (xpath, ctx) => {
+    const result = document.evaluate(
+        xpath, ctx, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    );
+    const nodes = [];
+    for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+    return nodes;
+};
+return all(arguments[0], document).map((table) => {
+    const strong = all(".//td[contains(@class,'active')]//strong", table)[0];
+    return {
+        profissional: strong ? strong.innerText.trim() : null,
+        rows: all(".//tbody/tr[td and not(th) and not(td[@colspan])]", table).map((tr) => {
+            const cells = tr.getElementsByTagName("td");
+            const text = (i) => (cells[i] ? cells[i].innerText.trim() : "");
+            return {
+                class: tr.getAttribute("class") || "",
+                colunas: cells.length,
+                data: text(0),
+                hora: text(1),
+                tipo: text(5),
+                retorno_ate: text(7),
+            };
+        }),
+    };
+});
+"""
+
+
+def required(element, locator: str):
+    """Resultado de uma espera do multi-aba que não pode dar timeout (None)."""
+    if not element:
+        raise NoSuchElementException(f"{locator} não apareceu")
+    return element
+
+
+def patient_not_found(search_type: str, identifier: str) -> dict:
+    """Resultado do histórico quando a pesquisa não traz o paciente."""
+    return {
+        "status": "not_found",
+        "message": f"Paciente {search_type.upper()} {identifier} não encontrado.",
+        "appointments": [],
+        "patient_info": None,
+        "pages": 0,
+    }
+
+
+def parse_history_tables(tables: list[dict], today: datetime) -> list[dict]:
+    """
+    Aplica as regras do histórico sobre as tabelas extraídas (ver
+    HISTORY_EXTRACT_SCRIPT): ignora linhas canceladas/faltas e as linhas
+    bg-danger já passadas (paciente não compareceu).
+    """
+    appointments = []
+    for table in tables:
+        profissional = (
+            table["profissional"].replace("Profissional / Agenda:", "").strip()
+            if table.get("profissional")
+            else "Desconhecido"
+        )
+        print(f"Found profissional: {profissional}")
+
+        for row in table["rows"]:
+            if row["colunas"] < 9:
+                continue
+
+            dta_atend = row["data"]
+            if any(word in dta_atend for word in HISTORY_IGNORE_WORDS):
+                continue
+
+            dta_atend_date = datetime.strptime(dta_atend, "%d/%m/%Y")
+            if row["class"] == "bg-danger" and dta_atend_date < today:  # não compareceu
+                # TODO: implementar também por última data no banco de dados
+                continue
+
+            appointments.append(
+                {
+                    "profissional": profissional,
+                    "data_atendimento": dta_atend,
+                    "hora": row["hora"],
+                    "tipo": row["tipo"],
+                    "retorno_ate": row["retorno_ate"],
+                }
+            )
+    return appointments
+
+
+def page_older_than(appointments: list[dict], stop_at: date | None) -> bool:
+    """
+    True se a página tem atendimentos e todos são anteriores a `stop_at` (a
+    última data_consulta já gravada). O histórico vem do mais recente para o
+    mais antigo, então as páginas seguintes também já estão no banco.
+    """
+    if stop_at is None or not appointments:
+        return False
+    return all(
+        datetime.strptime(a["data_atendimento"], "%d/%m/%Y").date() < stop_at
+        for a in appointments
+    )
 
 
 class PatientHistoryScraper(Browser):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, driver=None):
+        super().__init__(driver=driver)
         self._logged_in_system = None  # Track which system we're logged into
         self._on_search_screen = False  # Track if we're on the patient search screen
 
@@ -26,6 +143,7 @@ class PatientHistoryScraper(Browser):
             self._on_search_screen = False
         super().set_sistema(sistema)
 
+    @traced("history.next_page")
     def go_to_next_page(self):
         try:
             # Selector específico para a paginação do histórico
@@ -73,6 +191,10 @@ class PatientHistoryScraper(Browser):
             self.save_screenshot("patient_history_navigate_error.png")
             return False
 
+    def extract_history_page(self) -> list[dict]:
+        """Tabelas da página atual do histórico, lidas com um único execute_script."""
+        return self.execute_script(HISTORY_EXTRACT_SCRIPT, HISTORY_TABLES_XPATH) or []
+
     def is_last_page(self):
         import re
 
@@ -191,7 +313,7 @@ class PatientHistoryScraper(Browser):
                     )
                     select.select_by_value(option_value)
 
-                time.sleep(1)
+                self.wait_for_ajax_idle(replaces=1, name="tipo_pesquisa")
                 print(f"Patient search screen ready (type: {visible_text}).")
                 return True
 
@@ -224,13 +346,13 @@ class PatientHistoryScraper(Browser):
 
                 print(f"Type {type} entered in search field.")
 
-                search_button = self.wait_for_element(
+                search_button = self.wait_for_dom_marker(
                     By.ID,
                     "btPesquisaPacienteGrade1",
+                    replaces=2,
+                    expectation=EC.element_to_be_clickable,
                 )
 
-                time.sleep(2)
-
                 if search_button:
                     try:
                         search_button.click()
@@ -243,9 +365,11 @@ class PatientHistoryScraper(Browser):
             else:
                 print("Could not find type search field.")
 
+            self.wait_for_ajax_idle(name="pesquisa_paciente")
+
             # Specific XPath for the results table cell containing the code
             # Usually the first column of the first row in the results table
-            codigo_elem = self.find_element(
+            codigo_elem = self.wait_for_dom_marker(
                 By.XPATH,
                 "//div[@id='divGradePesquisaPaciente']//table//tr[td and not(th)][1]/td[1]",
             )
@@ -317,19 +441,278 @@ class PatientHistoryScraper(Browser):
             except:
                 self.execute_script("arguments[0].click();", prontuario_menu)
 
-        time.sleep(1)
+        self.wait_for_dom_marker(
+            By.ID,
+            "tipoPesquisaPacienteGrade",
+            replaces=1,
+            expectation=EC.element_to_be_clickable,
+        )
         self._on_search_screen = True
         return True
 
+    def _history_steps(self, identifier: str, search_type: str, stop_at: date | None = None):
+        """
+        Fluxo de get_patient_history quebrado em passos para o modo multi-aba.
+        Cada yield é uma espera (nome, condição, timeout) que o escalonador de
+        get_patient_histories verifica com esta aba ativa; o valor enviado de
+        volta é o resultado da condição (None em timeout).
+        """
+        today = datetime.strptime(datetime.now().strftime("%d/%m/%Y"), "%d/%m/%Y")
+        type_map = {
+            "cpf": "Cpf",
+            "nome": "Nome",
+            "codigo": "Código",
+            "prontuario": "Prontuário",
+            "telefone": "Telefone",
+            "datanascimento": "Data Nascimento",
+            "data_nascimento": "Data Nascimento",
+        }
+        tipo_pesquisa = yield (
+            "campo_tipo_pesquisa",
+            EC.element_to_be_clickable((By.ID, "tipoPesquisaPacienteGrade")),
+            10,
+        )
+        select = Select(required(tipo_pesquisa, "tipoPesquisaPacienteGrade"))
+        try:
+            select.select_by_visible_text(type_map.get(search_type.lower(), search_type.capitalize()))
+        except Exception:
+            select.select_by_value(search_type.lower())
+        yield ("tipo_pesquisa", ajax_idle_condition(), 10)
+
+        search_field = yield (
+            "campo_pesquisa",
+            EC.presence_of_element_located((By.ID, "pesquisaPacienteGrade")),
+            10,
+        )
+        search_field = required(search_field, "pesquisaPacienteGrade")
+        search_field.clear()
+        search_field.send_keys(identifier)
+        search_button = yield (
+            "botao_pesquisa",
+            EC.presence_of_element_located((By.ID, "btPesquisaPacienteGrade1")),
+            10,
+        )
+        self.execute_script(
+            "arguments[0].click();", required(search_button, "btPesquisaPacienteGrade1")
+        )
+        yield ("pesquisa_paciente", ajax_idle_condition(), 15)
+
+        botao_historico = yield (
+            "botao_historico",
+            EC.presence_of_element_located((By.XPATH, HISTORY_BUTTON_XPATH)),
+            10,
+        )
+        if not botao_historico:
+            print(f"[aba] Could not find historical button for {identifier}.")
+            return patient_not_found(search_type, identifier)
+
+        patient_info = None
+        cells = [c.text.strip() for c in botao_historico.find_elements(By.XPATH, "./ancestor::tr/td")[:4]]
+        if len(cells) >= 4 and cells[0].isdigit():
+            patient_info = {"codigo": cells[0], "nome": cells[1], "data_nascimento": cells[3] or None}
+        self.execute_script("arguments[0].click();", botao_historico)
+
+        appointments = []
+        pages = 0
+        pagination_xpath = "//ul[@class='pagination'][.//a[contains(@href, 'scriptTrilhaAuditoriaAgenda')]]"
+        for _ in range(MAX_HISTORY_PAGES):
+            yield ("pagina_historico", ajax_idle_condition(), 15)
+            yield (
+                "tabela_historico",
+                EC.presence_of_element_located(
+                    (By.XPATH, "//table[contains(@class,'table-bordered')][.//td[contains(@class,'active')]]")
+                ),
+                10,
+            )
+            page = parse_history_tables(self.extract_history_page(), today)
+            appointments.extend(page)
+            pages += 1
+
+            if page_older_than(page, stop_at) or self.is_last_page():
+                break
+            current = self.find_elements(By.XPATH, f"{pagination_xpath}//a[@class='paginaAtual']")
+            if not current:
+                break
+            next_val = int(current[0].get_attribute("data-value")) + 1
+            self.execute_script(f"scriptTrilhaAuditoriaAgenda.pesquisaPorPagina({next_val});")
+
+            def page_changed(driver, next_val=next_val):
+                elems = driver.find_elements(By.XPATH, f"{pagination_xpath}//a[@class='paginaAtual']")
+                return bool(elems) and elems[0].get_attribute("data-value") == str(next_val)
+
+            if not (yield ("troca_pagina", page_changed, 10)):
+                break
+
+        close_buttons = self.find_elements(By.XPATH, f"{OPEN_MODAL_XPATH}//button[@data-dismiss='modal']")
+        if close_buttons:
+            self.execute_script("arguments[0].click();", close_buttons[0])
+            yield ("fechar_historico", EC.invisibility_of_element_located((By.XPATH, OPEN_MODAL_XPATH)), 5)
+
+        print(f"[aba] Found {len(appointments)} appointments for {search_type.upper()} {identifier}.")
+        return {
+            "status": "success",
+            "appointments": appointments,
+            "patient_info": patient_info,
+            "pages": pages,
+        }
+
+    def _open_search_tab(self, new_tab: bool) -> str:
+        """Abre (ou prepara) uma aba na tela de pesquisa de paciente e retorna seu handle."""
+        if new_tab:
+            self.driver.switch_to.new_window("tab")
+            self.get(self._home_url, timeout=self.settings.page_load_timeout)
+        self._on_search_screen = False
+        self.ensure_on_patient_search()
+        return self.driver.current_window_handle
+
+    def get_patient_histories(
+        self,
+        identifiers: list[str],
+        search_type: str = "codigo",
+        tabs: int = 3,
+        stop_at: dict[str, date] | None = None,
+        deadline: float | None = None,
+        heartbeat=None,
+    ) -> dict[str, dict]:
+        """
+        Busca o histórico de vários pacientes em `tabs` abas do mesmo Chrome logado.
+
+        Selenium controla uma aba por vez, então cada aba avança até a próxima
+        espera (AJAX, modal, troca de página) e o escalonador passa para a
+        seguinte; as requisições das outras abas seguem rodando no servidor.
+        `stop_at` traz o watermark de cada identificador (ver get_patient_history).
+        Nenhum identificador novo é iniciado depois de `deadline` (time.time())
+        e `heartbeat` é chamado antes de cada um.
+        Retorna {identificador: resultado no formato de get_patient_history};
+        os identificadores não iniciados ficam de fora.
+        """
+        results = {}
+        stop_at = stop_at or {}
+        if tabs <= 1 or len(identifiers) <= 1:
+            for identifier in identifiers:
+                if deadline and time.time() >= deadline:
+                    break
+                if heartbeat:
+                    heartbeat()
+                results[identifier] = self.get_patient_history(
+                    identifier, search_type, stop_at=stop_at.get(identifier)
+                )
+            return results
+
+        with span("get_patient_histories", root=True, tabs=tabs, patients=len(identifiers)):
+            self.ensure_logged_in()
+            queue = deque(identifiers)
+            handles = [self._open_search_tab(new_tab=False)]
+            original = handles[0]
+            for _ in range(min(tabs, len(identifiers)) - 1):
+                handles.append(self._open_search_tab(new_tab=True))
+
+            # Estado por aba: [identificador, gerador, espera atual, prazo, início]
+            active = {handle: None for handle in handles}
+            start = time.perf_counter()
+
+            while queue or any(active.values()):
+                progressed = False
+                for handle in handles:
+                    state = active[handle]
+                    if state is None and queue and deadline and time.time() >= deadline:
+                        print(f"[aba] Time budget reached: {len(queue)} patients not started.")
+                        queue.clear()
+                    if state is None and not queue:
+                        continue
+                    self.driver.switch_to.window(handle)
+
+                    if state is None:
+                        if heartbeat:
+                            heartbeat()
+                        identifier = queue.popleft()
+                        steps = self._history_steps(
+                            identifier, search_type, stop_at.get(identifier)
+                        )
+                        state = active[handle] = [
+                            identifier, steps, None, 0.0, time.perf_counter()
+                        ]
+                        value = None
+                    else:
+                        _, condition, _ = state[2]
+                        try:
+                            value = condition(self.driver)
+                        except Exception:
+                            value = False
+                        if not value and time.perf_counter() < state[3]:
+                            continue
+                        value = value or None
+
+                    progressed = True
+                    identifier, steps = state[0], state[1]
+                    try:
+                        wait = steps.send(value) if state[2] else next(steps)
+                        state[2] = wait
+                        state[3] = time.perf_counter() + wait[2]
+                    except StopIteration as done:
+                        results[identifier] = {
+                            **done.value,
+                            "duration": time.perf_counter() - state[4],
+                        }
+                        active[handle] = None
+                    except Exception as e:
+                        print(f"[aba] Error fetching history for {identifier}: {e}")
+                        results[identifier] = {"status": "error", "message": str(e)}
+                        active[handle] = None
+                        try:
+                            self._open_search_tab(new_tab=False)
+                        except Exception as reset_error:
+                            print(f"[aba] Could not reset tab: {reset_error}")
+                            handles.remove(handle)
+                            if handles:
+                                # Fecha a aba quebrada (mesmo que seja a janela
+                                # original); a última fica aberta para a sessão.
+                                try:
+                                    self.driver.close()
+                                except Exception as close_error:
+                                    print(f"[aba] Could not close tab: {close_error}")
+                            break
+
+                if not handles:
+                    break
+                if not progressed:
+                    time.sleep(0.05)
+
+            for handle in handles[1:]:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self._on_search_screen = False
+            if handles:
+                self.driver.switch_to.window(handles[0])
+                if handles[0] == original:
+                    self._on_search_screen = True
+                else:
+                    # A janela original caiu: só a aba sobrevivente, depois de
+                    # voltar à pesquisa, vale como tela de pesquisa.
+                    try:
+                        self._open_search_tab(new_tab=False)
+                    except Exception as e:
+                        print(f"[aba] Could not reset surviving tab: {e}")
+
+            elapsed = max(time.perf_counter() - start, 0.001)
+            print(
+                f"{len(results)} históricos em {elapsed:.1f}s com {len(handles)} abas "
+                f"({len(results) / elapsed * 3600:.0f} pacientes/hora)."
+            )
+        for identifier in queue:
+            results.setdefault(identifier, {"status": "error", "message": "Nenhuma aba disponível."})
+        return results
+
     def _close_history_modal(self):
         """
         Closes the patient history modal to return to the search screen.
         This allows searching for the next patient without re-navigating.
         """
+        modal_xpath = "//div[contains(@class,'modal') and contains(@style,'display: block')]"
         try:
             close_button = self.wait_for_element(
                 By.XPATH,
-                "//div[contains(@class,'modal') and contains(@style,'display: block')]//button[@data-dismiss='modal']",
+                f"{modal_xpath}//button[@data-dismiss='modal']",
                 timeout=5,
             )
             if close_button:
@@ -338,19 +721,42 @@ class PatientHistoryScraper(Browser):
                 except:
                     self.execute_script("arguments[0].click();", close_button)
                 print("History modal closed.")
-                time.sleep(0.5)
+                self.wait_until(
+                    "fechar_historico",
+                    EC.invisibility_of_element_located((By.XPATH, modal_xpath)),
+                    timeout=5,
+                    replaces=0.5,
+                )
                 return True
         except Exception as e:
             print(f"Could not close history modal: {e}")
         return False
 
-    def get_patient_history(self, identifier: str, search_type: str = "cpf"):
+    @traced("get_patient_history", root=True)
+    def get_patient_history(
+        self,
+        identifier: str,
+        search_type: str = "cpf",
+        stop_at: date | None = None,
+        need_birth_date: bool = False,
+    ):
         """
         Scrapes the patient's appointment history from the website.
         Returns a list of appointment dictionaries.
 
         Optimized to reuse existing session - only logs in once per system.
+        With `stop_at` (latest data_consulta already stored for the patient),
+        pagination stops at the first page entirely older than it.
+        When the search returns no patient, status is "not_found".
+        The HTTP mode does not return data_nascimento, so `need_birth_date`
+        forces the Chrome search, which reads it from the results grid.
         """
+        if search_type == "codigo" and not need_birth_date:
+            result = self._http_fetch("get_patient_history", identifier, stop_at)
+            if result:
+                return result
+
+        self.reset_wait_log()
         try:
             # Ensure we're logged in (will skip if already logged into correct system)
             self.ensure_logged_in()
@@ -393,7 +799,7 @@ class PatientHistoryScraper(Browser):
                         search_type.lower(), search_type.lower()
                     )
                     select.select_by_value(option_value)
-                time.sleep(2)
+                self.wait_for_ajax_idle(replaces=2, name="tipo_pesquisa")
 
             print("Entered patient history screen.")
 
@@ -401,7 +807,6 @@ class PatientHistoryScraper(Browser):
 
             if search_field:
                 search_field.clear()
-                time.sleep(1)
                 try:
                     search_field.send_keys(identifier)
                 except:
@@ -413,13 +818,13 @@ class PatientHistoryScraper(Browser):
                     f"{search_type.capitalize()} {identifier} entered in search field."
                 )
 
-                search_button = self.wait_for_element(
+                search_button = self.wait_for_dom_marker(
                     By.ID,
                     "btPesquisaPacienteGrade1",
+                    replaces=3,
+                    expectation=EC.element_to_be_clickable,
                 )
 
-                time.sleep(2)
-
                 if search_button:
                     try:
                         search_button.click()
@@ -432,7 +837,7 @@ class PatientHistoryScraper(Browser):
             else:
                 print(f"Could not find search field for {search_type}.")
 
-            time.sleep(2)
+            self.wait_for_ajax_idle(replaces=2, name="pesquisa_paciente")
 
             patient_info = None
             botao_historico = self.wait_for_element(
@@ -469,11 +874,9 @@ class PatientHistoryScraper(Browser):
                 print("Historical button clicked.")
             else:
                 print("Could not find historical button.")
-
-            time.sleep(0.5)
+                return patient_not_found(search_type, identifier)
 
             appointments = []
-            ignore_words = ["EXCLUÍDO POR", "DESMARCOU", "FALTOU"]
             today_string = datetime.now().strftime("%d/%m/%Y")
             today = datetime.strptime(today_string, "%d/%m/%Y")
             max_pages = 100
@@ -482,64 +885,20 @@ class PatientHistoryScraper(Browser):
             while True:
                 page_count += 1
                 print(f"Processing page {page_count}/{max_pages}")
-                time.sleep(1)
+                self.wait_for_ajax_idle(replaces=1.5 if page_count == 1 else 1, name="pagina_historico")
 
-                self.wait_for_element(
+                self.wait_for_dom_marker(
                     By.XPATH,
                     "//table[contains(@class,'table-bordered')][.//td[contains(@class,'active')]]",
                 )
 
-                tables = self.find_elements(
-                    By.XPATH,
-                    # "//table[contains(@class,'table-bordered')]"
-                    "//table[contains(@class,'table-bordered')][.//td[contains(@class,'active') and contains(., 'Profissional')]]",
-                )
-
-                for table in tables:
-                    prof_elem = table.find_elements(
-                        By.XPATH, ".//td[contains(@class,'active')]//strong"
-                    )
-                    profissional = (
-                        prof_elem[0].text.replace("Profissional / Agenda:", "").strip()
-                        if prof_elem
-                        else "Desconhecido"
-                    )
-                    print(f"Found profissional: {profissional}")
-
-                    # linhas = table.find_elements(By.XPATH, ".//tr[td and not(td[@colspan]) and not(th)]")
-                    linhas = table.find_elements(
-                        By.XPATH, ".//tbody/tr[td and not(th) and not(td[@colspan])]"
-                    )
-
-                    for linha in linhas:
-                        colunas = linha.find_elements(By.TAG_NAME, "td")
-
-                        if len(colunas) < 9:
-                            continue
-
-                        dta_atend = colunas[0].text.strip()
-
-                        if any(word in dta_atend for word in ignore_words):
-                            continue
-
-                        dta_atend_date = datetime.strptime(dta_atend, "%d/%m/%Y")
+                tables = self.extract_history_page()
+                page = parse_history_tables(tables, today)
+                appointments.extend(page)
 
-                        if (
-                            linha.get_attribute("class") == "bg-danger"
-                            and dta_atend_date < today
-                        ):  # não compareceu
-                            # TODO: implementar também por última data no banco de dados
-                            continue
-
-                        appointments.append(
-                            {
-                                "profissional": profissional,
-                                "data_atendimento": dta_atend,
-                                "hora": colunas[1].text.strip(),
-                                "tipo": colunas[5].text.strip(),
-                                "retorno_ate": colunas[7].text.strip(),
-                            }
-                        )
+                if page_older_than(page, stop_at):
+                    print(f"Page {page_count} is older than {stop_at}, stopping.")
+                    break
 
                 if not self.go_to_next_page():
                     # print("Falha na navegação. Encerrando loop.")
@@ -552,6 +911,7 @@ class PatientHistoryScraper(Browser):
                     "status": "success",
                     "appointments": [],
                     "patient_info": patient_info,
+                    "pages": page_count,
                 }
 
             print(
@@ -561,6 +921,7 @@ class PatientHistoryScraper(Browser):
                 "status": "success",
                 "appointments": appointments,
                 "patient_info": patient_info,
+                "pages": page_count,
             }
 
         except TimeoutException as e:
@@ -579,6 +940,7 @@ class PatientHistoryScraper(Browser):
             else:
                 # Failed to close modal, will need to re-navigate
                 self._on_search_screen = False
+            print(f"Wait report: {self.wait_report()}")
             print("History fetch cycle ended.")
 
     def get_patient_codes_from_search(
@@ -624,21 +986,24 @@ class PatientHistoryScraper(Browser):
                         search_type.lower(), search_type.lower()
                     )
                     select.select_by_value(option_value)
-                time.sleep(1)
+                self.wait_for_ajax_idle(replaces=1, name="tipo_pesquisa")
 
             search_field = self.wait_for_element(By.ID, "pesquisaPacienteGrade")
             if search_field:
                 search_field.clear()
-                time.sleep(0.5)
                 try:
                     search_field.send_keys(identifier)
                 except Exception:
                     self.execute_script(
                         "arguments[0].value = arguments[1];", search_field, identifier
                     )
-                time.sleep(1)
 
-                search_button = self.wait_for_element(By.ID, "btPesquisaPacienteGrade1")
+                search_button = self.wait_for_dom_marker(
+                    By.ID,
+                    "btPesquisaPacienteGrade1",
+                    replaces=1.5,
+                    expectation=EC.element_to_be_clickable,
+                )
                 if search_button:
                     try:
                         search_button.click()
@@ -646,7 +1011,7 @@ class PatientHistoryScraper(Browser):
                         self.execute_script("arguments[0].click();", search_button)
                 else:
                     search_field.send_keys(Keys.ENTER)
-                time.sleep(2)
+                self.wait_for_ajax_idle(replaces=2, name="pesquisa_paciente")
 
             # Wait for history buttons to appear (same proven strategy as get_patient_history).
             # Returns None if no matching patients — find_elements below will return [].
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+from urllib.parse import quote_plus, urlsplit
+
+# Tipos de recurso (CDP) que a tela precisa para funcionar offline.
+RECORDED_TYPES = {"Document", "XHR", "Fetch", "Script", "Stylesheet", "Other"}
+# Cabeçalhos da resposta que o servidor mock devolve.
+REPLAYED_HEADERS = ("content-type", "content-disposition", "location")
+
+
+class SoftclynRecorder:
+    """
+    Grava as respostas do SoftClyn lidas do log de performance do Chrome
+    (RECORD_DIR) para o servidor mock (app.mocks.softclyn_server) reproduzir.
+
+    Cada resposta vira uma linha de `index.jsonl` (método, caminho, query,
+    corpo do POST, status e cabeçalhos) e um arquivo em `bodies/`. Exportações
+    baixadas pelo Chrome não têm corpo acessível via CDP e são anexadas pelo
+    arquivo salvo em wait_for_download.
+    """
+
+    def __init__(self, directory: str, base_url: str, secrets: tuple[str, ...] = ()):
+        self.directory = directory
+        # Valores (ex.: a senha do login) que nunca vão para o disco.
+        self.secrets = [s for s in secrets if s]
+        self.origin = "{0.scheme}://{0.netloc}".format(urlsplit(base_url))
+        self.bodies_dir = os.path.join(directory, "bodies")
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.jsonl")
+        self._count = sum(1 for _ in os.scandir(self.bodies_dir))
+        self._requests = {}
+        self._responses = {}
+        self._awaiting_download = []
+
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"origin": self.origin}, f)
+
+    def _is_softclyn(self, url: str) -> bool:
+        return url.startswith(self.origin)
+
+    def capture(self, driver, messages: list[dict]):
+        """Processa mensagens Network.* do log de performance."""
+        for message in messages:
+            method = message.get("method")
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+
+            if method == "Network.requestWillBeSent":
+                request = params.get("request", {})
+                redirect = params.get("redirectResponse")
+                if redirect and request_id in self._requests:
+                    # O mesmo requestId segue o redirect: grava o salto anterior.
+                    self._write(self._requests[request_id], redirect, b"")
+                if not self._is_softclyn(request.get("url", "")):
+                    continue
+                post_data = request.get("postData")
+                if post_data is None and request.get("hasPostData"):
+                    post_data = self._request_post_data(driver, request_id)
+                self._requests[request_id] = {
+                    "method": request.get("method", "GET"),
+                    "url": request["url"],
+                    "body": self._redact(post_data or ""),
+                }
+            elif method == "Network.responseReceived":
+                if request_id in self._requests and params.get("type") in RECORDED_TYPES:
+                    self._responses[request_id] = params.get("response", {})
+            elif method == "Network.loadingFinished":
+                response = self._responses.pop(request_id, None)
+                request = self._requests.pop(request_id, None)
+                if response is None or request is None:
+                    continue
+                body = self._response_body(driver, request_id)
+                if body is None:
+                    # Download: o corpo só existe no arquivo salvo pelo Chrome.
+                    self._awaiting_download.append((request, response))
+                else:
+                    self._write(request, response, body)
+
+    def attach_download(self, path: str):
+        """Associa o arquivo baixado à resposta de exportação mais recente."""
+        if not self._awaiting_download:
+            return
+        request, response = self._awaiting_download.pop()
+        with open(path, "rb") as f:
+            self._write(request, response, f.read(), suffix=os.path.splitext(path)[1])
+
+    def _redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(quote_plus(secret), "REDACTED").replace(secret, "REDACTED")
+        return text
+
+    def _request_post_data(self, driver, request_id: str) -> str | None:
+        try:
+            return driver.execute_cdp_cmd(
+                "Network.getRequestPostData", {"requestId": request_id}
+            ).get("postData")
+        except Exception:
+            return None
+
+    def _response_body(self, driver, request_id: str) -> bytes | None:
+        try:
+            result = driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": request_id}
+            )
+        except Exception:
+            return None
+        if result.get("base64Encoded"):
+            return base64.b64decode(result["body"])
+        return result["body"].encode("utf-8")
+
+    def _write(self, request: dict, response: dict, body: bytes, suffix: str = ""):
+        url = urlsplit(request["url"])
+        headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+        self._count += 1
+        filename = f"{self._count:05d}{suffix}"
+        with open(os.path.join(self.bodies_dir, filename), "wb") as f:
+            f.write(body)
+
+        entry = {
+            "method": request["method"],
+            "path": url.path,
+            "query": url.query,
+            "body": request["body"],
+            "status": response.get("status", 200),
+            "headers": {k: headers[k] for k in REPLAYED_HEADERS if k in headers},
+            "file": filename,
+        }
+        with open(self._index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
@@ -0,0 +1,62 @@
+import json
+from functools import lru_cache
+
+import redis
+
+from ..core.dependencies import get_settings
+
+
+@lru_cache
+def redis_client():
+    """Conexão Redis do processo (sessões, checkpoints)."""
+    redis_url = get_settings().redis_url
+    if "localhost" in redis_url:
+        redis_url = redis_url.replace("localhost", "127.0.0.1")
+    return redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+
+
+def _session_key(sistema: str) -> str:
+    return f"softclyn:session:{get_settings().softclyn_empresa}:{sistema.lower()}"
+
+
+def load_session(sistema: str) -> dict | None:
+    """
+    Retorna a sessão salva ({"cookies": [...], "home_url": str}) do sistema,
+    ou None se não houver, estiver expirada ou o Redis estiver indisponível.
+    """
+    if get_settings().softclyn_session_ttl <= 0:
+        return None
+    try:
+        raw = redis_client().get(_session_key(sistema))
+    except redis.RedisError as e:
+        print(f"Redis indisponível ao ler sessão {sistema.upper()}: {e}")
+        return None
+    if not raw:
+        return None
+    try:
+        session = json.loads(raw)
+    except ValueError:
+        return None
+    if not session.get("cookies") or not session.get("home_url"):
+        return None
+    return session
+
+
+def save_session(sistema: str, cookies: list[dict], home_url: str):
+    """Guarda os cookies de um login bem-sucedido com TTL de SOFTCLYN_SESSION_TTL."""
+    ttl = get_settings().softclyn_session_ttl
+    if ttl <= 0 or not cookies:
+        return
+    payload = json.dumps({"cookies": cookies, "home_url": home_url})
+    try:
+        redis_client().set(_session_key(sistema), payload, ex=ttl)
+    except redis.RedisError as e:
+        print(f"Redis indisponível ao salvar sessão {sistema.upper()}: {e}")
+
+
+def invalidate_session(sistema: str):
+    """Remove a sessão salva (ex.: o servidor já não a aceita)."""
+    try:
+        redis_client().delete(_session_key(sistema))
+    except redis.RedisError as e:
+        print(f"Redis indisponível ao invalidar sessão {sistema.upper()}: {e}")
@@ -1,3 +1,4 @@
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from datetime import datetime, date, time as time_type
 from typing import List, Optional
@@ -6,12 +7,10 @@ from app.models.dados_cliente import DadosCliente
 from app.models.agendamento import Agendamento
 from app.models.enums import SistemaOrigem
 from app.scraper.next_appointments import NextAppointmentsScraper
+from app.services.next_appointments_seed import fetch_next_appointments
 
 
 class AppointmentSyncService:
-    def __init__(self):
-        self.scraper = NextAppointmentsScraper()
-
     def get_all_cpfs(self, session: Session | None = None) -> List[str]:
         """
         Retrieves all CPFs from the database.
@@ -120,17 +119,19 @@ class AppointmentSyncService:
         print("Starting full appointment sync from website for all systems")
         
         systems = [SistemaOrigem.OURO, SistemaOrigem.OF]
-        all_results = []
-        
+        # As exportações rodam em paralelo (um scraper por sistema); a gravação
+        # vem depois, numa única transação com um savepoint por sistema.
+        website_results = fetch_next_appointments(systems)
+
         added_total = 0
         updated_total = 0
-        
+        synced_systems = []
+
         session = get_session()
         try:
             for sistema_enum in systems:
                 print(f"\n--- Syncing system: {sistema_enum.value.upper()} ---")
-                self.scraper.set_sistema(sistema_enum.value)
-                website_result = self.scraper.get_next_appointments()
+                website_result = website_results[sistema_enum]
 
                 if website_result.get("status") != "success":
                     print(f"Failed to fetch website data for {sistema_enum}: {website_result}")
@@ -139,75 +140,88 @@ class AppointmentSyncService:
                 website_appointments = website_result.get("appointments", [])
                 print(f"Found {len(website_appointments)} appointments on website for {sistema_enum}")
 
-                for web_app in website_appointments:
-                    try:
-                        codigo = web_app.get("codigo")
-                        if not codigo:
-                            continue
+                added = updated = 0
+                try:
+                    with session.begin_nested():
+                        for web_app in website_appointments:
+                            try:
+                                codigo = web_app.get("codigo")
+                                if not codigo:
+                                    continue
                         
-                        try:
-                            codigo_int = int(codigo)
-                        except ValueError:
-                            continue
-
-                        # Find patient in DB
-                        patient = session.query(DadosCliente).filter_by(
-                            codigo=codigo_int,
-                            sistema_origem=sistema_enum
-                        ).first()
-
-                        if not patient:
-                            print(f"  Warning: Patient {codigo} not found in {sistema_enum.value}. Skipping.")
-                            continue
-
-                        existing_appointment = (
-                            session.query(Agendamento)
-                            .filter(
-                                Agendamento.paciente_id == patient.id,
-                                Agendamento.data_consulta == web_app.get("data_consulta"),
-                                Agendamento.hora_consulta == web_app.get("hora_consulta"),
-                            )
-                            .first()
-                        )
-
-                        if existing_appointment:
-                            existing_appointment.profissional = web_app.get("profissional")
-                            existing_appointment.procedimento = web_app.get("procedimento")
-                            existing_appointment.status = web_app.get("status")
-                            updated_total += 1
-                        else:
-                            agendamento = Agendamento(
-                                paciente_id=patient.id,
-                                sistema_origem=sistema_enum,
-                                cpf=patient.cpf,
-                                codigo=patient.codigo,
-                                nome_paciente=web_app.get("nome_paciente", patient.nomewpp),
-                                data_consulta=web_app.get("data_consulta"),
-                                hora_consulta=web_app.get("hora_consulta"),
-                                data_nascimento=patient.data_nascimento or "1900-01-01",
-                                telefone=web_app.get("telefone") or patient.telefone or patient.cad_telefone,
-                                profissional=web_app.get("profissional"),
-                                especialidade=web_app.get("especialidade") or "Padrão",
-                                status=web_app.get("status"),
-                                procedimento=web_app.get("procedimento"),
-                                observacoes=web_app.get("observacoes") or "Sem observações",
-                                canal_agendamento="website_sync",
-                                created_at=datetime.now(),
-                            )
-                            session.add(agendamento)
-                            added_total += 1
-
-                    except Exception as e:
-                        print(f"  Error processing appointment for code {codigo}: {e}")
-                        continue
-
-                session.commit()
+                                try:
+                                    codigo_int = int(codigo)
+                                except ValueError:
+                                    continue
+
+                                # Find patient in DB
+                                patient = session.query(DadosCliente).filter_by(
+                                    codigo=codigo_int,
+                                    sistema_origem=sistema_enum
+                                ).first()
+
+                                if not patient:
+                                    print(f"  Warning: Patient {codigo} not found in {sistema_enum.value}. Skipping.")
+                                    continue
+
+                                existing_appointment = (
+                                    session.query(Agendamento)
+                                    .filter(
+                                        Agendamento.paciente_id == patient.id,
+                                        Agendamento.data_consulta == web_app.get("data_consulta"),
+                                        Agendamento.hora_consulta == web_app.get("hora_consulta"),
+                                    )
+                                    .first()
+                                )
+
+                                if existing_appointment:
+                                    existing_appointment.profissional = web_app.get("profissional")
+                                    existing_appointment.procedimento = web_app.get("procedimento")
+                                    existing_appointment.status = web_app.get("status")
+                                    updated += 1
+                                else:
+                                    agendamento = Agendamento(
+                                        paciente_id=patient.id,
+                                        sistema_origem=sistema_enum,
+                                        cpf=patient.cpf,
+                                        codigo=patient.codigo,
+                                        nome_paciente=web_app.get("nome_paciente", patient.nomewpp),
+                                        data_consulta=web_app.get("data_consulta"),
+                                        hora_consulta=web_app.get("hora_consulta"),
+                                        data_nascimento=patient.data_nascimento or "1900-01-01",
+                                        telefone=web_app.get("telefone") or patient.telefone or patient.cad_telefone,
+                                        profissional=web_app.get("profissional"),
+                                        especialidade=web_app.get("especialidade") or "Padrão",
+                                        status=web_app.get("status"),
+                                        procedimento=web_app.get("procedimento"),
+                                        observacoes=web_app.get("observacoes") or "Sem observações",
+                                        canal_agendamento="website_sync",
+                                        created_at=datetime.now(),
+                                    )
+                                    session.add(agendamento)
+                                    added += 1
+
+                            except SQLAlchemyError:
+                                raise
+                            except Exception as e:
+                                print(f"  Error processing appointment for code {codigo}: {e}")
+                                continue
+                except SQLAlchemyError as e:
+                    print(f"Could not write {sistema_enum.value} appointments: {getattr(e, 'orig', e)}")
+                    continue
+
+                added_total += added
+                updated_total += updated
+                synced_systems.append(sistema_enum.value)
                 print(f"Completed sync for {sistema_enum.value}.")
 
+            session.commit()
+
             return {
                 "status": "success",
                 "new_appointments_added": added_total,
                 "appointments_updated": updated_total,
+                "synced_systems": synced_systems,
                 "sync_timestamp": datetime.now().isoformat(),
             }
 
@@ -217,7 +231,6 @@ class AppointmentSyncService:
             return {"status": "error", "message": str(e)}
         finally:
             session.close()
-            self.scraper.quit()
 
     def compare_and_sync(
         self, cpf: str, nome_paciente: str, medico: str | None = None
@@ -228,7 +241,13 @@ class AppointmentSyncService:
         """
         print(f"Starting sync for CPF: {cpf}, Patient: {nome_paciente}")
 
-        website_result = self.scraper.get_next_appointments()
+        # A sincronização completa usa fetch_next_appointments (um scraper por
+        # sistema); só esta comparação precisa de um Chrome próprio.
+        scraper = NextAppointmentsScraper()
+        try:
+            website_result = scraper.get_next_appointments()
+        finally:
+            scraper.quit()
 
         if website_result.get("status") != "success":
             print(f"Failed to fetch website data: {website_result}")
@@ -0,0 +1,75 @@
+import json
+import time
+
+import redis
+
+from ..core.dependencies import get_settings
+from ..scraper.session_store import redis_client
+
+# Desfechos que contam como trabalho terminado; "error" é refeito ao retomar.
+FINISHED_STATUSES = ("done", "not_found")
+
+
+class CheckpointStore:
+    """
+    Progresso de uma execução longa (seed de histórico, sync de CPF/código)
+    num hash do Redis `softclyn:checkpoint:<job>:<sistema>`: item -> desfecho.
+
+    Uma execução que morre no meio (Chrome, retry do Prefect, deploy) é
+    retomada pulando os itens já terminados. O hash expira CHECKPOINT_TTL
+    segundos após o último progresso e é apagado quando a execução termina.
+    Sem Redis, tudo vira no-op e a execução começa do zero como antes.
+    """
+
+    def __init__(self, job: str, sistema: str = "all"):
+        self.key = f"softclyn:checkpoint:{job}:{sistema.lower()}"
+        self.ttl = get_settings().checkpoint_ttl
+
+    def finished(self) -> set[str]:
+        """Itens já terminados numa execução anterior interrompida."""
+        if self.ttl <= 0:
+            return set()
+        try:
+            raw = redis_client().hgetall(self.key)
+        except redis.RedisError as e:
+            print(f"Redis indisponível ao ler checkpoint {self.key}: {e}")
+            return set()
+
+        finished = set()
+        for item, outcome in raw.items():
+            try:
+                status = json.loads(outcome).get("status")
+            except ValueError:
+                continue
+            if status in FINISHED_STATUSES:
+                finished.add(item.decode() if isinstance(item, bytes) else item)
+        if finished:
+            print(f"Retomando {self.key}: {len(finished)} itens já concluídos.")
+        return finished
+
+    def mark(self, items, status: str = "done", **details):
+        """Registra o desfecho de um ou mais itens."""
+        if self.ttl <= 0:
+            return
+        if isinstance(items, (str, int)):
+            items = [items]
+        outcome = json.dumps({"status": status, "at": int(time.time()), **details})
+        mapping = {str(item): outcome for item in items}
+        if not mapping:
+            return
+        try:
+            pipe = redis_client().pipeline()
+            pipe.hset(self.key, mapping=mapping)
+            pipe.expire(self.key, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"Redis indisponível ao gravar checkpoint {self.key}: {e}")
+
+    def clear(self):
+        """Execução concluída: a próxima começa do zero."""
+        if self.ttl <= 0:
+            return
+        try:
+            redis_client().delete(self.key)
+        except redis.RedisError as e:
+            print(f"Redis indisponível ao limpar checkpoint {self.key}: {e}")
@@ -1,5 +1,8 @@
+import threading
+import time
 import unicodedata
-from sqlalchemy import func
+
+from ..core.dependencies import get_settings
 from ..models.profissionais import Profissional
 
 
@@ -9,27 +12,97 @@ def _normalize(name: str) -> str:
     return "".join(c for c in nfkd if not unicodedata.combining(c)).lower().strip()
 
 
-def get_or_create_professional(session, nome_medico: str, sistema_origem) -> int:
+def _sistema_key(sistema_origem) -> str | None:
+    if sistema_origem is None:
+        return None
+    return str(getattr(sistema_origem, "value", sistema_origem)).upper()
+
+
+class ProfessionalResolver:
     """
-    Busca um profissional pelo nome. Retorna o ID se encontrar, None caso contrário.
-    Não cria novos profissionais automaticamente.
+    Índice em memória da tabela profissionais, compartilhado pelo processo.
+
+    Carrega a tabela uma vez e resolve nomes por dicionário: exato e sem
+    acentos, primeiro no mesmo sistema_origem e depois em qualquer sistema.
+    Nomes não encontrados também ficam em cache. O índice é recarregado após
+    PROFESSIONAL_INDEX_TTL segundos ou em invalidate().
     """
-    if not nome_medico:
-        return None
 
-    # Busca exata por nome_completo
-    profissional = session.query(Profissional).filter_by(
-        nome_completo=nome_medico,
-    ).first()
+    def __init__(self, ttl: int | None = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._exact: dict[tuple, int] = {}
+        self._normalized: dict[tuple, int] = {}
+        self._resolved: dict[tuple, int | None] = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _expired(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        ttl = self.ttl if self.ttl is not None else get_settings().professional_index_ttl
+        return ttl > 0 and time.monotonic() - self._loaded_at > ttl
+
+    def _load(self, session):
+        exact, normalized = {}, {}
+        rows = session.query(
+            Profissional.id, Profissional.nome_completo, Profissional.sistema_origem
+        ).order_by(Profissional.id)
+        for prof_id, nome, sistema in rows:
+            if not nome:
+                continue
+            sistema = _sistema_key(sistema)
+            nome_norm = _normalize(nome)
+            # setdefault: em nomes repetidos vence o menor id, como no .first() anterior.
+            for key in (sistema, None):
+                exact.setdefault((key, nome), prof_id)
+                normalized.setdefault((key, nome_norm), prof_id)
+
+        self._exact, self._normalized = exact, normalized
+        self._resolved = {}
+        self._loaded_at = time.monotonic()
 
-    if profissional:
-        return profissional.id
+    def resolve(self, session, nome_medico: str, sistema_origem=None) -> int | None:
+        if not nome_medico:
+            return None
+        sistema = _sistema_key(sistema_origem)
+        with self._lock:
+            if self._expired():
+                self._load(session)
 
-    # Busca aproximada: ignora acentos (ex: "Raissa" vs "Raíssa")
-    nome_norm = _normalize(nome_medico)
-    todos = session.query(Profissional).all()
-    for p in todos:
-        if _normalize(p.nome_completo) == nome_norm:
-            return p.id
+            key = (sistema, nome_medico)
+            if key in self._resolved:
+                return self._resolved[key]
 
-    return None
\ No newline at end of file
+            nome_norm = _normalize(nome_medico)
+            prof_id = None
+            for candidate in (sistema, None):
+                prof_id = self._exact.get((candidate, nome_medico)) or self._normalized.get(
+                    (candidate, nome_norm)
+                )
+                if prof_id:
+                    break
+            self._resolved[key] = prof_id
+            return prof_id
+
+
+_resolver = ProfessionalResolver()
+
+
+def invalidate_professionals():
+    """Força a recarga do índice (ex.: após cadastrar/importar profissionais)."""
+    _resolver.invalidate()
+
+
+def get_or_create_professional(session, nome_medico: str, sistema_origem) -> int:
+    """
+    Busca um profissional pelo nome. Retorna o ID se encontrar, None caso contrário.
+    Não cria novos profissionais automaticamente.
+
+    A busca é feita no índice em memória (ProfessionalResolver): a tabela só
+    é lida na primeira chamada do processo e a cada PROFESSIONAL_INDEX_TTL.
+    """
+    return _resolver.resolve(session, nome_medico, sistema_origem)
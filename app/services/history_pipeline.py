@@ -0,0 +1,129 @@
+"""
+Pipeline produtor/consumidor do seed de histórico.
+
+O thread do scraper (dono do Chrome) produz um item por paciente raspado e
+um HistoryWriter grava os itens em lotes, em outro thread e com a própria
+sessão do banco. A fila tem tamanho máximo: se o banco ficar para trás, o
+scraper espera em put() (backpressure) em vez de acumular memória; se o
+Chrome ficar para trás, o writer só espera na fila vazia.
+"""
+
+import queue
+import threading
+import time
+
+_CLOSE = object()
+
+
+class HistoryWriter(threading.Thread):
+    """
+    Consome itens da fila e chama `write(items) -> bool` a cada `batch_size`
+    itens, quando o item mais antigo já esperou `max_delay` segundos ou no
+    close(). `write` roda sempre neste thread.
+    """
+
+    def __init__(self, write, depth: int, batch_size: int, max_delay: float = 30.0):
+        super().__init__(name="history-writer", daemon=True)
+        self._write = write
+        self._queue = queue.Queue(maxsize=depth)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.counters = {
+            "produced": 0,
+            "producer_wait_s": 0.0,
+            "written": 0,
+            "write_batches": 0,
+            "write_failures": 0,
+            "write_s": 0.0,
+            "writer_idle_s": 0.0,
+        }
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        super().start()
+
+    def put(self, item):
+        """Entrega um item ao writer; bloqueia enquanto a fila estiver cheia."""
+        if not self.is_alive():
+            raise RuntimeError("history writer is not running")
+        start = time.perf_counter()
+        self._queue.put(item)
+        self.counters["producer_wait_s"] += time.perf_counter() - start
+        self.counters["produced"] += 1
+
+    def close(self) -> dict:
+        """Grava o que restou, encerra o thread e devolve os contadores."""
+        if self.is_alive():
+            self._queue.put(_CLOSE)
+            self.join()
+        self.counters["elapsed_s"] = time.perf_counter() - (self._started_at or time.perf_counter())
+        self.report()
+        return self.counters
+
+    def _flush(self, items: list):
+        if not items:
+            return
+        start = time.perf_counter()
+        try:
+            ok = self._write(items)
+        except Exception as e:
+            print(f"[pipeline] Erro gravando lote de {len(items)} pacientes: {e}")
+            ok = False
+        self.counters["write_s"] += time.perf_counter() - start
+        self.counters["write_batches"] += 1
+        if ok:
+            self.counters["written"] += len(items)
+        else:
+            self.counters["write_failures"] += 1
+
+    def run(self):
+        items = []
+        oldest = None
+        while True:
+            timeout = None
+            if items:
+                timeout = max(0.0, oldest + self.max_delay - time.perf_counter())
+
+            start = time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            self.counters["writer_idle_s"] += time.perf_counter() - start
+
+            if item is _CLOSE:
+                self._flush(items)
+                return
+            if item is not None:
+                if not items:
+                    oldest = time.perf_counter()
+                items.append(item)
+            if len(items) >= self.batch_size or (
+                items and time.perf_counter() - oldest >= self.max_delay
+            ):
+                self._flush(items)
+                items = []
+
+    def report(self):
+        c = self.counters
+        elapsed = c.get("elapsed_s") or 0.0
+        scrape_s = elapsed - c["producer_wait_s"]
+        print(
+            f"[pipeline] scraper: {c['produced']} pacientes em {scrape_s:.1f}s"
+            f" ({c['produced'] / scrape_s if scrape_s > 0 else 0:.2f}/s),"
+            f" {c['producer_wait_s']:.1f}s esperando a fila cheia"
+        )
+        print(
+            f"[pipeline] writer: {c['written']} pacientes em {c['write_batches']} lotes,"
+            f" {c['write_s']:.1f}s gravando"
+            f" ({c['written'] / c['write_s'] if c['write_s'] > 0 else 0:.1f}/s),"
+            f" {c['writer_idle_s']:.1f}s esperando o scraper,"
+            f" {c['write_failures']} lotes com erro"
+        )
+
+
+def merge_counters(target: dict, counters: dict):
+    """Soma os contadores de um pipeline em `target` (ex.: vários sistemas)."""
+    for key, value in counters.items():
+        target[key] = target.get(key, 0) + value
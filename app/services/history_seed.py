@@ -1,16 +1,615 @@
-from datetime import datetime
+import gc
+import hashlib
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, literal_column, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.core.database import get_session
+from app.core.dependencies import get_settings
+from app.core.memory import current_rss_mb, peak_rss_mb
+from app.core.tracing import export_histograms, start_span
 from app.models.agendamento import Agendamento
 from app.models.dados_cliente import DadosCliente
 from app.models.enums import SistemaOrigem
 from app.scraper.patient_history_scraper import PatientHistoryScraper
+from app.services.checkpoints import CheckpointStore
 from app.services.doctor_service import get_or_create_professional
+from app.services.history_pipeline import HistoryWriter, merge_counters
+from app.services.prioritizer import get_prioritizer
+from app.services.scrape_stats import (
+    ensure_scrape_stats_table,
+    load_scrape_stats,
+    record_scrapes,
+    recently_scraped,
+    scrape_entry,
+)
+
+
+# Pacientes cujas linhas são gravadas juntas (uma consulta de chaves + upsert).
+HISTORY_WRITE_BATCH = 100
+# Linhas por INSERT multi-valores (limite de parâmetros do Postgres: 65535).
+UPSERT_CHUNK = 1000
+AGENDAMENTO_UNIQUE_KEY = ["codigo", "sistema_origem", "data_consulta", "hora_consulta"]
+# Falhas seguidas com o Chrome sem responder que interrompem o seed. Paciente
+# não encontrado ou timeout de um paciente com o Chrome vivo não contam.
+MAX_CONSECUTIVE_FAILURES = 10
+
+
+class ScraperUnavailableError(Exception):
+    """O Chrome parou de responder; o lote em curso não deve receber ack."""
+
+
+class HistoryWriteError(Exception):
+    """Um lote de histórico não foi gravado; o lote da fila não deve receber ack."""
+
+
+def _parse_history_time(hora_str: str):
+    hora_str_clean = hora_str.strip()
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(hora_str_clean, fmt).time()
+        except ValueError:
+            continue
+
+    # Fallback: take the first two parts if there are more than 2
+    parts = hora_str_clean.split(":")
+    if len(parts) >= 2:
+        try:
+            return datetime.strptime(f"{parts[0]:0>2}:{parts[1]:0>2}", "%H:%M").time()
+        except ValueError:
+            pass
+    return None
+
+
+def parse_history_appointment(apt_data: dict) -> tuple | None:
+    """
+    Converte um item do scraper ({'data_atendimento': 'dd/mm/aaaa', 'hora': 'HH:MM',
+    'retorno_ate': ...}) em (data_consulta, hora_consulta, retorno_ate).
+    Retorna None se data ou hora não puderem ser lidas.
+    """
+    dta_str = apt_data.get("data_atendimento")
+    hora_str = apt_data.get("hora")
+    if not dta_str or not hora_str:
+        return None
+
+    try:
+        data_consulta = datetime.strptime(dta_str, "%d/%m/%Y").date()
+        hora_consulta = _parse_history_time(hora_str)
+    except Exception as e:
+        print(f"!!! [DEBUG-FIX] Date/Time error for {dta_str} {hora_str}: {e}")
+        return None
+    if not hora_consulta:
+        print(f"!!! [DEBUG-FIX] Could not parse time '{hora_str}' for date {dta_str}")
+        return None
+
+    retorno_ate = None
+    ret_str = apt_data.get("retorno_ate")
+    if ret_str:
+        try:
+            retorno_ate = datetime.strptime(ret_str, "%d/%m/%Y").date()
+        except ValueError:
+            pass
+    return data_consulta, hora_consulta, retorno_ate
+
+
+def upsert_history_rows(session, rows: list[dict]) -> tuple[int, int]:
+    """
+    Grava as linhas de histórico de um lote de pacientes com poucas idas ao banco.
+
+    Carrega numa consulta as linhas já gravadas com a chave única de
+    agendamentos (AGENDAMENTO_UNIQUE_KEY), deduplica em memória, insere as
+    novas com INSERT multi-valores ... ON CONFLICT DO UPDATE nessa mesma
+    chave e atualiza em lote o retorno_ate das existentes que mudaram.
+    Retorna (inseridas, existentes); no Postgres, uma linha inserida por
+    outro processo entre a consulta e o INSERT conta como existente.
+    """
+    if not rows:
+        return 0, 0
+
+    unique = {}
+    for row in rows:
+        unique[tuple(row[column] for column in AGENDAMENTO_UNIQUE_KEY)] = row
+
+    existing = {
+        (codigo, sistema_origem, data_consulta, hora_consulta): (apt_id, retorno_ate)
+        for apt_id, codigo, sistema_origem, data_consulta, hora_consulta, retorno_ate in session.query(
+            Agendamento.id,
+            Agendamento.codigo,
+            Agendamento.sistema_origem,
+            Agendamento.data_consulta,
+            Agendamento.hora_consulta,
+            Agendamento.retorno_ate,
+        ).filter(
+            Agendamento.codigo.in_({key[0] for key in unique}),
+            Agendamento.sistema_origem.in_({key[1] for key in unique}),
+            Agendamento.data_consulta >= min(key[2] for key in unique),
+        )
+    }
+
+    new_rows = [row for key, row in unique.items() if key not in existing]
+    updates = [
+        {"id": existing[key][0], "retorno_ate": row["retorno_ate"]}
+        for key, row in unique.items()
+        if key in existing and row["retorno_ate"] and row["retorno_ate"] != existing[key][1]
+    ]
+
+    dialect = session.get_bind().dialect.name
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+    added = len(new_rows)
+    for start in range(0, len(new_rows), UPSERT_CHUNK):
+        chunk = new_rows[start : start + UPSERT_CHUNK]
+        if dialect_insert:
+            # Linhas já gravadas por outra fonte (ex.: próximos agendamentos)
+            # com a mesma chave só têm o retorno_ate atualizado.
+            stmt = dialect_insert(Agendamento).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=AGENDAMENTO_UNIQUE_KEY,
+                set_={"retorno_ate": stmt.excluded.retorno_ate},
+            )
+            if dialect == "postgresql":
+                # xmax = 0 só nas linhas inseridas; as demais bateram no ON CONFLICT.
+                stmt = stmt.returning(literal_column("xmax = 0"))
+                added -= sum(1 for (inserted,) in session.execute(stmt) if not inserted)
+                continue
+        else:
+            stmt = insert(Agendamento).values(chunk)
+        session.execute(stmt)
+
+    if updates:
+        session.execute(update(Agendamento), updates)
+    session.commit()
+    return added, len(rows) - added
 
 
 class AppointmentHistoryService:
     def __init__(self):
         self.scraper = PatientHistoryScraper()
+        self._consecutive_failures = 0
+
+    @staticmethod
+    def _seed_session():
+        """
+        Sessão do seed. Os lotes são commitados no meio da página de pacientes
+        carregada; sem expirar no commit, ler codigo/cpf do paciente seguinte
+        não vira um SELECT por paciente.
+        """
+        return get_session(expire_on_commit=False)
+
+    @staticmethod
+    def _recently_seen(session, patient_ids, days_threshold: int) -> set[int]:
+        """
+        IDs dos pacientes com atendimento gravado nos últimos `days_threshold`
+        dias, em uma única consulta (GROUP BY paciente_id HAVING max >= corte).
+        `patient_ids` pode ser uma lista ou um subselect de ids.
+        """
+        cutoff = date.today() - timedelta(days=days_threshold)
+        rows = (
+            session.query(Agendamento.paciente_id)
+            .filter(Agendamento.paciente_id.in_(patient_ids))
+            .group_by(Agendamento.paciente_id)
+            .having(func.max(Agendamento.data_consulta) >= cutoff)
+            .all()
+        )
+        return {paciente_id for (paciente_id,) in rows}
+
+    @staticmethod
+    def _history_watermarks(session, patients) -> dict[int, date]:
+        """
+        Última data_consulta de histórico gravada de cada paciente do lote, em
+        uma consulta. Só contam atendimentos passados com status "Realizado"
+        (os do seed): os agendamentos futuros gravados pela sincronização de
+        próximos agendamentos não viram watermark.
+        """
+        ids = [p.id for p in patients]
+        if not ids:
+            return {}
+        rows = (
+            session.query(Agendamento.paciente_id, func.max(Agendamento.data_consulta))
+            .filter(
+                Agendamento.paciente_id.in_(ids),
+                Agendamento.data_consulta <= date.today(),
+                Agendamento.status == "Realizado",
+            )
+            .group_by(Agendamento.paciente_id)
+            .all()
+        )
+        return dict(rows)
+
+    @staticmethod
+    def _history_rows(session, patient, appointments: list[dict], sistema_enum) -> list[dict]:
+        """Linhas de agendamentos (dicts de colunas) a partir do histórico raspado."""
+        rows = []
+        for apt_data in appointments:
+            parsed = parse_history_appointment(apt_data)
+            if not parsed:
+                continue
+            data_consulta, hora_consulta, retorno_ate = parsed
+
+            prof_name = apt_data.get("profissional")
+            # TODO: baixar médicos por relatório cadastro de profissionais e relacionar aqui
+            prof_id = get_or_create_professional(session, prof_name, sistema_enum)
+
+            rows.append(
+                {
+                    "paciente_id": patient.id,
+                    "profissional_id": prof_id,
+                    "codigo": patient.codigo,
+                    "sistema_origem": sistema_enum.value,  # Convert enum to string
+                    # Denormalized fields from Patient (with defaults for NOT NULL columns)
+                    "cpf": patient.cpf or "",
+                    "telefone": patient.cad_telefone or patient.telefone or "",
+                    "nome_paciente": patient.nomewpp or "",
+                    "data_nascimento": patient.data_nascimento
+                    or datetime(1900, 1, 1).date(),  # sentinel date
+                    "profissional": prof_name or "",
+                    "especialidade": "",
+                    # Scraped fields
+                    "data_consulta": data_consulta,
+                    "hora_consulta": hora_consulta,
+                    "procedimento": apt_data.get("tipo"),  # Mapping 'tipo' to 'procedimento'
+                    "status": "Realizado",  # Assumption for history items
+                    "observacoes": f"Scraped type: {apt_data.get('tipo')}",
+                    "retorno_ate": retorno_ate,
+                }
+            )
+        return rows
+
+    @staticmethod
+    def _flush_history_rows(
+        session, rows: list[dict], stats: dict, scrapes: list[dict] = (), dobs: list[dict] = ()
+    ) -> bool:
+        """
+        Grava o lote pendente (datas de nascimento raspadas e metadados de
+        raspagem inclusos) num só commit.
+        """
+        try:
+            if dobs:
+                session.execute(update(DadosCliente), list(dobs))
+            record_scrapes(session, scrapes)
+            added, existing = upsert_history_rows(session, rows)
+            if not rows:
+                session.commit()
+            stats["appointments_added"] += added
+            stats["appointments_skipped_existing"] += existing
+            return True
+        except Exception as e:
+            print(f"Error writing history batch ({len(rows)} rows): {e}")
+            session.rollback()
+            stats["errors"] += 1
+            return False
+
+    def _flush_items(self, session, items: list[tuple], stats: dict, checkpoint) -> bool:
+        """Grava itens (paciente_id, linhas, data_nascimento, raspagem) de _scrape_histories."""
+        rows = [row for _, patient_rows, _, _ in items for row in patient_rows or ()]
+        dobs = [{"id": pid, "data_nascimento": dob} for pid, _, dob, _ in items if dob]
+        scrapes = [scrape for _, _, _, scrape in items]
+        written = self._flush_history_rows(session, rows, stats, scrapes, dobs)
+        if written and checkpoint:
+            checkpoint.mark([pid for pid, patient_rows, _, _ in items if patient_rows is not None])
+        return written
+
+    def _prefetch_histories(
+        self,
+        patients,
+        tabs: int,
+        watermarks: dict[int, date],
+        deadline: float | None = None,
+        heartbeat=None,
+    ) -> dict[str, dict]:
+        """
+        Busca em `tabs` abas os históricos do próximo lote de pacientes. Os
+        não iniciados até `deadline` ficam de fora do resultado.
+        """
+        if not patients:
+            return {}
+        return self.scraper.get_patient_histories(
+            [str(p.codigo) for p in patients],
+            search_type="codigo",
+            tabs=tabs,
+            stop_at={str(p.codigo): watermarks.get(p.id) for p in patients},
+            deadline=deadline,
+            heartbeat=heartbeat,
+        )
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {
+            "total_patients_processed": 0,
+            "appointments_added": 0,
+            "appointments_skipped_existing": 0,
+            "patients_skipped_has_recent": 0,
+            "patients_skipped_recently_scraped": 0,
+            "patients_incremental": 0,
+            "patients_resumed": 0,
+            "patients_deferred": 0,
+            "patients_not_found": 0,
+            "session_recycles": 0,
+            "errors": 0,
+        }
+
+    @staticmethod
+    def _scraped_birth_date(patient, result: dict) -> date | None:
+        """Data de nascimento raspada, se o paciente ainda não tiver uma."""
+        scraped_info = result.get("patient_info") or {}
+        dob_str = scraped_info.get("data_nascimento")
+        if not dob_str or patient.data_nascimento:
+            return None
+        try:
+            dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
+        except ValueError:
+            print(f"Could not parse data_nascimento '{dob_str}' for patient {patient.codigo}")
+            return None
+        print(f"Updated data_nascimento for patient {patient.codigo}: {dob}")
+        return dob
+
+    @staticmethod
+    def _load_patients(session, patient_ids: list[int]) -> list:
+        """Pacientes de `patient_ids`, na mesma ordem."""
+        by_id = {
+            p.id: p
+            for p in session.query(DadosCliente).filter(DadosCliente.id.in_(patient_ids))
+        }
+        return [by_id[pid] for pid in patient_ids if pid in by_id]
+
+    @staticmethod
+    def _release_session(session, stats: dict):
+        """
+        Esvazia o identity map entre páginas de pacientes. Acima de
+        HISTORY_MAX_RSS_MB também fecha a sessão (conexão e transação) e roda
+        o coletor de lixo; a sessão volta a abrir sozinha na próxima consulta.
+        """
+        session.expunge_all()
+        limit = get_settings().history_max_rss_mb
+        rss = current_rss_mb()
+        if limit and rss > limit:
+            print(f"RSS {rss:.0f} MB above HISTORY_MAX_RSS_MB={limit}, recycling session.")
+            session.close()
+            gc.collect()
+            stats["session_recycles"] += 1
+
+    def _scrape_histories(
+        self,
+        session,
+        patient_ids: list[int],
+        sistema_enum,
+        stats: dict,
+        tabs: int,
+        incremental: bool,
+        checkpoint: CheckpointStore | None = None,
+        deadline: float | None = None,
+        heartbeat=None,
+    ):
+        """
+        Raspa os históricos de `patient_ids` e produz (paciente_id, linhas,
+        data_nascimento nova ou None, entrada de historico_raspagens) para
+        cada um; linhas é None quando a raspagem falhou.
+
+        Os pacientes são carregados em páginas de HISTORY_PAGE_SIZE e a sessão
+        é esvaziada ao fim de cada página, então a memória não cresce com o
+        tamanho do sistema. Nenhum paciente novo é iniciado depois de
+        `deadline` (time.time()). `heartbeat` é chamado antes de cada
+        paciente. Depois de MAX_CONSECUTIVE_FAILURES falhas seguidas com o
+        Chrome sem sessão levanta ScraperUnavailableError.
+        """
+        sistema_str = sistema_enum.value
+        page_size = max(1, get_settings().history_page_size)
+        for start in range(0, len(patient_ids), page_size):
+            page = self._load_patients(session, patient_ids[start : start + page_size])
+            watermarks = self._history_watermarks(session, page) if incremental else {}
+            prefetched = {}
+            for index, patient in enumerate(page):
+                if deadline and time.time() >= deadline:
+                    left = len(patient_ids) - start - index
+                    stats["patients_deferred"] += left
+                    print(f"Time budget reached: {left} patients left for the next run.")
+                    return
+                if heartbeat:
+                    heartbeat()
+                patient_span = start_span(
+                    "seed_history", root=True, codigo=patient.codigo, sistema=sistema_str
+                )
+                try:
+                    stats["total_patients_processed"] += 1
+                    stop_at = watermarks.get(patient.id)
+                    if stop_at:
+                        stats["patients_incremental"] += 1
+                    print(
+                        f"Scraping history for patient {patient.codigo} (ID: {patient.id}, since {stop_at or 'start'})..."
+                    )
+
+                    if tabs > 1 and str(patient.codigo) not in prefetched:
+                        prefetched.update(
+                            self._prefetch_histories(
+                                page[index : index + tabs * 4],
+                                tabs,
+                                watermarks,
+                                deadline,
+                                heartbeat,
+                            )
+                        )
+
+                    started = time.perf_counter()
+                    result = prefetched.pop(str(patient.codigo), None)
+                    if result is None:
+                        result = self.scraper.get_patient_history(
+                            str(patient.codigo),
+                            search_type="codigo",
+                            stop_at=stop_at,
+                            need_birth_date=not patient.data_nascimento,
+                        )
+                        result.setdefault("duration", time.perf_counter() - started)
+
+                    if result.get("status") == "not_found":
+                        print(f"Patient {patient.codigo} not found in {sistema_str}.")
+                        stats["patients_not_found"] += 1
+                        if checkpoint:
+                            checkpoint.mark(patient.id, "not_found")
+                        rows = dob = None
+                    elif result.get("status") != "success":
+                        print(
+                            f"Failed to scrape history for patient {patient.codigo}: {result.get('message')}"
+                        )
+                        stats["errors"] += 1
+                        if checkpoint:
+                            checkpoint.mark(patient.id, "error", message=str(result.get("message")))
+                        rows = dob = None
+                    else:
+                        # Update birth date if missing and scraper returned one
+                        dob = self._scraped_birth_date(patient, result)
+                        if dob:
+                            # Não suja a sessão: a data é gravada junto com o lote.
+                            set_committed_value(patient, "data_nascimento", dob)
+                        rows = self._history_rows(
+                            session, patient, result.get("appointments", []), sistema_enum
+                        )
+
+                except Exception as e:
+                    print(f"Error processing patient {patient.codigo}: {e}")
+                    session.rollback()
+                    stats["errors"] += 1
+                    if checkpoint:
+                        checkpoint.mark(patient.id, "error", message=str(e))
+                    result = {"status": "error", "message": str(e)}
+                    rows = dob = None
+                finally:
+                    patient_span.finish()
+
+                if result.get("status") in ("success", "not_found"):
+                    self._consecutive_failures = 0
+                elif not self.scraper.is_session_alive():
+                    self._consecutive_failures += 1
+                rows_count = len(rows) if rows is not None else None
+                yield patient.id, rows, dob, scrape_entry(patient, sistema_str, result, rows_count)
+                if self._consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    raise ScraperUnavailableError(
+                        f"{self._consecutive_failures} falhas seguidas com o Chrome sem sessão"
+                    )
+
+            del page, prefetched
+            self._release_session(session, stats)
+
+    def _write_pipelined(
+        self,
+        scraped,
+        stats: dict,
+        checkpoint: CheckpointStore | None,
+        depth: int,
+    ) -> bool:
+        """
+        Consome `scraped` gravando num HistoryWriter (outro thread, outra
+        sessão): o Chrome segue raspando enquanto o lote anterior é gravado.
+        Retorna False se algum lote não foi gravado.
+        """
+        writer_session = get_session()
+        writer_stats = self._empty_stats()
+        writer = HistoryWriter(
+            lambda items: self._flush_items(writer_session, items, writer_stats, checkpoint),
+            depth=depth,
+            batch_size=HISTORY_WRITE_BATCH,
+        )
+        writer.start()
+        try:
+            for item in scraped:
+                writer.put(item)
+        finally:
+            counters = writer.close()
+            merge_counters(stats.setdefault("pipeline", {}), counters)
+            writer_session.close()
+            for key in ("appointments_added", "appointments_skipped_existing", "errors"):
+                stats[key] += writer_stats[key]
+        return counters["write_failures"] == 0
+
+    def _seed_patients(
+        self,
+        session,
+        query,
+        sistema_enum,
+        stats: dict,
+        skip_if_has_recent_history: bool,
+        days_threshold: int,
+        tabs: int,
+        incremental: bool,
+        checkpoint: CheckpointStore | None = None,
+        pipeline_depth: int = 0,
+        deadline: float | None = None,
+        heartbeat=None,
+    ) -> bool:
+        """
+        Raspa e grava o histórico dos pacientes de `query` (um único sistema),
+        na ordem do prioritizer. Só os ids são carregados de uma vez; os
+        pacientes vêm em páginas (ver _scrape_histories). Com `checkpoint`,
+        pula os pacientes já gravados por uma execução interrompida e marca
+        cada lote assim que ele é gravado. Com `pipeline_depth` > 0 a gravação
+        roda em paralelo à raspagem. Retorna False se algum lote de linhas
+        não foi gravado.
+        """
+        sistema_str = sistema_enum.value
+        patient_ids = [pid for (pid,) in query.with_entities(DadosCliente.id)]
+
+        print(f"Found {len(patient_ids)} patients to process in {sistema_str}.")
+
+        if checkpoint:
+            finished = checkpoint.finished()
+            if finished:
+                remaining = [pid for pid in patient_ids if str(pid) not in finished]
+                stats["patients_resumed"] += len(patient_ids) - len(remaining)
+                patient_ids = remaining
+
+        if skip_if_has_recent_history:
+            recent = self._recently_seen(
+                session, query.with_entities(DadosCliente.id).scalar_subquery(), days_threshold
+            )
+            # `recent` cobre a consulta toda; só conta quem ainda estava na lista
+            # (os já retomados do checkpoint contam em patients_resumed).
+            remaining = [pid for pid in patient_ids if pid not in recent]
+            skipped = len(patient_ids) - len(remaining)
+            patient_ids = remaining
+            stats["patients_skipped_has_recent"] += skipped
+            print(
+                f"Skipping {skipped} patients with history in the last {days_threshold} days."
+            )
+
+        rescrape_hours = get_settings().history_rescrape_hours
+        recent_scrapes = recently_scraped(load_scrape_stats(session, patient_ids), rescrape_hours)
+        if recent_scrapes:
+            patient_ids = [pid for pid in patient_ids if pid not in recent_scrapes]
+            stats["patients_skipped_recently_scraped"] += len(recent_scrapes)
+            print(
+                f"Skipping {len(recent_scrapes)} patients scraped in the last {rescrape_hours}h."
+            )
+
+        patient_ids = get_prioritizer().order(session, patient_ids)
+        session.expunge_all()
+
+        scraped = self._scrape_histories(
+            session,
+            patient_ids,
+            sistema_enum,
+            stats,
+            tabs,
+            incremental,
+            checkpoint,
+            deadline,
+            heartbeat,
+        )
+        if pipeline_depth > 0:
+            return self._write_pipelined(scraped, stats, checkpoint, pipeline_depth)
+
+        pending = []
+        written = True
+        try:
+            for item in scraped:
+                pending.append(item)
+                if len(pending) >= HISTORY_WRITE_BATCH:
+                    written = self._flush_items(session, pending, stats, checkpoint) and written
+                    pending = []
+        finally:
+            # Grava o que já foi raspado mesmo se o Chrome morreu no meio.
+            written = self._flush_items(session, pending, stats, checkpoint) and written
+        return written
 
     def seed_history(
         self,
@@ -19,6 +618,12 @@ class AppointmentHistoryService:
         sistema_filter: str | None = None,
         skip_if_has_recent_history: bool = True,
         days_threshold: int = 30,
+        tabs: int | None = None,
+        incremental: bool = True,
+        checkpoint_job: str | None = None,
+        pipeline_depth: int | None = None,
+        patient_ids: list[int] | None = None,
+        deadline: float | None = None,
     ) -> dict:
         """
         Seeds appointment history from the scraper.
@@ -29,21 +634,35 @@ class AppointmentHistoryService:
             sistema_filter: Filter by system ('ouro', 'of', or None for both)
             skip_if_has_recent_history: If True, skip patients who already have a recent appointment in DB
             days_threshold: Number of days to consider as "recent" (default: 7)
+            tabs: Chrome tabs used to fetch histories concurrently (default: HISTORY_TABS)
+            incremental: If True, stop each history at the first page older than the
+                latest appointment already stored for the patient
+            checkpoint_job: Checkpoint name for resuming an interrupted run
+                (default: derived from offset/limit, so a retry with the same chunk resumes)
+            pipeline_depth: Scraped patients queued for a separate writer thread
+                (default: HISTORY_PIPELINE_DEPTH; 0 = write in the scraping thread)
+            patient_ids: Explicit patients to process (replaces offset/limit)
+            deadline: Unix time after which no new patient is started; patients are
+                processed in priority order (HISTORY_PRIORITY), so the budget goes
+                to the most valuable ones
         """
+        tabs = tabs or get_settings().history_tabs
+        if pipeline_depth is None:
+            pipeline_depth = get_settings().history_pipeline_depth
+        if not checkpoint_job and patient_ids is not None:
+            digest = hashlib.sha1(",".join(map(str, patient_ids)).encode()).hexdigest()[:12]
+            checkpoint_job = f"history:ids:{digest}"
+        checkpoint_job = checkpoint_job or f"history:{offset}:{limit or 'all'}"
+        checkpoints = []
         print(
             f"Starting appointment history seed process (offset={offset}, limit={limit}, sistema={sistema_filter or 'all'}, skip_recent={skip_if_has_recent_history}, days={days_threshold})..."
         )
 
-        session = get_session()
-        stats = {
-            "total_patients_processed": 0,
-            "appointments_added": 0,
-            "appointments_skipped_existing": 0,
-            "patients_skipped_has_recent": 0,
-            "errors": 0,
-        }
+        session = self._seed_session()
+        stats = self._empty_stats()
 
         try:
+            ensure_scrape_stats_table(session)
             # Filter systems based on parameter
             if sistema_filter:
                 sistema_filter = sistema_filter.lower()
@@ -72,214 +691,120 @@ class AppointmentHistoryService:
                     .order_by(DadosCliente.id)
                 )  # Consistent ordering for offset
 
-                if offset > 0:
-                    query = query.offset(offset)
-                if limit is not None:
-                    query = query.limit(limit)
-
-                patients = query.all()
-
-                print(
-                    f"Found {len(patients)} patients to process in {sistema_str} (offset={offset}, limit={limit})."
+                if patient_ids is not None:
+                    query = query.filter(DadosCliente.id.in_(patient_ids))
+                else:
+                    if offset > 0:
+                        query = query.offset(offset)
+                    if limit is not None:
+                        query = query.limit(limit)
+
+                checkpoint = CheckpointStore(checkpoint_job, sistema_str)
+                checkpoints.append(checkpoint)
+                self._seed_patients(
+                    session,
+                    query,
+                    sistema_enum,
+                    stats,
+                    skip_if_has_recent_history,
+                    days_threshold,
+                    tabs,
+                    incremental,
+                    checkpoint,
+                    pipeline_depth,
+                    deadline,
                 )
 
-                for patient in patients:
-                    try:
-                        if skip_if_has_recent_history:
-                            from datetime import date, timedelta
-
-                            cutoff = date.today() - timedelta(days=days_threshold)
-                            recent = (
-                                session.query(Agendamento)
-                                .filter(
-                                    Agendamento.paciente_id == patient.id,
-                                    Agendamento.data_consulta >= cutoff,
-                                )
-                                .first()
-                            )
-                            if recent:
-                                stats["patients_skipped_has_recent"] += 1
-                                continue
-
-                        stats["total_patients_processed"] += 1
-                        print(
-                            f"Scraping history for patient {patient.codigo} (ID: {patient.id})..."
-                        )
-
-                        result = self.scraper.get_patient_history(
-                            str(patient.codigo), search_type="codigo"
-                        )
-
-                        if result.get("status") != "success":
-                            print(
-                                f"Failed to scrape history for patient {patient.codigo}: {result.get('message')}"
-                            )
-                            stats["errors"] += 1
-                            continue
-
-                        # Update birth date if missing and scraper returned one
-                        scraped_info = result.get("patient_info") or {}
-                        dob_str = scraped_info.get("data_nascimento")
-                        if dob_str and not patient.data_nascimento:
-                            try:
-                                patient.data_nascimento = datetime.strptime(
-                                    dob_str, "%d/%m/%Y"
-                                ).date()
-                                print(
-                                    f"Updated data_nascimento for patient {patient.codigo}: {patient.data_nascimento}"
-                                )
-                            except ValueError:
-                                print(
-                                    f"Could not parse data_nascimento '{dob_str}' for patient {patient.codigo}"
-                                )
-
-                        appointments = result.get("appointments", [])
-
-                        for apt_data in appointments:
-                            # Extract data from scraped dict
-                            # Format: {'profissional': '...', 'data_atendimento': 'dd/mm/aaaa', 'hora': 'HH:MM', 'tipo': '...', 'retorno_ate': '...'}
-
-                            dta_str = apt_data.get("data_atendimento")
-                            hora_str = apt_data.get("hora")
-
-                            if not dta_str or not hora_str:
-                                continue
-
-                            try:
-                                data_consulta = datetime.strptime(
-                                    dta_str, "%d/%m/%Y"
-                                ).date()
-
-                                # Robust Time Parsing
-                                if not hora_str:
-                                    continue
-
-                                hora_str_clean = hora_str.strip()
-                                time_formats = ["%H:%M:%S", "%H:%M"]
-                                hora_consulta = None
-
-                                for fmt in time_formats:
-                                    try:
-                                        hora_consulta = datetime.strptime(
-                                            hora_str_clean, fmt
-                                        ).time()
-                                        break
-                                    except ValueError:
-                                        continue
-
-                                if not hora_consulta:
-                                    # Fallback: take the first two parts if there are more than 2
-                                    parts = hora_str_clean.split(":")
-                                    if len(parts) >= 2:
-                                        try:
-                                            fake_hora = f"{parts[0]:0>2}:{parts[1]:0>2}"
-                                            hora_consulta = datetime.strptime(
-                                                fake_hora, "%H:%M"
-                                            ).time()
-                                        except:
-                                            pass
-
-                                if not hora_consulta:
-                                    print(
-                                        f"!!! [DEBUG-FIX] Could not parse time '{hora_str}' for date {dta_str}"
-                                    )
-                                    continue
-
-                            except Exception as e:
-                                print(
-                                    f"!!! [DEBUG-FIX] Date/Time error for {dta_str} {hora_str}: {e}"
-                                )
-                                continue
-
-                            prof_name = apt_data.get("profissional")
-                            # TODO: baixar médicos por relatório cadastro de profissionais e relacionar aqui
-                            prof_id = get_or_create_professional(
-                                session, prof_name, sistema_enum
-                            )
-
-                            # Check for duplicates based on client, date, time
-                            exists = (
-                                session.query(Agendamento)
-                                .filter_by(
-                                    paciente_id=patient.id,
-                                    data_consulta=data_consulta,
-                                    hora_consulta=hora_consulta,
-                                )
-                                .first()
-                            )
-
-                            if exists:
-                                # Update? Maybe update retorno_ate if changed?
-                                # For now, just skip or maybe update fields that might change.
-                                # Let's update retorno_ate just in case
-                                ret_str = apt_data.get("retorno_ate")
-                                if ret_str:
-                                    try:
-                                        exists.retorno_ate = datetime.strptime(
-                                            ret_str, "%d/%m/%Y"
-                                        ).date()
-                                    except:
-                                        pass
-                                stats["appointments_skipped_existing"] += 1
-                                continue
-
-                            # Create new appointment
-                            new_apt = Agendamento(
-                                paciente_id=patient.id,
-                                profissional_id=prof_id,
-                                sistema_origem=sistema_enum.value,  # Convert enum to string
-                                # Denormalized fields from Patient (with defaults for NOT NULL columns)
-                                cpf=patient.cpf or "",  # NOT NULL
-                                telefone=patient.cad_telefone
-                                or patient.telefone
-                                or "",  # NOT NULL
-                                nome_paciente=patient.nomewpp or "",  # NOT NULL
-                                data_nascimento=patient.data_nascimento
-                                or datetime(
-                                    1900, 1, 1
-                                ).date(),  # NOT NULL - sentinel date
-                                profissional=prof_name or "",  # NOT NULL
-                                especialidade="",  # NOT NULL
-                                # Scraped fields
-                                data_consulta=data_consulta,  # NOT NULL
-                                hora_consulta=hora_consulta,  # NOT NULL
-                                # profissional=apt_data.get("profissional"),
-                                procedimento=apt_data.get(
-                                    "tipo"
-                                ),  # Mapping 'tipo' to 'procedimento'
-                                status="Realizado",  # Assumption for history items
-                                observacoes=f"Scraped type: {apt_data.get('tipo')}",
-                            )
+            # Execução completa: a próxima começa do zero.
+            for checkpoint in checkpoints:
+                checkpoint.clear()
+            stats["peak_rss_mb"] = round(peak_rss_mb(), 1)
+            print(f"Peak RSS: {stats['peak_rss_mb']} MB")
+            return {"status": "success", "stats": stats}
 
-                            # Handle retorno_ate
-                            ret_str = apt_data.get("retorno_ate")
-                            if ret_str:
-                                try:
-                                    new_apt.retorno_ate = datetime.strptime(
-                                        ret_str, "%d/%m/%Y"
-                                    ).date()
-                                except:
-                                    pass
+        except Exception as e:
+            session.rollback()
+            print(f"Critical error in seed_history: {e}")
+            return {"status": "error", "message": str(e)}
+        finally:
+            session.close()
+            self.scraper.quit()
+            export_histograms()
 
-                            session.add(new_apt)
-                            stats["appointments_added"] += 1
+    def seed_history_from_queue(
+        self,
+        work_queue,
+        worker: str,
+        skip_if_has_recent_history: bool = True,
+        days_threshold: int = 30,
+        tabs: int | None = None,
+        incremental: bool = True,
+        pipeline_depth: int | None = None,
+    ) -> dict:
+        """
+        Processa lotes de pacientes puxados de `work_queue` (ver
+        app.services.work_queue) até a fila esvaziar, com um único Chrome.
+        O ack de cada lote só é dado depois que ele foi gravado; se o processo
+        morrer no meio, o lote volta para a fila. Com o Chrome morto
+        (ScraperUnavailableError) ou uma gravação que falhou
+        (HistoryWriteError) o worker para sem ack nem novos lotes, e o
+        run_parallel devolve o lote à fila.
+        """
+        tabs = tabs or get_settings().history_tabs
+        if pipeline_depth is None:
+            pipeline_depth = get_settings().history_pipeline_depth
+        session = self._seed_session()
+        stats = self._empty_stats()
+        stats["batches"] = 0
 
-                        session.commit()  # Commit per patient or batch? Per patient is safer for now.
+        try:
+            ensure_scrape_stats_table(session)
+            while True:
+                batch = work_queue.claim(worker)
+                if batch is None:
+                    break
 
-                    except Exception as e:
-                        print(f"Error processing patient {patient.codigo}: {e}")
-                        session.rollback()
-                        stats["errors"] += 1
+                sistema_enum = SistemaOrigem(batch["sistema"].upper())
+                print(
+                    f"[{worker}] Lote {batch['id']}: {len(batch['ids'])} pacientes ({sistema_enum.value})"
+                )
+                self.scraper.set_sistema(sistema_enum.value)
+                query = (
+                    session.query(DadosCliente)
+                    .filter(
+                        DadosCliente.id.in_(batch["ids"]),
+                        DadosCliente.codigo.isnot(None),
+                    )
+                    .order_by(DadosCliente.id)
+                )
+                written = self._seed_patients(
+                    session,
+                    query,
+                    sistema_enum,
+                    stats,
+                    skip_if_has_recent_history,
+                    days_threshold,
+                    tabs,
+                    incremental,
+                    pipeline_depth=pipeline_depth,
+                    heartbeat=lambda: work_queue.heartbeat(worker),
+                )
+                if not written:
+                    raise HistoryWriteError(f"Lote {batch['id']} não foi gravado")
+                work_queue.ack(worker, batch)
+                stats["batches"] += 1
 
+            stats["peak_rss_mb"] = round(peak_rss_mb(), 1)
             return {"status": "success", "stats": stats}
 
         except Exception as e:
             session.rollback()
-            print(f"Critical error in seed_history: {e}")
-            return {"status": "error", "message": str(e)}
+            print(f"Critical error in seed_history_from_queue: {e}")
+            return {"status": "error", "message": str(e), "stats": stats}
         finally:
             session.close()
             self.scraper.quit()
+            export_histograms()
 
 
 if __name__ == "__main__":
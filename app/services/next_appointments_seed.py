@@ -1,4 +1,9 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
 from app.core.database import get_session
 from app.models.agendamento import Agendamento
 from app.models.enums import SistemaOrigem
@@ -6,128 +11,106 @@ from app.scraper.next_appointments import NextAppointmentsScraper
 from app.services.doctor_service import get_or_create_professional
 from app.models.dados_cliente import DadosCliente
 
-class NextAppointmentsService:
-    def __init__(self):
-        self.scraper = NextAppointmentsScraper()
+def fetch_next_appointments(
+    sistemas: list[SistemaOrigem], scraper_cls=NextAppointmentsScraper
+) -> dict[SistemaOrigem, dict]:
+    """
+    Exporta os próximos agendamentos de cada sistema em paralelo, com um
+    scraper (Chrome ou sessão HTTP) por sistema. Cada Browser baixa na sua
+    própria pasta, então as exportações não se sobrescrevem.
+    """
+
+    def fetch(sistema: SistemaOrigem) -> dict:
+        scraper = scraper_cls()
+        try:
+            scraper.set_sistema(sistema.value)
+            return scraper.get_next_appointments()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        finally:
+            scraper.quit()
 
-    def sync_next_appointments(self) -> dict:
-        print("Starting next appointments sync process...")
-        
-        session = get_session()
+    with ThreadPoolExecutor(
+        max_workers=max(len(sistemas), 1), thread_name_prefix="next-appointments"
+    ) as pool:
+        return dict(zip(sistemas, pool.map(fetch, sistemas)))
+
+
+class NextAppointmentsService:
+    def __init__(self, scraper_cls=NextAppointmentsScraper):
+        self.scraper_cls = scraper_cls
+
+    def sync_next_appointments(self, sistema_filter: str | None = None) -> dict:
+        """
+        Exporta OURO e OF em paralelo e grava tudo numa única transação.
+
+        Args:
+            sistema_filter: Filter by system ('ouro', 'of', or None for both)
+
+        Cada sistema é gravado num savepoint: se a exportação ou a gravação de
+        um sistema falhar, só ele fica de fora (inclusive da detecção de
+        cancelados) e o outro é gravado normalmente. Dentro do sistema, cada
+        linha tem o próprio savepoint: uma linha que o banco recusa só conta
+        em errors.
+        """
+        sistemas = [
+            s for s in SistemaOrigem
+            if not sistema_filter or s.value.lower() == sistema_filter.lower()
+        ]
+        print(
+            f"Starting next appointments sync process ({', '.join(s.value for s in sistemas)})..."
+        )
+
+        start = time.perf_counter()
+        results = fetch_next_appointments(sistemas, self.scraper_cls)
         stats = {
             "total_scraped": 0,
             "added": 0,
             "updated": 0,
             "cancelled": 0,
-            "errors": 0
+            "errors": 0,
+            "scrape_seconds": round(time.perf_counter() - start, 1),
+            "systems": {},
         }
 
+        session = get_session()
         try:
-            # Note: NextAppointmentsScraper currently handles its own login and sequence
-            # It exports an Excel and parses it.
-            result = self.scraper.get_next_appointments()
-            
-            if result.get("status") != "success":
-                print(f"Scraper failed: {result.get('message')}")
-                return result
-
-            appointments_data = result.get("appointments", [])
-            stats["total_scraped"] = len(appointments_data)
-
-            for apt_data in appointments_data:
+            for sistema in sistemas:
+                result = results[sistema]
+                if result.get("status") != "success":
+                    print(f"Scraper failed for {sistema.value}: {result.get('message')}")
+                    stats["systems"][sistema.value] = {
+                        "status": "error",
+                        "message": result.get("message"),
+                    }
+                    continue
+
                 try:
-                    codigo_str = apt_data.get("codigo")
-                    if not codigo_str:
-                        continue
-
-                    codigo_int = int(codigo_str) if codigo_str.isdigit() else None
-                    if not codigo_int:
-                        continue
-
-                    sistema = SistemaOrigem.OURO
-
-                    existing = session.query(Agendamento).filter_by(
-                        codigo=codigo_int,
-                        sistema_origem=sistema.value,
-                        data_consulta=apt_data.get("data_consulta"),
-                        hora_consulta=apt_data.get("hora_consulta"),
-                    ).first()
-
-                    patient = session.query(DadosCliente).filter(
-                        DadosCliente.codigo == codigo_int
-                    ).first()
-
-                    now = datetime.now()
-
-                    if existing:
-                        existing.status = apt_data.get("status")
-                        existing.procedimento = apt_data.get("procedimento")
-                        existing.profissional = apt_data.get("profissional") or existing.profissional
-                        existing.updated_at = now
-                        if patient:
-                            existing.nome_paciente = patient.nomewpp or existing.nome_paciente
-                            if patient.data_nascimento:
-                                existing.data_nascimento = patient.data_nascimento
-                        stats["updated"] += 1
-                    else:
-                        prof_name = apt_data.get("profissional")
-                        prof_id = get_or_create_professional(session, prof_name, sistema)
-
-                        new_apt = Agendamento(
-                            paciente_id=patient.id if patient else None,
-                            profissional_id=prof_id,
-                            sistema_origem=sistema.value,
-                            codigo=codigo_int,
-                            nome_paciente=patient.nomewpp if patient and patient.nomewpp else (apt_data.get("nome_paciente") or ""),
-                            telefone=apt_data.get("telefone") or "",
-                            cpf=patient.cpf if patient and patient.cpf else "",
-                            data_nascimento=patient.data_nascimento if patient and patient.data_nascimento else datetime(1900, 1, 1).date(),
-                            data_consulta=apt_data.get("data_consulta"),
-                            hora_consulta=apt_data.get("hora_consulta"),
-                            profissional=prof_name or "",
-                            especialidade=apt_data.get("especialidade") or "",
-                            procedimento=apt_data.get("procedimento"),
-                            status=apt_data.get("status"),
-                            primeira_consulta=apt_data.get("primeira_consulta"),
-                            observacoes=apt_data.get("observacoes"),
-                            created_at=now,
+                    with session.begin_nested():
+                        system_stats = self._apply_appointments(
+                            session, sistema, result.get("appointments", [])
                         )
-                        session.add(new_apt)
-                        stats["added"] += 1
-
-                except Exception as e:
-                    print(f"Error processing appointment for code {apt_data.get('codigo')}: {e}")
-                    session.rollback()
-                    stats["errors"] += 1
-
-            # Detect cancelled/deleted appointments:
-            # Appointments in DB within the scraped date range but NOT in the Excel
-            scraped_keys = set()
-            for apt_data in appointments_data:
-                codigo_str = apt_data.get("codigo")
-                if codigo_str and codigo_str.isdigit():
-                    scraped_keys.add(
-                        (int(codigo_str), apt_data.get("data_consulta"), apt_data.get("hora_consulta"))
-                    )
-
-            today = date.today()
-            end_date = today + timedelta(days=30)
-            sistema = SistemaOrigem.OURO
-
-            db_future_appointments = session.query(Agendamento).filter(
-                Agendamento.sistema_origem == sistema.value,
-                Agendamento.data_consulta >= today,
-                Agendamento.data_consulta <= end_date,
-                Agendamento.status != "Cancelado",
-            ).all()
-
-            now = datetime.now()
-            for db_apt in db_future_appointments:
-                key = (db_apt.codigo, db_apt.data_consulta, db_apt.hora_consulta)
-                if key not in scraped_keys:
-                    db_apt.status = "Cancelado"
-                    db_apt.updated_at = now
-                    stats["cancelled"] += 1
+                except SQLAlchemyError as e:
+                    print(f"Could not write {sistema.value} appointments: {getattr(e, 'orig', e)}")
+                    stats["systems"][sistema.value] = {
+                        "status": "error",
+                        "message": str(getattr(e, "orig", e)),
+                    }
+                    continue
+
+                stats["systems"][sistema.value] = {"status": "success", **system_stats}
+                for key, value in system_stats.items():
+                    stats[key] += value
+
+            if not any(s["status"] == "success" for s in stats["systems"].values()):
+                session.rollback()
+                return {
+                    "status": "error",
+                    "message": "; ".join(
+                        f"{name}: {s['message']}" for name, s in stats["systems"].items()
+                    ),
+                    "stats": stats,
+                }
 
             session.commit()
             return {"status": "success", "stats": stats}
@@ -138,7 +121,120 @@ class NextAppointmentsService:
             return {"status": "error", "message": str(e)}
         finally:
             session.close()
-            self.scraper.quit()
+
+    def _apply_appointments(self, session, sistema: SistemaOrigem, appointments_data: list[dict]) -> dict:
+        """Grava os agendamentos exportados de um sistema e marca os cancelados."""
+        stats = {"total_scraped": len(appointments_data), "added": 0, "updated": 0, "cancelled": 0, "errors": 0}
+
+        for apt_data in appointments_data:
+            try:
+                with session.begin_nested():
+                    outcome = self._apply_appointment(session, sistema, apt_data)
+                if outcome:
+                    stats[outcome] += 1
+            except SQLAlchemyError as e:
+                print(
+                    f"Could not write appointment for code {apt_data.get('codigo')}: {getattr(e, 'orig', e)}"
+                )
+                stats["errors"] += 1
+            except Exception as e:
+                print(f"Error processing appointment for code {apt_data.get('codigo')}: {e}")
+                stats["errors"] += 1
+
+        # Detect cancelled/deleted appointments:
+        # Appointments in DB within the scraped date range but NOT in the Excel
+        scraped_keys = set()
+        for apt_data in appointments_data:
+            codigo_str = apt_data.get("codigo")
+            if codigo_str and codigo_str.isdigit():
+                scraped_keys.add(
+                    (int(codigo_str), apt_data.get("data_consulta"), apt_data.get("hora_consulta"))
+                )
+
+        today = date.today()
+        end_date = today + timedelta(days=30)
+
+        db_future_appointments = session.query(Agendamento).filter(
+            Agendamento.sistema_origem == sistema.value,
+            Agendamento.data_consulta >= today,
+            Agendamento.data_consulta <= end_date,
+            Agendamento.status != "Cancelado",
+        ).all()
+
+        now = datetime.now()
+        for db_apt in db_future_appointments:
+            key = (db_apt.codigo, db_apt.data_consulta, db_apt.hora_consulta)
+            if key not in scraped_keys:
+                db_apt.status = "Cancelado"
+                db_apt.updated_at = now
+                stats["cancelled"] += 1
+        return stats
+
+    def _apply_appointment(self, session, sistema: SistemaOrigem, apt_data: dict) -> str | None:
+        """
+        Grava uma linha exportada e faz o flush, para um erro de banco aparecer
+        no savepoint desta linha. Retorna "added", "updated" ou None (ignorada).
+        """
+        codigo_str = apt_data.get("codigo")
+        if not codigo_str:
+            return None
+
+        codigo_int = int(codigo_str) if codigo_str.isdigit() else None
+        if not codigo_int:
+            return None
+
+        existing = session.query(Agendamento).filter_by(
+            codigo=codigo_int,
+            sistema_origem=sistema.value,
+            data_consulta=apt_data.get("data_consulta"),
+            hora_consulta=apt_data.get("hora_consulta"),
+        ).first()
+
+        patient = session.query(DadosCliente).filter(
+            DadosCliente.codigo == codigo_int,
+            DadosCliente.sistema_origem == sistema,
+        ).first()
+
+        now = datetime.now()
+
+        if existing:
+            existing.status = apt_data.get("status")
+            existing.procedimento = apt_data.get("procedimento")
+            existing.profissional = apt_data.get("profissional") or existing.profissional
+            existing.updated_at = now
+            if patient:
+                existing.nome_paciente = patient.nomewpp or existing.nome_paciente
+                if patient.data_nascimento:
+                    existing.data_nascimento = patient.data_nascimento
+            session.flush()
+            return "updated"
+
+        prof_name = apt_data.get("profissional")
+        prof_id = get_or_create_professional(session, prof_name, sistema)
+
+        new_apt = Agendamento(
+            paciente_id=patient.id if patient else None,
+            profissional_id=prof_id,
+            sistema_origem=sistema.value,
+            codigo=codigo_int,
+            nome_paciente=patient.nomewpp if patient and patient.nomewpp else (apt_data.get("nome_paciente") or ""),
+            telefone=apt_data.get("telefone") or "",
+            cpf=patient.cpf if patient and patient.cpf else "",
+            data_nascimento=patient.data_nascimento if patient and patient.data_nascimento else datetime(1900, 1, 1).date(),
+            data_consulta=apt_data.get("data_consulta"),
+            hora_consulta=apt_data.get("hora_consulta"),
+            profissional=prof_name or "",
+            especialidade=apt_data.get("especialidade") or "",
+            procedimento=apt_data.get("procedimento"),
+            status=apt_data.get("status"),
+            primeira_consulta=apt_data.get("primeira_consulta"),
+            observacoes=apt_data.get("observacoes"),
+            created_at=now,
+        )
+        session.add(new_apt)
+        session.flush()
+        return "added"
+
 
 if __name__ == "__main__":
     service = NextAppointmentsService()
@@ -4,6 +4,7 @@ from app.core.database import get_session
 from app.models.agendamento import Agendamento
 from app.models.dados_cliente import DadosCliente
 from app.scraper.patient_history_scraper import PatientHistoryScraper
+from app.services.checkpoints import CheckpointStore
 
 
 class PatientCodeSyncService:
@@ -13,9 +14,15 @@ class PatientCodeSyncService:
     def _sync_data(self, search_type: str, items: List[str]) -> dict:
         """
         Generic method to sync patient codes by different search types.
+        An interrupted run resumes from the checkpoint of `search_type`.
         """
+        checkpoint = CheckpointStore(f"code:{search_type}")
         session = get_session()
         try:
+            finished = checkpoint.finished()
+            if finished:
+                items = [value for value in items if str(value) not in finished]
+
             print(f"Found {len(items)} items to sync codes for using type: {search_type}")
 
             # Initialize search screen once
@@ -24,6 +31,7 @@ class PatientCodeSyncService:
 
             updated_count = 0
             failed_count = 0
+            pending_values = []
 
             for i, value in enumerate(items, 1):
                 print(f"[{i}/{len(items)}] Processing {search_type}: {value}")
@@ -47,21 +55,27 @@ class PatientCodeSyncService:
                         ).update({"codigo": codigo})
                         
                         updated_count += 1
+                        pending_values.append(value)
                         print(f"  Updated code: {codigo}")
                         
                         # Every 10 updates, commit to database to avoid losing progress
                         if updated_count % 10 == 0:
                             session.commit()
+                            checkpoint.mark(pending_values)
+                            pending_values = []
                     else:
                         print(f"  No code found for {search_type}: {value}")
                         failed_count += 1
+                        checkpoint.mark(value, "not_found")
 
                 except Exception as e:
                     print(f"  Error processing {search_type} {value}: {e}")
                     failed_count += 1
+                    checkpoint.mark(value, "error", message=str(e))
                     continue
 
             session.commit()
+            checkpoint.clear()
 
             return {
                 "status": "success",
@@ -1,6 +1,7 @@
 from app.core.database import get_session
 from app.models.dados_cliente import DadosCliente
 from app.scraper.get_active_patients import GetActivePatients
+from app.services.checkpoints import CheckpointStore
 import time
 
 class PatientCPFSyncService:
@@ -10,9 +11,12 @@ class PatientCPFSyncService:
     def sync_cpfs(self) -> dict:
         """
         Syncs patient CPFs by searching their codes in the registration screen.
+        An interrupted run resumes without re-searching patients already
+        committed or whose CPF was not found.
         """
         print("Starting CPF sync process...")
         
+        checkpoint = CheckpointStore("cpf")
         session = get_session()
         try:
             # Fetch patients with missing CPF
@@ -24,6 +28,10 @@ class PatientCPFSyncService:
                 print("No patients found with missing CPF.")
                 return {"status": "success", "message": "No patients to sync."}
 
+            finished = checkpoint.finished()
+            if finished:
+                patients = [p for p in patients if str(p.id) not in finished]
+
             print(f"Found {len(patients)} patients with missing CPF.")
 
             # Initialize scraper and navigate to the search modal
@@ -34,6 +42,7 @@ class PatientCPFSyncService:
 
             updated_count = 0
             failed_count = 0
+            pending_ids = []
 
             for i, patient in enumerate(patients, 1):
                 print(f"[{i}/{len(patients)}] Syncing CPF for code: {patient.codigo} ({patient.nomewpp})")
@@ -44,19 +53,24 @@ class PatientCPFSyncService:
                     if cpf:
                         patient.cpf = cpf
                         updated_count += 1
+                        pending_ids.append(patient.id)
                         print(f"  Found and updated CPF: {cpf}")
                         
                         # Commit every 10 updates
                         if updated_count % 10 == 0:
                             session.commit()
+                            checkpoint.mark(pending_ids)
+                            pending_ids = []
                             print("  Periodic commit performed.")
                     else:
                         print(f"  CPF not found for code: {patient.codigo}")
                         failed_count += 1
+                        checkpoint.mark(patient.id, "not_found")
                 
                 except Exception as e:
                     print(f"  Error syncing code {patient.codigo}: {e}")
                     failed_count += 1
+                    checkpoint.mark(patient.id, "error", message=str(e))
                     # Optional: Re-prepare if session seems lost
                     if "disconnected" in str(e).lower() or "session" in str(e).lower():
                         self.scraper._login()
@@ -64,6 +78,7 @@ class PatientCPFSyncService:
                         self.scraper.prepare_patient_registration_search()
 
             session.commit()
+            checkpoint.clear()
             print(f"CPF sync completed: {updated_count} updated, {failed_count} failed.")
 
             return {
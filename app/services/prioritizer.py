@@ -0,0 +1,123 @@
+"""
+Ordem em que os pacientes têm o histórico atualizado.
+
+Os prioritizers só usam dados do banco. `SignalPrioritizer` (padrão) pontua
+cada paciente a partir de agendamentos, numa consulta agregada:
+
+- consulta marcada nos próximos dias (quanto mais perto, maior);
+- retorno_ate perto de hoje (antes ou depois);
+- tempo desde a última raspagem (historico_raspagens) ou, para quem ainda
+  não tem raspagem registrada, desde o último atendimento gravado;
+- quantos atendimentos entraram nos últimos meses (histórico que muda).
+
+Para trocar a ordem, registre uma subclasse em PRIORITIZERS e escolha-a em
+HISTORY_PRIORITY.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from ..core.dependencies import get_settings
+from ..models.agendamento import Agendamento
+from .scrape_stats import load_scrape_stats
+
+UPCOMING_HORIZON_DAYS = 14
+RETORNO_HORIZON_DAYS = 14
+STALE_HORIZON_DAYS = 180
+SCRAPE_STALE_HORIZON_DAYS = 30
+CHURN_WINDOW_DAYS = 90
+CHURN_CAP = 6
+# Uma consulta IN por vez (limite de parâmetros do Postgres: 65535).
+SIGNALS_CHUNK = 10000
+
+
+class IdPrioritizer:
+    """Ordem por DadosCliente.id (comportamento anterior)."""
+
+    def order(self, session, patient_ids: list[int]) -> list[int]:
+        return sorted(patient_ids)
+
+
+class SignalPrioritizer(IdPrioritizer):
+    """Maior pontuação primeiro; empate pelo id."""
+
+    weights = {"upcoming": 4.0, "retorno": 2.0, "stale": 1.0, "churn": 1.0}
+
+    def signals(self, session, patient_ids: list[int], today: date) -> dict[int, dict]:
+        """Datas e contagens de agendamentos e última raspagem por paciente."""
+        churn_since = today - timedelta(days=CHURN_WINDOW_DAYS)
+        retorno_since = today - timedelta(days=RETORNO_HORIZON_DAYS)
+        signals = {
+            pid: {"upcoming": None, "last_seen": None, "retorno": None, "recent": 0, "last_scraped": None}
+            for pid in patient_ids
+        }
+        for start in range(0, len(patient_ids), SIGNALS_CHUNK):
+            chunk = patient_ids[start : start + SIGNALS_CHUNK]
+            rows = (
+                session.query(
+                    Agendamento.paciente_id,
+                    func.min(Agendamento.data_consulta).filter(
+                        Agendamento.data_consulta >= today
+                    ),
+                    func.max(Agendamento.data_consulta).filter(
+                        Agendamento.data_consulta < today
+                    ),
+                    func.min(Agendamento.retorno_ate).filter(
+                        Agendamento.retorno_ate >= retorno_since
+                    ),
+                    func.count(Agendamento.id).filter(
+                        Agendamento.data_consulta >= churn_since,
+                        Agendamento.data_consulta < today,
+                    ),
+                )
+                .filter(Agendamento.paciente_id.in_(chunk))
+                .group_by(Agendamento.paciente_id)
+            )
+            for paciente_id, upcoming, last_seen, retorno, recent in rows:
+                signals[paciente_id].update(
+                    upcoming=upcoming, last_seen=last_seen, retorno=retorno, recent=recent or 0
+                )
+
+        for paciente_id, row in load_scrape_stats(session, patient_ids).items():
+            if row.last_success_at:
+                scraped_at = row.last_success_at
+                if not scraped_at.tzinfo:
+                    scraped_at = scraped_at.replace(tzinfo=timezone.utc)
+                signals[paciente_id]["last_scraped"] = scraped_at
+        return signals
+
+    def score(self, signals: dict, today: date) -> float:
+        score = 0.0
+        if signals["upcoming"]:
+            days = (signals["upcoming"] - today).days
+            score += self.weights["upcoming"] * max(0.0, 1 - days / UPCOMING_HORIZON_DAYS)
+        if signals["retorno"]:
+            days = abs((signals["retorno"] - today).days)
+            score += self.weights["retorno"] * max(0.0, 1 - days / RETORNO_HORIZON_DAYS)
+        if signals["last_scraped"]:
+            days = (datetime.now(timezone.utc) - signals["last_scraped"]).total_seconds() / 86400
+            score += self.weights["stale"] * min(1.0, days / SCRAPE_STALE_HORIZON_DAYS)
+        elif signals["last_seen"]:
+            days = (today - signals["last_seen"]).days
+            score += self.weights["stale"] * min(1.0, days / STALE_HORIZON_DAYS)
+        else:
+            # Nada gravado ainda: tão "velho" quanto possível.
+            score += self.weights["stale"]
+        score += self.weights["churn"] * min(1.0, signals["recent"] / CHURN_CAP)
+        return score
+
+    def order(self, session, patient_ids: list[int]) -> list[int]:
+        today = date.today()
+        signals = self.signals(session, list(patient_ids), today)
+        return sorted(patient_ids, key=lambda pid: (-self.score(signals[pid], today), pid))
+
+
+PRIORITIZERS = {"id": IdPrioritizer, "signals": SignalPrioritizer}
+
+
+def get_prioritizer(name: str | None = None) -> IdPrioritizer:
+    name = (name or get_settings().history_priority).lower()
+    if name not in PRIORITIZERS:
+        raise ValueError(f"HISTORY_PRIORITY inválido: {name} (opções: {', '.join(PRIORITIZERS)})")
+    return PRIORITIZERS[name]()
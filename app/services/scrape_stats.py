@@ -0,0 +1,145 @@
+"""
+Metadados de raspagem do histórico por paciente (tabela historico_raspagens).
+
+O seed_history grava, junto com cada lote, quando o paciente foi raspado,
+quantas páginas e linhas o histórico tinha, quanto tempo levou e o desfecho.
+Os planejadores usam esses dados para pular quem foi raspado há pouco,
+priorizar quem está há mais tempo sem raspagem e dividir o trabalho pelo
+custo estimado, e não só pelo número de pacientes.
+
+O seed cria a tabela a partir do modelo (ensure_scrape_stats_table). Sem
+ela (ex.: usuário do banco sem permissão de CREATE), a gravação só avisa e
+os planejadores seguem como se não houvesse histórico de raspagens.
+"""
+
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models.historico_raspagem import HistoricoRaspagem
+
+# Custo (segundos) assumido quando ainda não há nenhuma raspagem gravada.
+DEFAULT_SCRAPE_COST = 10.0
+# Uma consulta IN por vez (limite de parâmetros do Postgres: 65535).
+STATS_CHUNK = 10000
+
+
+def scrape_entry(patient, sistema: str, result: dict, rows: int | None = None) -> dict:
+    """Linha de historico_raspagens a partir do resultado do scraper."""
+    now = datetime.now(timezone.utc)
+    status = result.get("status")
+    success = status == "success"
+    return {
+        "paciente_id": patient.id,
+        "codigo": patient.codigo,
+        "sistema_origem": sistema,
+        "last_scraped_at": now,
+        "last_success_at": now if success else None,
+        "outcome": status if status in ("success", "not_found") else "error",
+        "message": None if success else str(result.get("message"))[:500],
+        "pages": result.get("pages"),
+        "rows": rows,
+        "duration_s": result.get("duration"),
+        "scrape_count": 1,
+    }
+
+
+def ensure_scrape_stats_table(session) -> bool:
+    """Cria historico_raspagens pelo modelo se ela ainda não existir."""
+    try:
+        HistoricoRaspagem.__table__.create(session.connection(), checkfirst=True)
+        session.commit()
+        return True
+    except SQLAlchemyError as e:
+        print(f"Could not create historico_raspagens: {getattr(e, 'orig', e)}")
+        session.rollback()
+        return False
+
+
+def record_scrapes(session, entries: list[dict]) -> bool:
+    """
+    Upsert das entradas num savepoint da transação atual (sem commit): uma
+    falha aqui não desfaz o lote de histórico gravado na mesma transação.
+    Erros só atualizam desfecho e data; páginas, linhas e duração continuam
+    os da última raspagem bem-sucedida.
+    """
+    if not entries:
+        return True
+
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(
+        session.get_bind().dialect.name
+    )
+    table = HistoricoRaspagem.__table__
+    try:
+        with session.begin_nested():
+            for success in (True, False):
+                group = [e for e in entries if (e["outcome"] == "success") == success]
+                if not group:
+                    continue
+                if not dialect_insert:
+                    session.execute(insert(table), group)
+                    continue
+                stmt = dialect_insert(table).values(group)
+                columns = ["codigo", "sistema_origem", "last_scraped_at", "outcome", "message"]
+                if success:
+                    columns += ["last_success_at", "pages", "rows", "duration_s"]
+                set_ = {column: stmt.excluded[column] for column in columns}
+                set_["scrape_count"] = table.c.scrape_count + 1
+                session.execute(
+                    stmt.on_conflict_do_update(index_elements=["paciente_id"], set_=set_)
+                )
+        return True
+    except SQLAlchemyError as e:
+        print(f"Could not record scrape stats ({len(entries)} patients): {getattr(e, 'orig', e)}")
+        return False
+
+
+def load_scrape_stats(session, patient_ids: list[int]) -> dict[int, HistoricoRaspagem]:
+    """Metadados de raspagem por paciente (ausentes = nunca raspados)."""
+    stats = {}
+    try:
+        for start in range(0, len(patient_ids), STATS_CHUNK):
+            chunk = patient_ids[start : start + STATS_CHUNK]
+            for row in session.query(HistoricoRaspagem).filter(
+                HistoricoRaspagem.paciente_id.in_(chunk)
+            ):
+                stats[row.paciente_id] = row
+    except SQLAlchemyError as e:
+        print(f"Could not read scrape stats: {getattr(e, 'orig', e)}")
+        session.rollback()
+        return {}
+    return stats
+
+
+def recently_scraped(stats: dict[int, HistoricoRaspagem], hours: int) -> set[int]:
+    """Pacientes raspados com sucesso nas últimas `hours` horas."""
+    if hours <= 0:
+        return set()
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    return {
+        pid
+        for pid, row in stats.items()
+        if row.last_success_at and _aware(row.last_success_at) >= cutoff
+    }
+
+
+def estimated_costs(stats: dict[int, HistoricoRaspagem], patient_ids: list[int]) -> dict[int, float]:
+    """
+    Custo estimado (segundos de raspagem) de cada paciente: a duração da
+    última raspagem ou, para quem nunca foi raspado, a mediana das conhecidas.
+    """
+    known = [row.duration_s for row in stats.values() if row.duration_s]
+    default = statistics.median(known) if known else DEFAULT_SCRAPE_COST
+    costs = {}
+    for pid in patient_ids:
+        row = stats.get(pid)
+        costs[pid] = row.duration_s if row is not None and row.duration_s else default
+    return costs
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite devolve datetimes sem fuso.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,187 @@
+"""
+Filas de lotes de pacientes para o run_parallel.
+
+Os workers puxam lotes pequenos ({"id", "sistema", "ids"}) em vez de
+receberem fatias fixas de offset/limit: quem termina antes pega mais, e um
+paciente com histórico longo (ou um Chrome que travou) não vira a cauda da
+execução inteira. Todo lote reivindicado precisa de ack(); os lotes de um
+worker que morreu voltam para a fila.
+
+- LocalWorkQueue: multiprocessing.Manager, para workers na mesma máquina.
+- RedisWorkQueue: listas no Redis, para workers em várias máquinas.
+"""
+
+import json
+import os
+import queue
+import socket
+import statistics
+import time
+from multiprocessing import Manager
+
+import redis
+
+from ..core.dependencies import get_settings
+
+
+def worker_name(worker_id) -> str:
+    """Nome único do worker entre máquinas (host:pid do coordenador:id)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{worker_id}"
+
+
+def make_batches(
+    sistema: str,
+    patient_ids: list[int],
+    batch_size: int,
+    costs: dict[int, float] | None = None,
+) -> list[dict]:
+    """
+    Lotes na ordem de `patient_ids`. Sem `costs`, `batch_size` pacientes por
+    lote; com `costs` (segundos estimados por paciente), lotes de custo
+    parecido, ~`batch_size` vezes o custo mediano.
+    """
+    if costs and patient_ids:
+        target = batch_size * statistics.median(costs[pid] for pid in patient_ids)
+        groups, current, total = [], [], 0.0
+        for pid in patient_ids:
+            current.append(pid)
+            total += costs[pid]
+            if total >= target:
+                groups.append(current)
+                current, total = [], 0.0
+        if current:
+            groups.append(current)
+    else:
+        groups = [
+            patient_ids[start : start + batch_size]
+            for start in range(0, len(patient_ids), batch_size)
+        ]
+    return [
+        {"id": f"{sistema}-{index:05d}", "sistema": sistema, "ids": ids}
+        for index, ids in enumerate(groups)
+    ]
+
+
+class LocalWorkQueue:
+    """Fila em um processo Manager; o objeto pode ser passado aos workers."""
+
+    def __init__(self):
+        self._manager = Manager()
+        self._pending = self._manager.Queue()
+        self._claimed = self._manager.dict()  # batch id -> (worker, batch)
+
+    def __getstate__(self):
+        # O Manager fica no processo coordenador; os workers só usam os proxies.
+        return {"_pending": self._pending, "_claimed": self._claimed}
+
+    def put(self, batches: list[dict]):
+        for batch in batches:
+            self._pending.put(batch)
+
+    def claim(self, worker: str) -> dict | None:
+        try:
+            batch = self._pending.get_nowait()
+        except queue.Empty:
+            return None
+        self._claimed[batch["id"]] = (worker, batch)
+        return batch
+
+    def ack(self, worker: str, batch: dict):
+        self._claimed.pop(batch["id"], None)
+
+    def heartbeat(self, worker: str):
+        # O coordenador vê os workers locais morrerem; não há heartbeat.
+        pass
+
+    def requeue_worker(self, worker: str) -> int:
+        """Devolve à fila os lotes ainda sem ack de `worker`."""
+        requeued = 0
+        for batch_id, (owner, batch) in list(self._claimed.items()):
+            if owner == worker:
+                self._claimed.pop(batch_id, None)
+                self._pending.put(batch)
+                requeued += 1
+        return requeued
+
+    def pending(self) -> int:
+        return self._pending.qsize() + len(self._claimed)
+
+
+class RedisWorkQueue:
+    """
+    Fila confiável no Redis: claim move o lote atomicamente (LMOVE) de
+    `<nome>:pending` para `<nome>:claimed:<worker>` e ack o remove. Cada
+    worker renova `<nome>:alive:<worker>` a cada claim/ack e a cada paciente
+    (heartbeat), então um lote lento não expira; lotes de workers sem
+    heartbeat (máquina caiu) são devolvidos por qualquer outro worker.
+    """
+
+    def __init__(self, name: str = "history", heartbeat_ttl: int = 900):
+        self.name = f"softclyn:workqueue:{name}"
+        self.heartbeat_ttl = heartbeat_ttl
+        self._client = None
+
+    def __getstate__(self):
+        # Cada processo abre a própria conexão.
+        return {**self.__dict__, "_client": None}
+
+    @property
+    def _redis(self):
+        if self._client is None:
+            redis_url = get_settings().redis_url.replace("localhost", "127.0.0.1")
+            self._client = redis.from_url(redis_url, decode_responses=True)
+        return self._client
+
+    def _key(self, *parts) -> str:
+        return ":".join([self.name, *parts])
+
+    def reset(self):
+        r = self._redis
+        keys = [self._key("pending"), *r.scan_iter(self._key("claimed", "*"))]
+        r.delete(*keys)
+
+    def put(self, batches: list[dict]):
+        if batches:
+            self._redis.rpush(self._key("pending"), *[json.dumps(b) for b in batches])
+
+    def _heartbeat(self, r, worker: str):
+        r.set(self._key("alive", worker), int(time.time()), ex=self.heartbeat_ttl)
+
+    def heartbeat(self, worker: str):
+        self._heartbeat(self._redis, worker)
+
+    def claim(self, worker: str) -> dict | None:
+        r = self._redis
+        self.requeue_stale()
+        self._heartbeat(r, worker)
+        raw = r.lmove(self._key("pending"), self._key("claimed", worker), "LEFT", "RIGHT")
+        return json.loads(raw) if raw else None
+
+    def ack(self, worker: str, batch: dict):
+        r = self._redis
+        r.lrem(self._key("claimed", worker), 1, json.dumps(batch))
+        self._heartbeat(r, worker)
+
+    def requeue_worker(self, worker: str) -> int:
+        r = self._redis
+        requeued = 0
+        while r.lmove(self._key("claimed", worker), self._key("pending"), "RIGHT", "LEFT"):
+            requeued += 1
+        return requeued
+
+    def requeue_stale(self) -> int:
+        r = self._redis
+        prefix = self._key("claimed", "")
+        requeued = 0
+        for key in r.scan_iter(self._key("claimed", "*")):
+            worker = key[len(prefix):]
+            if not r.exists(self._key("alive", worker)):
+                requeued += self.requeue_worker(worker)
+        if requeued:
+            print(f"{requeued} lotes de workers sem heartbeat voltaram para a fila.")
+        return requeued
+
+    def pending(self) -> int:
+        r = self._redis
+        claimed = sum(r.llen(key) for key in r.scan_iter(self._key("claimed", "*")))
+        return r.llen(self._key("pending")) + claimed
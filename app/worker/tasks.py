@@ -2,11 +2,15 @@ from contextlib import contextmanager
 
 import redis
 from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
 
 from app.core.dependencies import get_settings
+from app.core.tracing import export_histograms, traced
 from app.scraper.appointment_canceller import AppointmentCanceller
 from app.scraper.appointment_scheduler import AppointmentScheduler
 from app.scraper.availability_checker import AvailabilityChecker
+from app.scraper.base import sistema_for_medico
+from app.scraper.browser_pool import init_pool, lease_browser, shutdown_pool
 from app.scraper.get_active_patients import GetActivePatients
 from app.scraper.next_appointments import NextAppointmentsScraper
 from app.scraper.patient_history_scraper import PatientHistoryScraper
@@ -19,6 +23,23 @@ if "localhost" in redis_url:
 redis_client = redis.from_url(redis_url)
 
 
+@worker_process_init.connect
+def start_browser_pool(**kwargs):
+    """Abre os Chromes logados deste processo antes da primeira tarefa."""
+    try:
+        init_pool()
+    except Exception as e:
+        print(f"Não foi possível iniciar o pool de browsers: {e}")
+
+
+@worker_process_shutdown.connect
+def stop_browser_pool(**kwargs):
+    shutdown_pool()
+    path = export_histograms()
+    if path:
+        print(f"Histogramas de tempo por etapa gravados em {path}")
+
+
 @contextmanager
 def redis_lock(lock_name, timeout=60, expire=300):
     """
@@ -45,6 +66,7 @@ def redis_lock(lock_name, timeout=60, expire=300):
 
 
 @shared_task(name="schedule_appointment_task")
+@traced("schedule_appointment_task", root=True)
 def schedule_appointment_task(
     medico: str,
     data_desejada: str,
@@ -61,10 +83,13 @@ def schedule_appointment_task(
     print(f"Tentando adquirir lock: {lock_key}")
 
     appointmentScheduler = None
+    sistema = sistema_for_medico(medico)
     try:
-        with redis_lock(lock_key, timeout=30, expire=300):
+        with redis_lock(lock_key, timeout=30, expire=300), lease_browser(
+            sistema
+        ) as browser:
             print(f"Lock adquirido: {lock_key}. Iniciando agendamento...")
-            appointmentScheduler = AppointmentScheduler()
+            appointmentScheduler = AppointmentScheduler.from_browser(browser)
             result = appointmentScheduler.schedule_appointment(
                 medico, data_desejada, paciente_info, horario_desejado, tipo_atendimento
             )
@@ -73,7 +98,7 @@ def schedule_appointment_task(
             if result.get("status") == "needs_verification":
                 if horario_desejado:
                     print("Iniciando verificação de agenda como fallback...")
-                    checker = AvailabilityChecker()
+                    checker = AvailabilityChecker.from_browser(browser)
                     try:
                         avail = checker.verify_doctors_calendar(
                             medico, data_desejada, horario_desejado
@@ -116,18 +141,21 @@ def cancel_appointment_task(
     medico, data_desejada, horario_desejado, nome_paciente, cpf=None
 ):
     print(f"Worker recebeu tarefa de cancelamento para: {nome_paciente}")
-    appointmentCanceller = AppointmentCanceller()
+    appointmentCanceller = None
     try:
-        result = appointmentCanceller.cancel_appointment(
-            medico, data_desejada, horario_desejado, nome_paciente
-        )
+        with lease_browser(sistema_for_medico(medico)) as browser:
+            appointmentCanceller = AppointmentCanceller.from_browser(browser)
+            result = appointmentCanceller.cancel_appointment(
+                medico, data_desejada, horario_desejado, nome_paciente
+            )
         print(f"Worker finalizou tarefa de cancelamento. Resultado: {result}")
         return result
     except Exception as e:
         print(f"Erro ao processar tarefa de cancelamento: {e}")
         return {"status": "error", "message": str(e)}
     finally:
-        appointmentCanceller.quit()
+        if appointmentCanceller:
+            appointmentCanceller.quit()
 
 
 @shared_task(name="verify_doctors_calendar_task")
@@ -139,18 +167,21 @@ def verify_doctors_calendar_task(
     horario_final: str | None = "19:30",
 ):
     print(f"Worker recebeu tarefa de verificação para: {medico}")
-    availabilityChecker = AvailabilityChecker()
+    availabilityChecker = None
     try:
-        result = availabilityChecker.verify_doctors_calendar(
-            medico, data_desejada, horario_desejado, horario_inicial, horario_final
-        )
+        with lease_browser(sistema_for_medico(medico)) as browser:
+            availabilityChecker = AvailabilityChecker.from_browser(browser)
+            result = availabilityChecker.verify_doctors_calendar(
+                medico, data_desejada, horario_desejado, horario_inicial, horario_final
+            )
         print(f"Worker finalizou tarefa de verificação. Resultado: {result}")
         return result
     except Exception as e:
         print(f"Erro ao processar tarefa de verificação: {e}")
         return {"status": "error", "message": str(e)}
     finally:
-        availabilityChecker.quit()
+        if availabilityChecker:
+            availabilityChecker.quit()
 
 
 @shared_task(name="get_patient_history_task")
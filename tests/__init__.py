@@ -0,0 +1,41 @@
+"""
+Testes com a biblioteca padrão e SQLite em memória:
+    uv run -m unittest discover tests
+"""
+
+import os
+
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Settings exige as variáveis do SoftClyn; o Redis aponta para uma porta
+# fechada (checkpoints e cookies só avisam).
+for _name, _value in {
+    "SOFTCLYN_URL": "http://softclyn.test",
+    "SOFTCLYN_LOGIN_PAGE": "login.php",
+    "SOFTCLYN_USER": "user",
+    "SOFTCLYN_PASS": "pass",
+    "SOFTCLYN_EMPRESA": "empresa",
+    "API_KEY": "key",
+    "REDIS_URL": "redis://127.0.0.1:1/0",
+    "DATABASE_URL": "sqlite://",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # No SQLite só INTEGER PRIMARY KEY gera id automaticamente.
+    return "INTEGER"
+
+
+def sqlite_sessionmaker(*models):
+    """sessionmaker de um SQLite em memória com as tabelas de `models`."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    for model in models:
+        model.__table__.create(engine)
+    return sessionmaker(bind=engine)
@@ -0,0 +1,139 @@
+"""seed_history_from_queue: ack só de lotes gravados e parada com o Chrome morto."""
+
+import unittest
+from datetime import date
+from unittest import mock
+
+import app.services.history_seed as history_seed
+from app.models.agendamento import Agendamento
+from app.models.dados_cliente import DadosCliente
+from app.models.enums import SistemaOrigem
+from app.models.historico_raspagem import HistoricoRaspagem
+from app.models.profissionais import Profissional
+from app.services.work_queue import LocalWorkQueue, make_batches
+from tests import sqlite_sessionmaker
+
+
+class FakeScraper:
+    status = "success"
+    session_alive = True
+
+    def __init__(self):
+        self.need_birth_date = {}
+
+    def set_sistema(self, sistema):
+        pass
+
+    def quit(self):
+        pass
+
+    def is_session_alive(self):
+        return self.session_alive
+
+    def get_patient_history(self, identifier, search_type, stop_at=None, need_birth_date=False):
+        self.need_birth_date[identifier] = need_birth_date
+        if self.status != "success":
+            return {"status": self.status, "message": self.status, "appointments": []}
+        return {
+            "status": "success",
+            "patient_info": {},
+            "appointments": [
+                {"data_atendimento": "01/03/2025", "hora": "10:00", "tipo": "Consulta", "profissional": "X"}
+            ],
+        }
+
+
+class SeedHistoryFromQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.Session = sqlite_sessionmaker(
+            Profissional, DadosCliente, Agendamento, HistoricoRaspagem
+        )
+        with self.Session() as session:
+            for pid in range(1, 13):
+                session.add(
+                    DadosCliente(
+                        id=pid,
+                        codigo=1000 + pid,
+                        sistema_origem=SistemaOrigem.OURO,
+                        data_nascimento=date(1980, 1, 1) if pid % 2 else None,
+                    )
+                )
+            session.commit()
+
+        self.queue = LocalWorkQueue()
+        self.queue.put(make_batches("ouro", list(range(1, 13)), batch_size=6))
+        self.service = history_seed.AppointmentHistoryService()
+        self.service.scraper = FakeScraper()
+        patcher = mock.patch.object(history_seed, "get_session", self.Session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_worker(self, pipeline_depth: int) -> dict:
+        return self.service.seed_history_from_queue(
+            self.queue,
+            "worker-1",
+            skip_if_has_recent_history=False,
+            tabs=1,
+            pipeline_depth=pipeline_depth,
+        )
+
+    def test_writes_and_acks_every_batch(self):
+        result = self.run_worker(pipeline_depth=0)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["stats"]["batches"], 2)
+        self.assertEqual(self.queue.pending(), 0)
+        with self.Session() as session:
+            self.assertEqual(session.query(Agendamento).count(), 12)
+
+    def test_patients_without_birth_date_skip_http_mode(self):
+        self.run_worker(pipeline_depth=0)
+
+        self.assertEqual(
+            self.service.scraper.need_birth_date,
+            {str(1000 + pid): not pid % 2 for pid in range(1, 13)},
+        )
+
+    def test_patients_not_found_do_not_stop_the_worker(self):
+        self.service.scraper.status = "not_found"
+        result = self.run_worker(pipeline_depth=0)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["stats"]["patients_not_found"], 12)
+        self.assertEqual(result["stats"]["errors"], 0)
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_errors_with_live_session_do_not_stop_the_worker(self):
+        self.service.scraper.status = "error"
+        result = self.run_worker(pipeline_depth=0)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["stats"]["errors"], 12)
+
+    def test_dead_session_stops_the_worker_without_ack(self):
+        self.service.scraper.status = "error"
+        self.service.scraper.session_alive = False
+        result = self.run_worker(pipeline_depth=0)
+
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["stats"]["errors"], history_seed.MAX_CONSECUTIVE_FAILURES)
+        self.assertEqual(result["stats"]["batches"], 1)
+        self.assertEqual(self.queue.requeue_worker("worker-1"), 1)
+
+    def test_failed_write_keeps_batch_in_queue(self):
+        for depth in (0, 2):
+            with self.subTest(pipeline_depth=depth):
+                with mock.patch.object(
+                    history_seed, "upsert_history_rows", side_effect=RuntimeError("db down")
+                ):
+                    result = self.run_worker(pipeline_depth=depth)
+
+                self.assertEqual(result["status"], "error")
+                self.assertEqual(result["stats"]["batches"], 0)
+                # O lote reivindicado continua sem ack e o outro segue pendente.
+                self.assertEqual(self.queue.pending(), 2)
+                self.assertEqual(self.queue.requeue_worker("worker-1"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""get_patient_histories: escalonador de abas com prazo e heartbeat."""
+
+import unittest
+from itertools import count
+from unittest import mock
+
+import tests  # noqa: F401  (variáveis de ambiente do Settings)
+from app.scraper.patient_history_scraper import PatientHistoryScraper
+
+
+def history_steps(identifier, search_type, stop_at):
+    yield "history_table", lambda driver: True, 1
+    return {"status": "success", "patient_info": {}, "appointments": []}
+
+
+class GetPatientHistoriesTest(unittest.TestCase):
+    def setUp(self):
+        self.scraper = PatientHistoryScraper(driver=mock.MagicMock())
+        handles = (f"tab-{n}" for n in count())
+        for name, value in {
+            "ensure_logged_in": mock.Mock(),
+            "_open_search_tab": mock.Mock(side_effect=lambda new_tab: next(handles)),
+            "_history_steps": history_steps,
+        }.items():
+            patcher = mock.patch.object(self.scraper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Relógio falso: cada heartbeat avança um segundo.
+        self.clock = 0
+        self.heartbeat = mock.Mock(side_effect=self.tick)
+        patcher = mock.patch("app.scraper.patient_history_scraper.time.time", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tick(self):
+        self.clock += 1
+
+    def fetch(self, deadline: float | None) -> dict:
+        return self.scraper.get_patient_histories(
+            [str(n) for n in range(6)],
+            tabs=2,
+            deadline=deadline,
+            heartbeat=self.heartbeat,
+        )
+
+    def test_heartbeat_before_each_patient(self):
+        results = self.fetch(deadline=None)
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.heartbeat.call_count, 6)
+
+    def test_no_patient_started_after_deadline(self):
+        results = self.fetch(deadline=2.5)
+
+        self.assertEqual(sorted(results), ["0", "1", "2"])
+        self.assertEqual(self.heartbeat.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""upsert_history_rows: inseridas x existentes pela chave única de agendamentos."""
+
+import unittest
+from datetime import date, time
+
+from app.models.agendamento import Agendamento
+from app.services.history_seed import upsert_history_rows
+from tests import sqlite_sessionmaker
+
+
+def history_row(paciente_id, hora, retorno_ate=None) -> dict:
+    return {
+        "paciente_id": paciente_id,
+        "codigo": 1001,
+        "sistema_origem": "OURO",
+        "data_consulta": date(2025, 3, 1),
+        "hora_consulta": hora,
+        "status": "Realizado",
+        "retorno_ate": retorno_ate,
+    }
+
+
+class UpsertHistoryRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.Session = sqlite_sessionmaker(Agendamento)
+
+    def test_counts_new_rows_as_added(self):
+        with self.Session() as session:
+            rows = [history_row(1, time(10, 0)), history_row(1, time(11, 0))]
+            self.assertEqual(upsert_history_rows(session, rows), (2, 0))
+            self.assertEqual(session.query(Agendamento).count(), 2)
+
+    def test_row_without_paciente_id_counts_as_existing(self):
+        # Linha gravada pelos próximos agendamentos, ainda sem paciente_id.
+        with self.Session() as session:
+            upsert_history_rows(session, [history_row(None, time(10, 0))])
+
+        with self.Session() as session:
+            rows = [history_row(1, time(10, 0), retorno_ate=date(2025, 4, 1))]
+            self.assertEqual(upsert_history_rows(session, rows), (0, 1))
+            stored = session.query(Agendamento).one()
+            self.assertEqual(stored.retorno_ate, date(2025, 4, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()